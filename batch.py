@@ -0,0 +1,189 @@
+import json
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+from rich.console import Console
+
+from metrics import trace_turn
+
+console = Console()
+
+QUESTION_FIELDS = ("question", "message", "body")
+ID_FIELDS = ("request_id", "id")
+
+
+def _read_requests(input_path: str) -> Iterator[Tuple[str, Optional[str]]]:
+    """
+    Yield (request id, question) from a JSONL file, one line at a time.
+    The question is None for lines that cannot be used.
+    """
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                yield f"line-{line_number}", None
+                continue
+            request_id = next((str(record[field]) for field in ID_FIELDS if record.get(field) is not None), f"line-{line_number}")
+            question = next((record[field] for field in QUESTION_FIELDS if isinstance(record.get(field), str)), None)
+            yield request_id, question
+
+
+def _completed_ids(output_path: str) -> Set[str]:
+    """
+    Ids already handled in an earlier run's output: answered successfully,
+    or unusable input that would fail again.
+    """
+    done = set()
+    try:
+        with open(output_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Partially written last line of an interrupted run
+                if not record.get("error") or record.get("question") is None:
+                    done.add(record["id"])
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def _drop_partial_line(output_path: str):
+    """
+    Truncate the output after its last complete line, so records appended
+    on resume do not get glued onto a line an interrupted run left half
+    written.
+    """
+    try:
+        f = open(output_path, "rb+")
+    except FileNotFoundError:
+        return
+    with f:
+        end = f.seek(0, 2)
+        position = end
+        while position > 0:
+            start = max(0, position - 65536)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b"\n")
+            if newline != -1:
+                position = start + newline + 1
+                break
+            position = start
+        if position != end:
+            f.truncate(position)
+
+
+async def run_question(bot, request_id: str, question: str, send_escalations: bool = False) -> Dict[str, Any]:
+    """
+    Run one question through the compiled graph (bypassing the response
+    cache) and time each node.
+    """
+    state = bot._initial_state(question, session_id=f"batch-{request_id}")
+    state["suppress_escalation"] = not send_escalations
+
+    node_latency_ms = {}
+    result = state
+    start = last = time.perf_counter()
+    with trace_turn(bot.trace_turns) as spans, bot._knowledge_scope():
+        async for mode, chunk in bot.graph.astream(state, config=bot._graph_config(), stream_mode=["updates", "values"]):
+            if mode == "updates":
+                # Nodes run one after another, so the time since the previous
+                # update is the time spent in this node
+                now = time.perf_counter()
+                for node in chunk:
+                    node_latency_ms[node] = round((now - last) * 1000, 1)
+                last = now
+            else:
+                result = chunk
+
+    record = {
+        "id": request_id,
+        "question": question,
+        "question_type": result.get("question_type"),
+        "can_answer": result.get("can_answer", False),
+        "classification_confidence": result.get("classification_confidence"),
+        "answer": result["messages"][-1].content,
+        "node_latency_ms": node_latency_ms,
+        "total_latency_ms": round((time.perf_counter() - start) * 1000, 1)
+    }
+    if spans is not None:
+        record["trace"] = spans
+    return record
+
+
+async def run_batch(
+    bot,
+    input_path: str,
+    output_path: str,
+    concurrency: int = 8,
+    resume: bool = False,
+    send_escalations: bool = False
+) -> Dict[str, int]:
+    """
+    Replay questions from a JSONL file through the graph with bounded
+    concurrency. Each result is appended to the output JSONL as soon as it
+    finishes. With resume=True, ids already answered in the output are skipped.
+    Escalation emails are suppressed unless send_escalations is set.
+    """
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+
+    if resume:
+        _drop_partial_line(output_path)
+    skip = _completed_ids(output_path) if resume else set()
+    pending: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    counts = {"answered": 0, "failed": 0, "skipped": 0}
+
+    with open(output_path, "a" if resume else "w", encoding="utf-8") as out:
+
+        def write(record: Dict[str, Any]):
+            out.write(json.dumps(record, default=str) + "\n")
+            out.flush()
+
+        async def worker():
+            while True:
+                item = await pending.get()
+                if item is None:
+                    return
+                request_id, question = item
+                try:
+                    write(await run_question(bot, request_id, question, send_escalations))
+                    counts["answered"] += 1
+                except Exception as e:
+                    write({"id": request_id, "question": question, "error": str(e)})
+                    counts["failed"] += 1
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+
+        for request_id, question in _read_requests(input_path):
+            if request_id in skip:
+                counts["skipped"] += 1
+                continue
+            if question is None:
+                write({"id": request_id, "question": None, "error": "No question field found."})
+                counts["failed"] += 1
+                continue
+            await pending.put((request_id, question))
+
+        for _ in workers:
+            await pending.put(None)
+        await asyncio.gather(*workers)
+
+    return counts
+
+
+def run_batch_cli(bot, input_path: str, output_path: Optional[str], concurrency: int, resume: bool, send_escalations: bool):
+    """
+    Entry point for `python main.py --batch`.
+    """
+    output_path = output_path or f"{input_path.rsplit('.', 1)[0]}.results.jsonl"
+    start = time.perf_counter()
+    counts = asyncio.run(run_batch(bot, input_path, output_path, concurrency, resume, send_escalations))
+    console.print(
+        f"[bold blue]Batch complete:[/bold blue] {counts['answered']} answered, {counts['failed']} failed, "
+        f"{counts['skipped']} skipped in {time.perf_counter() - start:.1f}s -> {output_path}"
+    )
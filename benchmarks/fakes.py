@@ -0,0 +1,255 @@
+import re
+import json
+import time
+import hashlib
+import threading
+import socketserver
+from types import SimpleNamespace
+from typing import Any, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+REVIEW_WORDS = ("review", "rating", "customers", "feel", "think", "recommend", "satisfied", "stars")
+ESCALATION_WORDS = ("custom software", "weather", "poem", "lawyer", "charged twice", "partnership")
+
+
+class FakeRateLimitError(Exception):
+    """
+    Stand-in for openai.RateLimitError, with the status code and
+    Retry-After header a real one carries.
+    """
+
+    status_code = 429
+
+    def __init__(self, retry_after: float):
+        super().__init__("Rate limit reached (simulated)")
+        self.response = SimpleNamespace(headers={"retry-after": f"{retry_after:.3f}"})
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that answers the bot's prompts deterministically: classifier
+    and query-rewriting prompts get JSON, as from a model in JSON mode, and
+    answer prompts get a fixed-length answer. Each call sleeps for `latency`
+    seconds, plus `token_latency` per streamed token.
+
+    With `requests_per_minute` set, it enforces that limit like the API
+    does, with capacity replenished continuously: a call with no capacity
+    left raises FakeRateLimitError instead of answering. `burst` caps the
+    capacity (default: a full minute's worth).
+    """
+
+    latency: float = 0.0
+    token_latency: float = 0.0
+    answer_tokens: int = 60
+    requests_per_minute: int = 0
+    burst: Optional[int] = None
+    call_count: int = 0
+    rate_limited_count: int = 0
+
+    _capacity: Optional[float] = PrivateAttr(default=None)
+    _refilled_at: float = PrivateAttr(default=0.0)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _reply(self, messages: List[BaseMessage]) -> str:
+        prompt = "\n".join(str(message.content) for message in messages)
+
+        if "question classifier" in prompt:
+            match = re.search(r'Customer Question: "(.*)"', prompt)
+            question = (match.group(1) if match else prompt).lower()
+            if any(word in question for word in ESCALATION_WORDS):
+                route = "neither"
+            elif any(word in question for word in REVIEW_WORDS):
+                route = "reviews"
+            else:
+                route = "faq"
+            return json.dumps({
+                "faq_can_answer": route == "faq",
+                "is_reviews_question": route == "reviews",
+                "question_type": route,
+                "confidence": 0.9
+            })
+
+        if "alternative search queries" in prompt:
+            return json.dumps({"queries": ["customer opinions on product quality", "buyer experience and satisfaction"]})
+
+        if "Can the FAQ data answer this question" in prompt:
+            return json.dumps({"faq_can_answer": True})
+
+        seed = int(hashlib.md5(prompt.encode("utf-8")).hexdigest()[:8], 16)
+        words = ["Thanks", "for", "asking.", "Based", "on", "our", "information,"]
+        words += [f"detail{(seed + i) % 97}" for i in range(max(0, self.answer_tokens - len(words)))]
+        return " ".join(words)
+
+    def _usage(self, messages: List[BaseMessage], reply: str) -> dict:
+        prompt_tokens = sum(len(str(message.content)) for message in messages) // 4 + 1
+        completion_tokens = len(reply) // 4 + 1
+        return {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+
+    def _admit(self):
+        with self._lock:
+            self.call_count += 1
+            if not self.requests_per_minute:
+                return
+            now = time.monotonic()
+            rate = self.requests_per_minute / 60.0
+            burst = float(self.burst or self.requests_per_minute)
+            if self._capacity is None:
+                self._capacity = burst
+            else:
+                self._capacity = min(burst, self._capacity + (now - self._refilled_at) * rate)
+            self._refilled_at = now
+            if self._capacity < 1:
+                self.rate_limited_count += 1
+                raise FakeRateLimitError(retry_after=(1 - self._capacity) / rate)
+            self._capacity -= 1
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        self._admit()
+        reply = self._reply(messages)
+        time.sleep(self.latency + self.token_latency * len(reply.split()))
+        message = AIMessage(content=reply, usage_metadata=self._usage(messages, reply))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        self._admit()
+        reply = self._reply(messages)
+        time.sleep(self.latency)
+        for token in re.split(r"(?<= )", reply):
+            time.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, reply)))
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Hashed bag-of-words embeddings: deterministic, and texts sharing words
+    are similar, so retrieval and routing behave sensibly. Each call sleeps
+    for `latency` seconds plus `per_text_latency` per text.
+    """
+
+    def __init__(self, dimensions: int = 256, latency: float = 0.0, per_text_latency: float = 0.0):
+        self.dimensions = dimensions
+        self.latency = latency
+        self.per_text_latency = per_text_latency
+        self.model = f"fake-embedding-{dimensions}"
+        self.call_count = 0
+        self.text_count = 0
+        self._lock = threading.Lock()
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            vector[int(hashlib.md5(word.encode("utf-8")).hexdigest()[:8], 16) % self.dimensions] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            self.call_count += 1
+            self.text_count += len(texts)
+        time.sleep(self.latency + self.per_text_latency * len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line: str):
+        self.wfile.write((line + "\r\n").encode("ascii"))
+
+    def handle(self):
+        self._reply("220 localhost fake SMTP sink")
+        in_data = False
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode("utf-8", "replace").rstrip("\r\n")
+            if in_data:
+                if line == ".":
+                    in_data = False
+                    self.server.sink.record()
+                    self._reply("250 OK")
+                continue
+
+            command = line.split(" ", 1)[0].upper()
+            if command == "EHLO":
+                self._reply("250-localhost")
+                self._reply("250 AUTH PLAIN")
+            elif command == "HELO":
+                self._reply("250 localhost")
+            elif command == "AUTH":
+                self._reply("235 Authentication successful")  # Any credentials will do
+            elif command == "DATA":
+                in_data = True
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+            elif command == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:  # MAIL, RCPT, RSET, NOOP
+                self._reply("250 OK")
+
+
+class _SinkServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class SmtpSink:
+    """
+    Local SMTP server that accepts and counts messages without delivering
+    them. It accepts any login; use it with SMTP_STARTTLS=false.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self._server = _SinkServer((host, port), _SmtpHandler)
+        self._server.sink = self
+        self.host, self.port = self._server.server_address
+        self.message_count = 0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._server.serve_forever, name="smtp-sink", daemon=True)
+
+    def record(self):
+        with self._lock:
+            self.message_count += 1
+
+    def __enter__(self) -> "SmtpSink":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the SMTP sink to receive escalation emails locally")
+    parser.add_argument("--port", type=int, default=8025, help="port to listen on")
+    args = parser.parse_args()
+    with SmtpSink(port=args.port) as sink:
+        print(f"SMTP sink listening on {sink.host}:{sink.port} (Ctrl-C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print(f"{sink.message_count} messages received")
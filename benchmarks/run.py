@@ -0,0 +1,499 @@
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fakes import FakeChatModel, FakeEmbeddings, SmtpSink  # noqa: E402
+
+PRODUCTS = [
+    "Wireless Headphones", "Laptop Stand", "Mechanical Keyboard", "Office Chair", "Wireless Mouse",
+    "Desk Lamp", "Bluetooth Speaker", "Monitor Stand", "Wireless Charger", "Cable Management Kit"
+]
+PHRASES = [
+    "sound quality is excellent", "battery life is shorter than advertised", "very comfortable for long sessions",
+    "build quality feels cheap", "shipping was fast", "customer service was unhelpful", "worth every penny",
+    "connection drops frequently", "easy to set up", "the price is a bit high"
+]
+ROUTE_QUESTIONS = {
+    "faq": "What are your business hours?",
+    "reviews": "How do customers feel about the wireless headphones?",
+    "neither": "Can you help me with a custom software development project?"
+}
+SEARCH_QUERIES = [
+    "battery life of the headphones", "comfortable office chair", "keyboard for coding",
+    "poor customer service", "fast shipping", "cheap build quality"
+]
+
+
+def write_synthetic_reviews(path: str, count: int, seed: int = 0):
+    """
+    Write a reviews.md in the repo's format with `count` reviews.
+    """
+    rng = np.random.default_rng(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("# Customer Reviews\n\n")
+        for i in range(1, count + 1):
+            product = PRODUCTS[rng.integers(len(PRODUCTS))]
+            phrases = rng.choice(PHRASES, size=2, replace=False)
+            f.write(
+                f"## Review {i}\n"
+                f"**Product:** {product}\n"
+                f"**Rating:** {rng.integers(1, 6)}/5\n"
+                f"**Date:** 2024-{rng.integers(1, 13):02d}-{rng.integers(1, 29):02d}\n"
+                f"**Review:** \"The {product.lower()} {phrases[0]}, and {phrases[1]}. Review {i}.\"\n\n"
+            )
+
+
+def timings(fn: Callable[[], Any], iterations: int) -> Dict[str, float]:
+    """
+    Call fn repeatedly and summarize wall times in milliseconds.
+    """
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples = np.array(samples)
+    return {
+        "n": iterations,
+        "mean_ms": round(float(samples.mean()), 3),
+        "p50_ms": round(float(np.percentile(samples, 50)), 3),
+        "p95_ms": round(float(np.percentile(samples, 95)), 3),
+        "min_ms": round(float(samples.min()), 3),
+        "max_ms": round(float(samples.max()), 3)
+    }
+
+
+class BenchmarkEnvironment:
+    """
+    Temporary working directory holding faq.md, a synthetic reviews.md and
+    the bot's on-disk state, with environment variables pointing the bot at
+    fake models and a local SMTP sink.
+    """
+
+    def __init__(self, args, sink: SmtpSink):
+        self.args = args
+        self.directory = tempfile.mkdtemp(prefix="help_me_agent_bench_")
+        shutil.copy(os.path.join(REPO_ROOT, "faq.md"), self.directory)
+        self.previous_cwd = os.getcwd()
+        os.chdir(self.directory)
+        os.environ.update({
+            "REVIEWS_INDEX_DIR": os.path.join(self.directory, "chroma_db"),
+            "EMBEDDING_CACHE_PATH": os.path.join(self.directory, "embeddings_cache.db"),
+            "ESCALATION_QUEUE_PATH": os.path.join(self.directory, "escalations.db"),
+            "RESPONSE_CACHE_ENABLED": "false",
+            # Benchmarks rewrite reviews.md between runs; a watcher would
+            # reload in the middle of a measurement
+            "KNOWLEDGE_WATCH_INTERVAL": "0",
+            "SMTP_SERVER": sink.host,
+            "SMTP_PORT": str(sink.port),
+            "SMTP_STARTTLS": "false",
+            "EMAIL_USERNAME": "bench@example.com",
+            "EMAIL_PASSWORD": "bench"
+        })
+
+    def fakes(self):
+        llm = FakeChatModel(latency=self.args.llm_latency, token_latency=self.args.token_latency)
+        embeddings = FakeEmbeddings(latency=self.args.embed_latency, per_text_latency=self.args.embed_per_text_latency)
+        return llm, embeddings
+
+    def reset_index(self):
+        shutil.rmtree(os.environ["REVIEWS_INDEX_DIR"], ignore_errors=True)
+        for suffix in ("", "-wal", "-shm"):
+            path = os.environ["EMBEDDING_CACHE_PATH"] + suffix
+            if os.path.exists(path):
+                os.remove(path)
+
+    def close(self):
+        os.chdir(self.previous_cwd)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def bench_cold_start(env: BenchmarkEnvironment, bot_class, review_count: int) -> Dict[str, Any]:
+    write_synthetic_reviews("reviews.md", review_count)
+    env.reset_index()
+    llm, embeddings = env.fakes()
+
+    start = time.perf_counter()
+    bot = bot_class(llm=llm, embeddings=embeddings)
+    construct_ms = (time.perf_counter() - start) * 1000
+    bot.reviews_vectorstore  # Wait for the background index warm-up
+    reviews_ready_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    bot._setup_reviews_vectorstore()
+    warm_setup_ms = (time.perf_counter() - start) * 1000
+    bot.close()
+
+    return {
+        "reviews": review_count,
+        "constructor_ms": round(construct_ms, 3),
+        "reviews_ready_cold_index_ms": round(reviews_ready_ms, 3),
+        "setup_reviews_vectorstore_unchanged_ms": round(warm_setup_ms, 3),
+        "startup_steps_ms": {name: round(seconds * 1000, 3) for name, seconds in bot.startup_timings.items()},
+        "embedding_calls": embeddings.call_count,
+        "embedded_texts": embeddings.text_count
+    }
+
+
+def bench_parse(bot, review_count: int, iterations: int) -> Dict[str, Any]:
+    write_synthetic_reviews("reviews.md", review_count)
+    with open("reviews.md", "r", encoding="utf-8") as f:
+        content = f.read()
+
+    def stream_file():
+        with open("reviews.md", "r", encoding="utf-8") as f:
+            for _ in bot._iter_reviews(f):
+                pass
+
+    in_memory = timings(lambda: bot._parse_reviews(content), iterations)
+    streaming = timings(stream_file, iterations)
+    return {
+        "reviews": review_count,
+        "bytes": len(content.encode("utf-8")),
+        "parse_reviews": in_memory,
+        "iter_reviews_file": streaming,
+        "reviews_per_second": round(review_count / (streaming["p50_ms"] / 1000), 1)
+    }
+
+
+def bench_search(bot, iterations: int) -> Dict[str, Any]:
+    queries = iter(SEARCH_QUERIES * (iterations // len(SEARCH_QUERIES) + 1))
+    return timings(lambda: bot._search_reviews(next(queries), k=10), iterations)
+
+
+def bench_embedding_cache(env: BenchmarkEnvironment, requests: int, concurrency: int) -> Dict[str, Any]:
+    """
+    Concurrent query embeddings through CachedEmbeddings: a cold pass (misses
+    merged into batched calls) and a warm pass (served from disk).
+    """
+    from embedding_cache import CachedEmbeddings, EmbeddingStore
+
+    _, inner = env.fakes()
+    store = EmbeddingStore(os.path.join(env.directory, "bench_embedding_cache.db"))
+    cached = CachedEmbeddings(inner, store)
+    queries = [f"{SEARCH_QUERIES[i % len(SEARCH_QUERIES)]} {i}" for i in range(requests)]
+
+    results = {"requests": requests, "concurrency": concurrency}
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for name in ("cold", "warm"):
+            calls_before = inner.call_count
+            start = time.perf_counter()
+            list(pool.map(cached.embed_query, queries))
+            results[name] = {
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+                "model_calls": inner.call_count - calls_before
+            }
+    cached.close()
+    return results
+
+
+def bench_llm_scheduler(env: BenchmarkEnvironment, requests: int, concurrency: int) -> Dict[str, Any]:
+    """
+    A burst of classification prompts, a quarter of them repeats of one
+    popular question, against a fake model limited to 3000 requests per
+    minute with a burst of 20: sent straight to the model (429s fail the
+    call) versus through the LLM scheduler (429s retried with backoff,
+    repeats sharing one request).
+    """
+    from langchain_core.messages import SystemMessage
+    from llm_scheduler import LLMScheduler, ScheduledChatModel
+
+    prompts = [
+        SystemMessage(content=f'You are a question classifier. Customer Question: "{SEARCH_QUERIES[0] if i % 4 == 0 else f"question {i}"}"')
+        for i in range(requests)
+    ]
+
+    def limited_model():
+        return FakeChatModel(latency=env.args.llm_latency, requests_per_minute=3000, burst=20)
+
+    def run(llm):
+        def call(prompt):
+            try:
+                llm.invoke([prompt])
+                return True
+            except Exception:
+                return False
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            succeeded = sum(pool.map(call, prompts))
+        return {"succeeded": succeeded, "elapsed_ms": round((time.perf_counter() - start) * 1000, 3)}
+
+    results = {"requests": requests, "concurrency": concurrency}
+    direct = limited_model()
+    results["direct"] = dict(run(direct), model_calls=direct.call_count, rate_limited=direct.rate_limited_count)
+
+    scheduled = limited_model()
+    scheduler = LLMScheduler(max_retries=8, base_delay=0.05, max_delay=1.0)
+    results["scheduled"] = dict(
+        run(ScheduledChatModel(inner=scheduled, scheduler=scheduler)),
+        model_calls=scheduled.call_count,
+        rate_limited=scheduled.rate_limited_count
+    )
+    return results
+
+
+def _synthetic_vector_pages(count: int, dimensions: int, page_size: int, seed: int = 0):
+    """
+    Yield (ids, vectors, metadatas, documents) pages of random reviews.
+    """
+    rng = np.random.default_rng(seed)
+    for start in range(0, count, page_size):
+        size = min(page_size, count - start)
+        vectors = rng.standard_normal((size, dimensions), dtype=np.float32)
+        products = rng.integers(len(PRODUCTS), size=size)
+        ratings = rng.integers(1, 6, size=size)
+        months = rng.integers(1, 13, size=size)
+        ids = [f"review-{start + i}" for i in range(size)]
+        metadatas = [
+            {"product": PRODUCTS[p], "rating": f"{r}/5", "rating_value": float(r), "date": f"2024-{m:02d}-15"}
+            for p, r, m in zip(products, ratings, months)
+        ]
+        documents = [f"Synthetic review {start + i} of the {PRODUCTS[p].lower()}." for i, p in enumerate(products)]
+        yield ids, vectors, metadatas, documents
+
+
+def bench_search_backends(env: BenchmarkEnvironment, sizes: List[int], iterations: int, dimensions: int = 256) -> List[Dict[str, Any]]:
+    """
+    Top-10 review search on random embeddings: the Chroma path versus the
+    memory-mapped NumPy index, unfiltered and filtered to one product, one
+    product with 4+ stars, and one product within a month.
+    """
+    from datetime import date
+    from langchain_community.vectorstores import Chroma
+    from vector_index import ReviewVectorIndex, ReviewVectorIndexWriter
+
+    product = PRODUCTS[0]
+    rng = np.random.default_rng(1)
+
+    def query():
+        return rng.standard_normal(dimensions, dtype=np.float32)
+
+    results = []
+    for size in sizes:
+        page_size = min(size, 5000)
+        directory = os.path.join(env.directory, f"search_{size}")
+        _, embeddings = env.fakes()
+
+        start = time.perf_counter()
+        writer = ReviewVectorIndexWriter(os.path.join(directory, "numpy"), size, dimensions)
+        for page in _synthetic_vector_pages(size, dimensions, page_size):
+            writer.append(*page)
+        writer.finish(f"synthetic-{size}")
+        index = ReviewVectorIndex(os.path.join(directory, "numpy"))
+        numpy_build_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        vectorstore = Chroma(embedding_function=embeddings, persist_directory=os.path.join(directory, "chroma"))
+        for ids, vectors, metadatas, documents in _synthetic_vector_pages(size, dimensions, page_size):
+            vectorstore._collection.add(ids=ids, embeddings=vectors.tolist(), metadatas=metadatas, documents=documents)
+        chroma_build_ms = (time.perf_counter() - start) * 1000
+
+        results.append({
+            "reviews": size,
+            "dimensions": dimensions,
+            "numpy_build_ms": round(numpy_build_ms, 3),
+            "chroma_build_ms": round(chroma_build_ms, 3),
+            "chroma": timings(lambda: vectorstore.similarity_search_by_vector(query().tolist(), k=10), iterations),
+            "chroma_product_filter": timings(
+                lambda: vectorstore.similarity_search_by_vector(query().tolist(), k=10, filter={"product": product}),
+                iterations
+            ),
+            "numpy": timings(lambda: index.search(query(), 10), iterations),
+            "numpy_product_filter": timings(lambda: index.search(query(), 10, products=[product]), iterations),
+            "numpy_product_rating_filter": timings(
+                lambda: index.search(query(), 10, products=[product], min_rating=4.0), iterations
+            ),
+            "numpy_product_date_filter": timings(
+                lambda: index.search(query(), 10, products=[product], start=date(2024, 3, 1), end=date(2024, 3, 31)),
+                iterations
+            )
+        })
+        del index
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def bench_routes(bot, iterations: int) -> Dict[str, Any]:
+    results = {}
+    for route, question in ROUTE_QUESTIONS.items():
+        observed = bot.graph.invoke(bot._initial_state(question, session_id=f"bench-{route}"))["question_type"]
+        results[route] = dict(
+            timings(lambda: bot.graph.invoke(bot._initial_state(question, session_id=f"bench-{route}")), iterations),
+            observed_route=observed
+        )
+    return results
+
+
+def _counter(name: str, **labels) -> float:
+    from metrics import METRICS
+
+    wanted = {label: str(value) for label, value in labels.items()}
+    return sum(c["value"] for c in METRICS.snapshot()["counters"] if c["name"] == name and c["labels"] == wanted)
+
+
+def bench_speculative_faq(env: BenchmarkEnvironment, bot_class, iterations: int) -> Dict[str, Any]:
+    """
+    Per-route graph latency with every question classified by the LLM (the
+    embedding router off), with and without SPECULATIVE_FAQ, plus the
+    speculation hit/miss counts and tokens spent on discarded answers.
+    """
+    results = {}
+    previous = {name: os.environ.get(name) for name in ("ROUTER_ENABLED", "SPECULATIVE_FAQ")}
+    try:
+        for enabled in (False, True):
+            os.environ.update({"ROUTER_ENABLED": "false", "SPECULATIVE_FAQ": str(enabled).lower()})
+            before = {result: _counter("speculative_answers", result=result) for result in ("hit", "miss")}
+            wasted_before = _counter("speculative_wasted_tokens")
+            llm, embeddings = env.fakes()
+            bot = bot_class(llm=llm, embeddings=embeddings)
+            routes = bench_routes(bot, iterations)
+            bot.close()
+            results["speculative" if enabled else "sequential"] = dict(
+                routes,
+                hits=_counter("speculative_answers", result="hit") - before["hit"],
+                misses=_counter("speculative_answers", result="miss") - before["miss"],
+                wasted_tokens=_counter("speculative_wasted_tokens") - wasted_before
+            )
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+    return results
+
+
+async def _throughput(bot, requests: int, concurrency: int) -> Dict[str, Any]:
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+    semaphore = asyncio.Semaphore(concurrency)
+    questions = list(ROUTE_QUESTIONS.values())
+    latencies: List[float] = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await bot.graph.ainvoke(bot._initial_state(questions[i % len(questions)], session_id=f"bench-{i}"))
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 2),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3)
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for CustomerServiceBot")
+    parser.add_argument("--output", default=os.path.join(REPO_ROOT, "bench_results.json"), help="JSON results file")
+    parser.add_argument("--reviews", type=int, default=2000, help="synthetic reviews for index/search/graph benchmarks")
+    parser.add_argument("--parse-sizes", default="1000,10000,100000", help="comma-separated corpus sizes for the parser benchmark")
+    parser.add_argument(
+        "--search-sizes",
+        default="10000,100000",
+        help="comma-separated corpus sizes for the Chroma vs NumPy search benchmark (e.g. add 1000000)"
+    )
+    parser.add_argument("--iterations", type=int, default=20, help="repetitions per timed operation")
+    parser.add_argument("--requests", type=int, default=200, help="requests in the concurrent throughput benchmark")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent graph invocations in the throughput benchmark")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="injected seconds per fake LLM call")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="injected seconds per fake LLM output token")
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="injected seconds per fake embedding call")
+    parser.add_argument("--embed-per-text-latency", type=float, default=0.0005, help="injected seconds per embedded text")
+    args = parser.parse_args()
+
+    from main import CustomerServiceBot, console
+
+    results: Dict[str, Any] = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": vars(args).copy()
+    }
+    results["config"].pop("output")
+
+    with SmtpSink() as sink:
+        env = BenchmarkEnvironment(args, sink)
+        try:
+            console.print("[bold blue]Cold start[/bold blue]")
+            results["cold_start"] = bench_cold_start(env, CustomerServiceBot, args.reviews)
+
+            llm, embeddings = env.fakes()
+            bot = CustomerServiceBot(llm=llm, embeddings=embeddings)
+            # The warm-up is still reading reviews.md, which bench_parse rewrites
+            bot.reviews_vectorstore
+
+            console.print("[bold blue]Review parsing[/bold blue]")
+            results["parse_reviews"] = [
+                bench_parse(bot, int(size), max(1, args.iterations // 4)) for size in args.parse_sizes.split(",")
+            ]
+
+            # The parser benchmark overwrote reviews.md; rebuild the index it describes
+            write_synthetic_reviews("reviews.md", args.reviews)
+            bot.reviews_vectorstore = bot._setup_reviews_vectorstore()
+
+            console.print("[bold blue]Review search[/bold blue]")
+            results["search_reviews"] = bench_search(bot, args.iterations)
+
+            console.print("[bold blue]Search backends (Chroma vs NumPy)[/bold blue]")
+            results["search_backends"] = bench_search_backends(
+                env, [int(size) for size in args.search_sizes.split(",")], args.iterations
+            )
+
+            console.print("[bold blue]Embedding cache[/bold blue]")
+            results["embedding_cache"] = bench_embedding_cache(env, args.requests, args.concurrency)
+
+            console.print("[bold blue]LLM scheduler under rate limits[/bold blue]")
+            results["llm_scheduler"] = bench_llm_scheduler(env, args.requests, args.concurrency)
+
+            console.print("[bold blue]End-to-end graph per route[/bold blue]")
+            results["graph_invoke"] = bench_routes(bot, args.iterations)
+
+            console.print("[bold blue]Speculative FAQ answering[/bold blue]")
+            results["speculative_faq"] = bench_speculative_faq(env, CustomerServiceBot, args.iterations)
+
+            console.print("[bold blue]Concurrent throughput[/bold blue]")
+            results["throughput"] = asyncio.run(_throughput(bot, args.requests, args.concurrency))
+
+            bot.close()
+            results["smtp_messages"] = sink.message_count
+        finally:
+            env.close()
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    console.print_json(json.dumps(results))
+    console.print(f"[bold blue]Results written to {args.output}[/bold blue]")
+
+
+if __name__ == "__main__":
+    main()
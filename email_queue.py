@@ -0,0 +1,300 @@
+import os
+import time
+import random
+import hashlib
+import smtplib
+import sqlite3
+import threading
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from rich.console import Console
+
+from metrics import METRICS
+
+console = Console()
+
+
+def smtp_config_from_env() -> Dict[str, Any]:
+    """
+    SMTP settings for escalation emails, read from the environment.
+    """
+    return {
+        "server": os.getenv("SMTP_SERVER", "smtp.gmail.com"),
+        "port": int(os.getenv("SMTP_PORT", "587")),
+        "username": os.getenv("EMAIL_USERNAME"),
+        "password": os.getenv("EMAIL_PASSWORD"),
+        "starttls": os.getenv("SMTP_STARTTLS", "true").lower() == "true",
+        "assistance_email": os.getenv("ASSISTANCE_EMAIL", "lzhouzyj@gmail.com")
+    }
+
+
+def build_assistance_message(sender: str, recipient: str, session_id: str, customer_inquiry: str, created_at: float) -> str:
+    """
+    Render the escalation email sent to the human support team.
+    """
+    created = datetime.fromtimestamp(created_at)
+
+    msg = MIMEMultipart()
+    msg['From'] = sender
+    msg['To'] = recipient
+    msg['Subject'] = f"Customer Service Assistance Request - {created.strftime('%Y-%m-%d %H:%M')}"
+
+    body = f"""
+Customer Inquiry Summary:
+{customer_inquiry}
+
+This inquiry could not be answered by the automated chatbot and requires human assistance.
+
+Session: {session_id}
+Timestamp: {created.isoformat()}
+"""
+    msg.attach(MIMEText(body, 'plain'))
+    return msg.as_string()
+
+
+class EscalationQueue:
+    """
+    Durable SQLite-backed queue of escalation emails.
+
+    Enqueueing is a single local insert, so the conversation never waits on
+    the mail server. Repeats of the same inquiry from the same session within
+    the dedupe window are dropped.
+    """
+
+    def __init__(self, path: str = "escalations.db", dedupe_window: float = 3600.0):
+        self.path = path
+        self.dedupe_window = dedupe_window
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS escalations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    inquiry TEXT NOT NULL,
+                    dedupe_key TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_error TEXT
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS escalations_due ON escalations (status, next_attempt_at)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS escalations_dedupe ON escalations (dedupe_key, created_at)"
+            )
+
+    @staticmethod
+    def dedupe_key(session_id: str, customer_inquiry: str) -> str:
+        normalized = " ".join(customer_inquiry.lower().split())
+        return hashlib.sha256(f"{session_id}\x1f{normalized}".encode("utf-8")).hexdigest()
+
+    def enqueue(self, session_id: str, customer_inquiry: str) -> bool:
+        """
+        Queue an escalation. Returns False if it duplicates a recent one from
+        the same session (which is already queued or sent).
+        """
+        now = time.time()
+        key = self.dedupe_key(session_id, customer_inquiry)
+        with self._lock, self._conn:
+            duplicate = self._conn.execute(
+                "SELECT 1 FROM escalations WHERE dedupe_key = ? AND created_at >= ? AND status != 'failed' LIMIT 1",
+                (key, now - self.dedupe_window)
+            ).fetchone()
+            if duplicate:
+                return False
+            self._conn.execute(
+                "INSERT INTO escalations (session_id, inquiry, dedupe_key, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (session_id, customer_inquiry, key, now, now)
+            )
+        return True
+
+    def due(self, limit: int) -> List[sqlite3.Row]:
+        """
+        Pending escalations whose next attempt is due, oldest first.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT * FROM escalations WHERE status = 'pending' AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at, id LIMIT ?",
+                (time.time(), limit)
+            ).fetchall()
+
+    def mark_sent(self, ids: List[int]):
+        if not ids:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE escalations SET status = 'sent', attempts = attempts + 1, last_error = NULL WHERE id = ?",
+                [(escalation_id,) for escalation_id in ids]
+            )
+
+    def mark_retry(self, escalation_id: int, error: str, delay: float, give_up: bool):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE escalations SET status = ?, attempts = attempts + 1, next_attempt_at = ?, last_error = ? "
+                "WHERE id = ?",
+                ("failed" if give_up else "pending", time.time() + delay, error, escalation_id)
+            )
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM escalations GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class EscalationWorker(threading.Thread):
+    """
+    Background thread that drains the escalation queue over one reused,
+    authenticated SMTP connection. Sends are batched per wake-up, failures
+    are retried with jittered exponential backoff, and the connection is
+    dropped after it has been idle for a while.
+    """
+
+    def __init__(
+        self,
+        queue: EscalationQueue,
+        smtp_config: Dict[str, Any],
+        batch_size: int = 20,
+        poll_interval: float = 5.0,
+        max_attempts: int = 6,
+        backoff_base: float = 5.0,
+        backoff_max: float = 900.0,
+        idle_timeout: float = 60.0
+    ):
+        super().__init__(name="escalation-worker", daemon=True)
+        self.queue = queue
+        self.smtp_config = smtp_config
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.idle_timeout = idle_timeout
+
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    def notify(self):
+        """
+        Wake the worker after an enqueue instead of waiting for the next poll.
+        """
+        self._wake.set()
+
+    def stop(self, timeout: float = 10.0):
+        self._stopping.set()
+        self._wake.set()
+        self.join(timeout)
+
+    def _connect(self) -> smtplib.SMTP:
+        config = self.smtp_config
+        METRICS.incr("smtp_connects")
+        server = smtplib.SMTP(config["server"], config["port"], timeout=30)
+        if config["starttls"]:
+            server.starttls()
+        if config["username"] and config["password"]:
+            server.login(config["username"], config["password"])
+        return server
+
+    def _connection(self) -> smtplib.SMTP:
+        if self._smtp is not None:
+            try:
+                self._smtp.noop()
+            except (smtplib.SMTPException, OSError):
+                self._disconnect()
+        if self._smtp is None:
+            self._smtp = self._connect()
+        return self._smtp
+
+    def _disconnect(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempts))
+        return delay * random.uniform(0.5, 1.0)
+
+    def drain_once(self) -> int:
+        """
+        Send one batch of due escalations. Returns the number sent.
+        """
+        batch = self.queue.due(self.batch_size)
+        if not batch:
+            return 0
+
+        sender = self.smtp_config["username"]
+        recipient = self.smtp_config["assistance_email"]
+        sent_ids = []
+        retried_ids = []
+        try:
+            server = self._connection()
+            for row in batch:
+                if self._stopping.is_set():
+                    break  # The rest stay queued for the next start
+                message = build_assistance_message(sender, recipient, row["session_id"], row["inquiry"], row["created_at"])
+                try:
+                    with METRICS.timed("smtp_send"):
+                        server.sendmail(sender, recipient, message)
+                    sent_ids.append(row["id"])
+                except smtplib.SMTPServerDisconnected:
+                    raise
+                except Exception as e:
+                    # Rejected message (e.g. bad recipient); the connection is still usable
+                    attempts = row["attempts"] + 1
+                    self.queue.mark_retry(row["id"], str(e), self._backoff(attempts), attempts >= self.max_attempts)
+                    METRICS.incr("smtp_retries", reason="rejected")
+                    retried_ids.append(row["id"])
+            self._last_used = time.monotonic()
+        except Exception as e:
+            # Connection-level failure: retry everything not yet sent
+            console.print(f"[red]Error sending escalation emails: {str(e)}[/red]")
+            self._disconnect()
+            handled = set(sent_ids) | set(retried_ids)
+            for row in batch:
+                if row["id"] not in handled:
+                    attempts = row["attempts"] + 1
+                    self.queue.mark_retry(row["id"], str(e), self._backoff(attempts), attempts >= self.max_attempts)
+                    METRICS.incr("smtp_retries", reason="connection")
+        finally:
+            self.queue.mark_sent(sent_ids)
+            METRICS.incr("escalations_sent", len(sent_ids))
+
+        return len(sent_ids)
+
+    def run(self):
+        while not self._stopping.is_set():
+            self._wake.clear()
+            try:
+                sent = self.drain_once()
+            except Exception as e:
+                console.print(f"[red]Escalation worker error: {str(e)}[/red]")
+                sent = 0
+
+            if sent >= self.batch_size:
+                continue  # More may be due right away
+
+            if self._smtp is not None and time.monotonic() - self._last_used > self.idle_timeout:
+                self._disconnect()
+
+            self._wake.wait(self.poll_interval)
+
+        self._disconnect()
@@ -0,0 +1,247 @@
+import time
+import queue
+import hashlib
+import sqlite3
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from metrics import METRICS
+
+
+class EmbeddingStore:
+    """
+    Disk-backed SQLite store of float32 embedding vectors, keyed on a hash of
+    model and text. When it grows past max_entries, the least recently used
+    tenth is evicted.
+    """
+
+    def __init__(self, path: str = "embeddings_cache.db", max_entries: int = 200000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings (last_used)")
+            self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self.evictions = 0
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """
+        The stored vectors for whichever keys are present. Marks them used.
+        """
+        if not keys:
+            return {}
+        found = {}
+        now = time.time()
+        with self._lock, self._conn:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+                if rows:
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE key IN ({','.join('?' * len(rows))})",
+                        [now] + [key for key, _ in rows]
+                    )
+        return found
+
+    def put_many(self, vectors: Dict[str, List[float]]):
+        if not vectors:
+            return
+        now = time.time()
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in vectors.items()]
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            self._size += self._conn.total_changes - before
+            if self._size > self.max_entries:
+                # Evict down to 90% so eviction does not run on every insert
+                excess = self._size - int(self.max_entries * 0.9)
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (excess,)
+                )
+                self._size -= excess
+                self.evictions += excess
+
+    def __len__(self) -> int:
+        return self._size
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves repeated texts from an EmbeddingStore and
+    merges concurrent cache misses into shared batched calls to the wrapped
+    model.
+
+    Misses go to a single batching thread. It waits up to batch_window
+    seconds for other requests to arrive, then embeds their distinct texts
+    together (up to max_batch texts) in one call. Queries and documents share
+    cache entries. This assumes the wrapped model embeds a query the same way
+    as a document, as OpenAI embedding models do.
+
+    A caller waits at most timeout seconds for its batch. Once closed, the
+    wrapper raises RuntimeError instead of embedding.
+    """
+
+    def __init__(self, inner: Embeddings, store: EmbeddingStore, batch_window: float = 0.005, max_batch: int = 256,
+                 timeout: float = 120.0):
+        self.inner = inner
+        self.store = store
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.model = getattr(inner, "model", type(inner).__name__)
+        # Requesting a different output size changes every vector
+        self._key_prefix = f"{self.model}\x1f{getattr(inner, 'dimensions', None)}\x1f"
+
+        self._pending: "queue.Queue[Optional[Tuple[List[str], Future]]]" = queue.Queue()
+        self._batcher: Optional[threading.Thread] = None
+        self._batcher_lock = threading.Lock()
+        self._closed = False
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256((self._key_prefix + text).encode("utf-8")).hexdigest()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self._closed:
+            raise RuntimeError("CachedEmbeddings is closed")
+        keys = [self._key(text) for text in texts]
+        cached = self.store.get_many(list(set(keys)))
+
+        missing = {key: text for key, text in zip(keys, texts) if key not in cached}
+        misses = sum(key not in cached for key in keys)
+        METRICS.incr("embedding_cache_lookups", len(keys) - misses, result="hit")
+        METRICS.incr("embedding_cache_lookups", misses, result="miss")
+
+        if missing:
+            # Texts another caller is already embedding are waited for, not re-sent
+            owned: Dict[str, str] = {}
+            waiting: Dict[str, Future] = {}
+            with self._inflight_lock:
+                for key, text in missing.items():
+                    if key in self._inflight:
+                        waiting[key] = self._inflight[key]
+                    else:
+                        self._inflight[key] = Future()
+                        owned[key] = text
+
+            if owned:
+                try:
+                    vectors = self._embed_batched(list(owned.values()))
+                except BaseException as e:
+                    self._resolve(owned, error=e)
+                    raise
+                fresh = dict(zip(owned.keys(), vectors))
+                self.store.put_many(fresh)
+                self._resolve(fresh)
+                cached.update({key: np.asarray(vector, dtype=np.float32) for key, vector in fresh.items()})
+
+            for key, future in waiting.items():
+                cached[key] = np.asarray(future.result(timeout=self.timeout), dtype=np.float32)
+
+        return [cached[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def _resolve(self, results: Dict[str, object], error: Optional[BaseException] = None):
+        with self._inflight_lock:
+            futures = {key: self._inflight.pop(key) for key in results}
+        for key, future in futures.items():
+            if error is None:
+                future.set_result(results[key])
+            else:
+                future.set_exception(error)
+
+    def _embed_batched(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts via the batching thread, which may combine them with
+        other callers' texts.
+        """
+        future: Future = Future()
+        with self._batcher_lock:
+            if self._closed:
+                raise RuntimeError("CachedEmbeddings is closed")
+            if self._batcher is None:
+                self._batcher = threading.Thread(target=self._run_batcher, name="embedding-batcher", daemon=True)
+                self._batcher.start()
+            self._pending.put((texts, future))
+        return future.result(timeout=self.timeout)
+
+    def _run_batcher(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            requests = [item]
+            total = len(item[0])
+            deadline = time.monotonic() + self.batch_window
+            while total < self.max_batch:
+                try:
+                    item = self._pending.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._pending.put(None)  # Finish this batch, then stop
+                    break
+                requests.append(item)
+                total += len(item[0])
+            self._embed_requests(requests)
+
+    def _embed_requests(self, requests: List[Tuple[List[str], Future]]):
+        unique: Dict[str, int] = {}
+        for texts, _ in requests:
+            for text in texts:
+                unique.setdefault(text, len(unique))
+
+        try:
+            vectors = self.inner.embed_documents(list(unique))
+        except BaseException as e:
+            for _, future in requests:
+                future.set_exception(e)
+            return
+
+        METRICS.incr("embedding_batches")
+        METRICS.incr("embedding_batched_requests", len(requests))
+        for texts, future in requests:
+            future.set_result([vectors[unique[text]] for text in texts])
+
+    def close(self):
+        with self._batcher_lock:
+            if self._closed:
+                return
+            self._closed = True
+            batcher, self._batcher = self._batcher, None
+            if batcher is not None:
+                self._pending.put(None)
+        if batcher is not None:
+            batcher.join(5)
+        self.store.close()
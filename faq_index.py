@@ -0,0 +1,174 @@
+import re
+import math
+from collections import Counter
+from typing import Any, Dict, List
+
+import numpy as np
+
+from retrieval import reciprocal_rank_fusion
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count (about four characters per token for English text).
+    """
+    return len(text) // 4 + 1
+
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def split_faq_sections(faq_text: str) -> List[Dict[str, Any]]:
+    """
+    Split faq.md into sections: one per "**Q:" entry, labelled with its
+    "## " heading. Headings without Q/A entries become a single section.
+    """
+    sections = []
+    heading = ""
+    block: List[str] = []
+
+    def flush():
+        body = "\n".join(block).strip()
+        if not body:
+            return
+        entries = re.split(r"\n(?=\*\*Q:)", body)
+        for entry in entries:
+            entry = entry.strip()
+            if entry:
+                text = f"## {heading}\n{entry}" if heading else entry
+                sections.append({"heading": heading, "text": text})
+
+    for line in faq_text.splitlines():
+        if line.startswith("## "):
+            flush()
+            heading = line[3:].strip()
+            block = []
+        elif line.startswith("# "):
+            continue  # Document title
+        else:
+            block.append(line)
+    flush()
+
+    for section_id, section in enumerate(sections):
+        section["section_id"] = section_id
+        question = re.search(r"\*\*Q:\s*(.+?)\*\*", section["text"])
+        section["question"] = question.group(1).strip() if question else ""
+        section["tokens"] = estimate_tokens(section["text"])
+    return sections
+
+
+class BM25Index:
+    """
+    Okapi BM25 keyword index over a fixed list of texts.
+    """
+
+    def __init__(self, texts: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_counts = [Counter(tokenize(text)) for text in texts]
+        self.lengths = [sum(counts.values()) for counts in self.term_counts]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+        document_frequency = Counter()
+        for counts in self.term_counts:
+            document_frequency.update(counts.keys())
+        n = len(texts)
+        self.idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+    def scores(self, query: str) -> List[float]:
+        query_terms = [term for term in tokenize(query) if term in self.idf]
+        results = []
+        for counts, length in zip(self.term_counts, self.lengths):
+            score = 0.0
+            for term in query_terms:
+                tf = counts.get(term, 0)
+                if tf:
+                    norm = self.k1 * (1 - self.b + self.b * length / (self.avg_length or 1))
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            results.append(score)
+        return results
+
+
+class FaqIndex:
+    """
+    Hybrid (embedding + BM25) index over FAQ sections, so prompts carry only
+    the sections relevant to the question instead of the whole FAQ.
+    """
+
+    def __init__(self, faq_text: str, embeddings=None):
+        self.sections = split_faq_sections(faq_text)
+        self.embeddings = embeddings
+        self.bm25 = BM25Index([section["text"] for section in self.sections])
+        self.vectors = None
+        self.question_vectors = None
+
+        if embeddings is not None and self.sections:
+            # Sections and their questions are embedded in one call
+            texts = [section["text"] for section in self.sections]
+            questions = [section["question"] for section in self.sections if section["question"]]
+            vectors = np.asarray(embeddings.embed_documents(texts + questions), dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms == 0, 1, norms)
+            self.vectors = vectors[:len(texts)]
+            self.question_vectors = vectors[len(texts):]
+
+    def search(self, question: str, k: int = 4, vector=None) -> List[Dict[str, Any]]:
+        """
+        Return up to k sections ranked by reciprocal-rank fusion of embedding
+        similarity and BM25. Pass the question's embedding as vector if it has
+        already been computed.
+        """
+        if not self.sections:
+            return []
+
+        bm25_scores = self.bm25.scores(question)
+        rankings = [[i for i in np.argsort(bm25_scores)[::-1] if bm25_scores[i] > 0]]
+
+        if self.vectors is not None:
+            try:
+                if vector is None:
+                    vector = self.embeddings.embed_query(question)
+                query_vector = np.asarray(vector, dtype=np.float32)
+                rankings.append(list(np.argsort(self.vectors @ query_vector)[::-1]))
+            except Exception:
+                pass  # Keyword ranking alone is still useful
+
+        fused = reciprocal_rank_fusion(rankings, key=int)
+        return [self.sections[int(i)] for i in fused[:k]]
+
+    def relevance(self, question: str, vector=None) -> float:
+        """
+        Cosine similarity between the question and the closest FAQ question
+        or section; 0.0 without embeddings.
+        """
+        if self.vectors is None:
+            return 0.0
+        if vector is None:
+            vector = self.embeddings.embed_query(question)
+        query_vector = np.array(vector, dtype=np.float32)
+        norm = np.linalg.norm(query_vector)
+        if not norm:
+            return 0.0
+        query_vector /= norm
+        best = float(np.max(self.vectors @ query_vector))
+        if len(self.question_vectors):
+            best = max(best, float(np.max(self.question_vectors @ query_vector)))
+        return best
+
+    def context(self, question: str, k: int = 4, token_budget: int = 1500, vector=None) -> str:
+        """
+        Relevant FAQ sections for the question, most relevant first, within
+        the token budget. The best section is always included.
+        """
+        selected = []
+        used = 0
+        for section in self.search(question, k, vector):
+            if selected and used + section["tokens"] > token_budget:
+                break
+            selected.append(section["text"])
+            used += section["tokens"]
+        return "\n\n".join(selected)
@@ -0,0 +1,149 @@
+import threading
+from typing import Callable, List, Optional
+
+from rich.console import Console
+
+console = Console()
+
+
+class KnowledgeSnapshot:
+    """
+    The FAQ and reviews data the bot answers from. A reload builds a new
+    snapshot and swaps it in whole, while turns that are already running keep
+    the snapshot they started with. Clean-up that would break those turns
+    (deleting removed reviews from the shared vector store) waits until the
+    retired snapshot has no turns left.
+    """
+
+    def __init__(self, faq_digest: str = "", reviews_digest: str = ""):
+        self.faq_digest = faq_digest
+        self.reviews_digest = reviews_digest
+        self.faq_data = None
+        self.faq_index = None
+        self.question_router = None
+        self.review_analytics = None
+        self.reviews_vectorstore = None
+        self.review_vector_index = None
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._retired = False
+        self._on_drained: List[Callable[[], None]] = []
+
+    @property
+    def digest(self) -> str:
+        return f"{self.faq_digest}:{self.reviews_digest}"
+
+    def copy(self) -> "KnowledgeSnapshot":
+        """
+        A new, live snapshot sharing this one's data, to be partly rebuilt.
+        """
+        snapshot = KnowledgeSnapshot(self.faq_digest, self.reviews_digest)
+        for field in ("faq_data", "faq_index", "question_router", "review_analytics", "reviews_vectorstore", "review_vector_index"):
+            setattr(snapshot, field, getattr(self, field))
+        return snapshot
+
+    def acquire(self) -> bool:
+        """
+        Register a turn using this snapshot. Returns False once it is retired.
+        """
+        with self._lock:
+            if self._retired:
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+            callbacks = self._drained_callbacks()
+        self._run(callbacks)
+
+    def retire(self, on_drained: Optional[Callable[[], None]] = None):
+        """
+        Stop new turns from using this snapshot and run on_drained once the
+        turns already using it have finished.
+        """
+        with self._lock:
+            self._retired = True
+            if on_drained is not None:
+                self._on_drained.append(on_drained)
+            callbacks = self._drained_callbacks()
+        self._run(callbacks)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _drained_callbacks(self) -> List[Callable[[], None]]:
+        # Caller holds the lock
+        if not self._retired or self._in_flight:
+            return []
+        callbacks, self._on_drained = self._on_drained, []
+        return callbacks
+
+    def _run(self, callbacks: List[Callable[[], None]]):
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                console.print(f"[red]Error cleaning up retired knowledge snapshot: {str(e)}[/red]")
+
+
+class KnowledgeField:
+    """
+    Bot attribute stored on the knowledge snapshot the current turn is using
+    (or on the live snapshot outside a turn), so existing code can keep
+    reading self.faq_index and friends unchanged.
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, bot, owner=None):
+        if bot is None:
+            return self
+        return getattr(bot._knowledge(), self.name)
+
+    def __set__(self, bot, value):
+        setattr(bot._knowledge(), self.name, value)
+
+
+class SnapshotFingerprint:
+    """
+    Response-cache fingerprint that changes when a new knowledge snapshot is
+    swapped in. Using it instead of the files' content means answers are not
+    invalidated before the knowledge they depend on has actually been
+    reloaded.
+    """
+
+    def __init__(self, current_snapshot: Callable[[], KnowledgeSnapshot]):
+        self.current_snapshot = current_snapshot
+
+    def current(self) -> str:
+        return self.current_snapshot().digest
+
+
+class KnowledgeWatcher(threading.Thread):
+    """
+    Polls faq.md and reviews.md and reloads the bot's knowledge when either
+    changes.
+    """
+
+    def __init__(self, bot, interval: float = 5.0):
+        super().__init__(name="knowledge-watcher", daemon=True)
+        self.bot = bot
+        self.interval = interval
+        self._stopping = threading.Event()
+
+    def run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                if self.bot.knowledge_changed():
+                    self.bot.reload_knowledge()
+            except Exception as e:
+                console.print(f"[red]Error reloading knowledge: {str(e)}[/red]")
+
+    def stop(self):
+        self._stopping.set()
+        self.join(5)
@@ -0,0 +1,433 @@
+import json
+import time
+import heapq
+import random
+import hashlib
+import itertools
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from faq_index import estimate_tokens
+from metrics import METRICS
+
+# When calls queue for capacity, lower ranks are sent first
+PRIORITIES = {"answer": 0, "auxiliary": 1}
+
+
+def is_rate_limit(error: BaseException) -> bool:
+    return getattr(error, "status_code", None) == 429
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Rate limits, server errors, timeouts and dropped connections. Matched by
+    attribute and class name so any OpenAI-compatible client (or a fake)
+    works without importing it here.
+    """
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError", "Timeout", "TimeoutError")
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """
+    Seconds the server asked us to wait, from Retry-After(-Ms) headers.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value:
+            try:
+                return float(value) * scale
+            except ValueError:
+                continue
+    return None
+
+
+class TokenBucket:
+    """
+    Holds up to `per_minute` units and refills at that rate. A limit of 0
+    means unlimited. The level can go negative when actual usage turns out
+    to exceed what was taken up front.
+    """
+
+    def __init__(self, per_minute: float = 0):
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """
+        Seconds until `amount` can be taken (0 if it can be taken now).
+        """
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        # Requests bigger than the bucket go through once it is full
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) * 60.0 / self.capacity)
+
+    def take(self, amount: float):
+        if self.capacity:
+            self.level -= min(amount, self.capacity)
+
+    def adjust(self, amount: float):
+        if self.capacity:
+            self.level = min(self.capacity, self.level - amount)
+
+
+class _ModelLimits:
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.waiters: List[Tuple[int, int]] = []  # Heap of (priority rank, arrival order)
+        self.paused_until = 0.0
+
+
+class LLMScheduler:
+    """
+    Shared gate in front of every chat model call in the process.
+
+    Each rate-limit group gets a token bucket for requests per minute and
+    one for estimated tokens per minute. A model is its own group unless
+    `groups` maps it to a shared one, as for providers that pool limits
+    across models. Calls wait in a per-group priority queue until both
+    buckets have room, so customer-facing answers go ahead of routing and
+    query rewriting when capacity is short. Priority only orders calls
+    within a group. Token estimates are corrected with the usage the API
+    reports.
+
+    Rate-limit (429) and transient errors are retried with jittered
+    exponential backoff. A 429 pauses the whole group, so every queued call
+    backs off together instead of each finding the limit on its own.
+    Identical prompts that are already in flight share one request.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_retries: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 20.0,
+        completion_tokens: int = 300,
+        groups: Optional[Dict[str, str]] = None
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # Completion length assumed up front when the model sets no max_tokens
+        self.completion_tokens = completion_tokens
+        self.groups = dict(groups or {})
+
+        self._condition = threading.Condition()
+        self._models: Dict[str, _ModelLimits] = {}
+        self._arrivals = itertools.count()
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+
+    def _limits(self, model: str) -> _ModelLimits:
+        # Caller holds the condition
+        group = self.groups.get(model, model)
+        limits = self._models.get(group)
+        if limits is None:
+            limits = _ModelLimits(self.requests_per_minute, self.tokens_per_minute)
+            self._models[group] = limits
+        return limits
+
+    def acquire(self, model: str, priority: str, tokens: int):
+        """
+        Block until the model's group has capacity for one request of `tokens`
+        estimated tokens and no higher-priority or earlier call is waiting.
+        """
+        start = time.perf_counter()
+        with self._condition:
+            limits = self._limits(model)
+            entry = (PRIORITIES.get(priority, len(PRIORITIES)), next(self._arrivals))
+            heapq.heappush(limits.waiters, entry)
+            try:
+                while True:
+                    timeout = None
+                    if limits.waiters[0] == entry:
+                        now = time.monotonic()
+                        timeout = max(
+                            limits.paused_until - now,
+                            limits.requests.wait_time(1, now),
+                            limits.tokens.wait_time(tokens, now)
+                        )
+                        if timeout <= 0:
+                            heapq.heappop(limits.waiters)
+                            limits.requests.take(1)
+                            limits.tokens.take(tokens)
+                            # The next call in line may fit as well
+                            self._condition.notify_all()
+                            break
+                    self._condition.wait(timeout)
+            except BaseException:
+                limits.waiters.remove(entry)
+                heapq.heapify(limits.waiters)
+                self._condition.notify_all()
+                raise
+        METRICS.observe("llm_queue_wait", time.perf_counter() - start, model=model, priority=priority)
+
+    def settle(self, model: str, estimated: int, actual: int):
+        """
+        Charge the difference between a call's estimated and reported tokens.
+        """
+        if not actual:
+            return
+        with self._condition:
+            self._limits(model).tokens.adjust(actual - estimated)
+            self._condition.notify_all()
+
+    def _pause(self, model: str, seconds: float):
+        with self._condition:
+            limits = self._limits(model)
+            limits.paused_until = max(limits.paused_until, time.monotonic() + seconds)
+            self._condition.notify_all()
+
+    def _backoff(self, model: str, attempt: int, error: BaseException) -> bool:
+        """
+        Wait before retrying a failed call. Returns False if it should not
+        be retried.
+        """
+        if not is_retryable(error) or attempt >= self.max_retries:
+            return False
+        ceiling = min(self.max_delay, self.base_delay * 2 ** attempt)
+        delay = max(random.uniform(ceiling / 2, ceiling), retry_after(error) or 0.0)
+        if is_rate_limit(error):
+            METRICS.incr("llm_scheduler_retries", model=model, reason="rate_limited")
+            # Held in the queue by acquire() along with every other call
+            self._pause(model, delay)
+        else:
+            METRICS.incr("llm_scheduler_retries", model=model, reason="error")
+            time.sleep(delay)
+        return True
+
+    def call(self, model: str, priority: str, tokens: int, fn: Callable[[], Any]) -> Any:
+        """
+        Run fn once the model has capacity, retrying transient failures.
+        """
+        attempt = 0
+        while True:
+            self.acquire(model, priority, tokens)
+            try:
+                return fn()
+            except Exception as e:
+                if not self._backoff(model, attempt, e):
+                    raise
+                attempt += 1
+
+    def stream(self, model: str, priority: str, tokens: int, open_stream: Callable[[], Iterator[Any]]) -> Iterator[Any]:
+        """
+        Like call() for a streaming response. Only failures before the first
+        chunk are retried; after that the caller has already seen output.
+        """
+        attempt = 0
+        while True:
+            self.acquire(model, priority, tokens)
+            stream = open_stream()
+            try:
+                first = next(stream)
+            except StopIteration:
+                return
+            except Exception as e:
+                if not self._backoff(model, attempt, e):
+                    raise
+                attempt += 1
+                continue
+            yield first
+            yield from stream
+            return
+
+    def join(self, key: str, shared: Callable[[], Any] = Future) -> Tuple[Any, bool]:
+        """
+        The shared result (a Future, or a SharedStream for streaming calls)
+        of an in-flight request, and whether the caller is the one who must
+        send it.
+        """
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            future = shared()
+            self._inflight[key] = future
+            return future, True
+
+    def finish(self, key: str, result: Any = None, error: Optional[BaseException] = None):
+        with self._inflight_lock:
+            future = self._inflight.pop(key)
+        if isinstance(future, SharedStream):
+            future.close(error)
+        elif error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+
+class StreamAbandoned(Exception):
+    """
+    The caller sending a shared streaming request stopped reading it.
+    """
+
+    def __init__(self):
+        super().__init__("The shared streaming request was abandoned part-way")
+
+
+class SharedStream:
+    """
+    The chunks of an in-flight streaming request, readable by any number of
+    followers as they arrive. Each follower iterates from the first chunk.
+    """
+
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self._condition = threading.Condition()
+        self._done = False
+        self._error: Optional[BaseException] = None
+
+    def append(self, chunk: Any):
+        with self._condition:
+            self.chunks.append(chunk)
+            self._condition.notify_all()
+
+    def close(self, error: Optional[BaseException] = None):
+        with self._condition:
+            self._done = True
+            self._error = error
+            self._condition.notify_all()
+
+    def __iter__(self) -> Iterator[Any]:
+        position = 0
+        while True:
+            with self._condition:
+                while position == len(self.chunks) and not self._done:
+                    self._condition.wait()
+                if position == len(self.chunks):
+                    if self._error is not None:
+                        raise self._error
+                    return
+                chunk = self.chunks[position]
+            position += 1
+            yield chunk
+
+
+def _usage_tokens(messages: List[BaseMessage]) -> int:
+    return sum((getattr(message, "usage_metadata", None) or {}).get("total_tokens", 0) for message in messages)
+
+
+class ScheduledChatModel(BaseChatModel):
+    """
+    Chat model that sends every call of the wrapped model through an
+    LLMScheduler at the given priority ("answer" or "auxiliary"). Callbacks,
+    tags and token streaming behave as for the wrapped model. Calls that
+    share an in-flight request get its output with no token usage, since
+    they cost nothing; a shared stream reaches them chunk by chunk as the
+    caller that sent it receives it.
+    """
+
+    inner: BaseChatModel
+    scheduler: Any
+    priority: str = "auxiliary"
+
+    @property
+    def _llm_type(self) -> str:
+        return self.inner._llm_type
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return self.inner._identifying_params
+
+    def _get_ls_params(self, stop: Optional[List[str]] = None, **kwargs: Any):
+        # Callbacks (metrics, tracing) see the wrapped model's name
+        params = self.inner._get_ls_params(stop=stop, **kwargs)
+        params.setdefault("ls_model_name", self._model())
+        return params
+
+    def _model(self) -> str:
+        return getattr(self.inner, "model_name", None) or getattr(self.inner, "model", None) or type(self.inner).__name__
+
+    def _key(self, messages: List[BaseMessage], stop: Optional[List[str]], kwargs: Dict[str, Any], stream: bool) -> str:
+        payload = json.dumps(
+            [self._model(), id(self.inner), stream, [(m.type, m.content) for m in messages], stop, sorted(kwargs.items())],
+            default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _estimate(self, messages: List[BaseMessage]) -> int:
+        prompt = sum(estimate_tokens(str(message.content)) for message in messages)
+        return prompt + (getattr(self.inner, "max_tokens", None) or self.scheduler.completion_tokens)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        model = self._model()
+        key = self._key(messages, stop, kwargs, stream=False)
+        future, leader = self.scheduler.join(key)
+        if not leader:
+            METRICS.incr("llm_coalesced", model=model, priority=self.priority)
+            result = future.result()
+            return ChatResult(generations=[
+                ChatGeneration(message=generation.message.model_copy(update={"usage_metadata": None, "id": None}))
+                for generation in result.generations
+            ])
+
+        estimated = self._estimate(messages)
+        try:
+            result = self.scheduler.call(
+                model, self.priority, estimated,
+                lambda: self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            )
+        except BaseException as e:
+            self.scheduler.finish(key, error=e)
+            raise
+        self.scheduler.settle(model, estimated, _usage_tokens([generation.message for generation in result.generations]))
+        self.scheduler.finish(key, result=result)
+        return result
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        model = self._model()
+        key = self._key(messages, stop, kwargs, stream=True)
+        shared, leader = self.scheduler.join(key, SharedStream)
+        if not leader:
+            METRICS.incr("llm_coalesced", model=model, priority=self.priority)
+            received = False
+            try:
+                for chunk in shared:
+                    received = True
+                    message = chunk.message.model_copy(update={"usage_metadata": None, "id": None})
+                    yield ChatGenerationChunk(message=message, generation_info=chunk.generation_info)
+            except StreamAbandoned:
+                if received:
+                    raise  # Our caller has seen part of an answer that will never finish
+                # Nothing arrived before the shared request was dropped; make our own
+                yield from self._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+            return
+
+        estimated = self._estimate(messages)
+        try:
+            for chunk in self.scheduler.stream(
+                model, self.priority, estimated,
+                lambda: self.inner._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+            ):
+                shared.append(chunk)
+                yield chunk
+        except Exception as e:
+            self.scheduler.finish(key, error=e)
+            raise
+        except BaseException:
+            # GeneratorExit: the caller stopped reading part-way
+            self.scheduler.finish(key, error=StreamAbandoned())
+            raise
+        self.scheduler.settle(model, estimated, _usage_tokens([chunk.message for chunk in shared.chunks]))
+        self.scheduler.finish(key)
@@ -1,36 +1,247 @@
 import os
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from typing import Dict, List, Any
-from datetime import datetime
-
-from langgraph.graph import StateGraph, END
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+import contextvars
+import hashlib
+import importlib
+import queue
+import threading
+import uuid
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Set, Tuple
+
+# langgraph, langchain_openai and Chroma are slow to import; they are
+# imported where first used so the bot can start answering sooner.
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from langchain_community.vectorstores import Chroma
 from langchain_core.documents import Document
 from rich.console import Console
 from rich.panel import Panel
 from dotenv import load_dotenv
 
+from email_queue import EscalationQueue, EscalationWorker, smtp_config_from_env
+from embedding_cache import CachedEmbeddings, EmbeddingStore
+from faq_index import FaqIndex
+from knowledge import KnowledgeField, KnowledgeSnapshot, KnowledgeWatcher, SnapshotFingerprint
+from llm_scheduler import LLMScheduler, ScheduledChatModel
+from metrics import METRICS, InstrumentedEmbeddings, MetricsCallbackHandler, MetricsDumper, trace_turn
+from response_cache import ContentFingerprint, SemanticResponseCache
+from retrieval import reciprocal_rank_fusion
+from review_analytics import ReviewAnalytics, extract_date_window, extract_rating_range, parse_date, parse_rating
+from router import EmbeddingQuestionRouter, route_examples
+from speculation import SpeculationRelay, SpeculativeAnswer
+from vector_index import ReviewVectorIndex, ids_fingerprint
+
 # Load environment variables
 load_dotenv()
 
 console = Console()
 
+# Tag on the LLM call that produces the customer-facing answer; streaming
+# forwards tokens from calls carrying it and ignores auxiliary calls.
+FINAL_ANSWER_TAG = "final_answer"
+# Tag on speculative FAQ answers; their tokens are only forwarded once the
+# route is known to be "faq" (see SpeculationRelay)
+SPECULATIVE_ANSWER_TAG = "speculative_answer"
+
+# Model tiers: task -> (model env var, default model, timeout env var,
+# default timeout in seconds, JSON output mode). Routing and query rewriting
+# are short structured tasks, so they default to a small, fast model.
+LLM_TIERS = {
+    "router": ("ROUTER_MODEL", "gpt-4.1-mini", "ROUTER_TIMEOUT", "10", True),
+    "rewrite": ("REWRITE_MODEL", "gpt-4.1-mini", "REWRITE_TIMEOUT", "10", True),
+    "answer": ("ANSWER_MODEL", None, "ANSWER_TIMEOUT", "60", False)
+}
+
 class CustomerServiceBot:
-    def __init__(self):
-        self.llm = ChatOpenAI(
-            model=os.getenv("OPENAI_MODEL", "gpt-4.1"),
+    # Everything derived from faq.md and reviews.md lives on a knowledge
+    # snapshot that reload_knowledge() replaces as a whole
+    faq_data = KnowledgeField()
+    faq_index = KnowledgeField()
+    question_router = KnowledgeField()
+    review_analytics = KnowledgeField()
+    review_vector_index = KnowledgeField()
+
+    def __init__(self, llm=None, embeddings=None):
+        # Checked before any background work (the reviews warm-up makes paid
+        # embedding calls) has started
+        self.smtp_config = self._smtp_config()
+        
+        # Seconds spent in each startup step; reviews_index is filled in by
+        # the background warm-up when it finishes
+        self.startup_timings: Dict[str, float] = {}
+        started = time.perf_counter()
+        
+        # llm/embeddings can be injected (e.g. stubs for local testing); an
+        # injected llm serves every tier
+        if llm is not None:
+            router_llm = rewrite_llm = answer_llm = llm
+        else:
+            router_llm, rewrite_llm, answer_llm = self._startup_step(
+                "llm_clients", lambda: [self._create_llm(task) for task in ("router", "rewrite", "answer")]
+            )
+        # Every LLM call goes through one scheduler that enforces rate limits,
+        # puts answers first and shares identical in-flight requests
+        self.llm_scheduler = self._setup_llm_scheduler()
+        self.router_llm = ScheduledChatModel(inner=router_llm, scheduler=self.llm_scheduler, priority="auxiliary")
+        self.rewrite_llm = ScheduledChatModel(inner=rewrite_llm, scheduler=self.llm_scheduler, priority="auxiliary")
+        self.answer_llm = ScheduledChatModel(inner=answer_llm, scheduler=self.llm_scheduler, priority="answer")
+        # Speculative answers may be thrown away, so they queue behind real ones
+        self.speculative_llm = ScheduledChatModel(inner=answer_llm, scheduler=self.llm_scheduler, priority="auxiliary")
+        self.llm = self.answer_llm
+        # Start the FAQ answer alongside LLM classification; see _can_answer_question
+        self.speculative_faq = os.getenv("SPECULATIVE_FAQ", "false").lower() == "true"
+        # Speculative answers get their own small pool, so they never hold up
+        # real work; when every worker is busy, speculation is skipped
+        speculative_workers = int(os.getenv("SPECULATIVE_FAQ_WORKERS", "4"))
+        self.speculation_executor = ThreadPoolExecutor(max_workers=speculative_workers, thread_name_prefix="speculation")
+        self._speculation_slots = threading.BoundedSemaphore(speculative_workers)
+        self.embeddings = InstrumentedEmbeddings(
+            self._setup_embedding_cache(embeddings or self._startup_step("embeddings_client", self._create_embeddings))
+        )
+        # Attached to every graph run; records LLM latency and token usage
+        self.metrics_callbacks = [MetricsCallbackHandler()]
+        self.trace_turns = os.getenv("TRACE_TURNS", "false").lower() == "true"
+        # Turns without a session id (the CLI chat) share one session per
+        # process, so escalation dedupe does not span separate CLI runs
+        self.cli_session_id = f"cli-{uuid.uuid4().hex[:12]}"
+        self.metrics_dumper = self._setup_metrics_dump()
+        # Shared pool for fanning out independent LLM/retrieval calls within a turn
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("BOT_WORKER_THREADS", "16")),
+            thread_name_prefix="bot-worker"
+        )
+        
+        # Digests are taken before the files are read, so an edit made while
+        # loading shows up as a change on the next check
+        self._faq_fingerprint = ContentFingerprint(["faq.md"])
+        self._reviews_fingerprint = ContentFingerprint(["reviews.md"])
+        self._snapshot = KnowledgeSnapshot(self._faq_fingerprint.current(), self._reviews_fingerprint.current())
+        # The snapshot a running turn started with; see _knowledge_scope()
+        self._turn_knowledge = contextvars.ContextVar(f"turn_knowledge_{id(self)}", default=None)
+        self._reload_lock = threading.Lock()
+        # Removed reviews still in the vector store for retired snapshots'
+        # turns; guarded by the reload lock
+        self._pending_deletes: Set[str] = set()
+        self._router_lock = threading.Lock()
+        
+        # The reviews index is the slowest part of startup and most turns
+        # never need it, so it is built on a background thread. Reviews
+        # questions wait for it only if it is not ready yet.
+        self._reviews_ready = threading.Event()
+        self._reviews_warmup = threading.Thread(target=self._warm_up_reviews, name="reviews-warmup", daemon=True)
+        self._reviews_warmup.start()
+        
+        # langgraph takes about half a second to import. Importing it here
+        # overlaps that with the FAQ embedding call; _build_graph's own import
+        # then waits for this one to finish.
+        threading.Thread(target=importlib.import_module, args=("langgraph.graph",), name="graph-import", daemon=True).start()
+        
+        self.faq_data = self._startup_step("faq", self._load_faq)
+        self.faq_index = self._startup_step("faq_index", lambda: self._setup_faq_index(self.faq_data))
+        self._startup_step("router", lambda: self._refresh_question_router(self._snapshot))
+        self.graph = self._startup_step("graph", self._build_graph)
+        self.response_cache = self._setup_response_cache()
+        self.escalation_queue, self.escalation_worker = self._startup_step("escalations", self._setup_escalations)
+        self.knowledge_watcher = self._setup_knowledge_watcher()
+        self.startup_timings["ready"] = time.perf_counter() - started
+    
+    def _startup_step(self, name: str, fn):
+        """
+        Run one startup step and record how long it took.
+        """
+        start = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            elapsed = time.perf_counter() - start
+            self.startup_timings[name] = elapsed
+            METRICS.observe("startup_step", elapsed, step=name)
+    
+    def _create_llm(self, task: str):
+        """
+        Build the chat model client for one tier of LLM_TIERS.
+        """
+        from langchain_openai import ChatOpenAI
+        model_env, default_model, timeout_env, default_timeout, json_mode = LLM_TIERS[task]
+        return ChatOpenAI(
+            model=os.getenv(model_env) or default_model or os.getenv("OPENAI_MODEL", "gpt-4.1"),
             temperature=0.1,
-            api_key=os.getenv("OPENAI_API_KEY")
+            timeout=float(os.getenv(timeout_env, default_timeout)),
+            # Retries are left to the LLM scheduler, which backs off per model
+            max_retries=0,
+            api_key=os.getenv("OPENAI_API_KEY"),
+            model_kwargs={"response_format": {"type": "json_object"}} if json_mode else {}
+        )
+    
+    def _setup_llm_scheduler(self) -> LLMScheduler:
+        """
+        Build the LLM scheduler. Rate limits apply per model, or per group
+        for models listed in LLM_RATE_LIMIT_GROUPS ("model:group,...");
+        0 (the default) leaves a limit off, so only 429s from the API slow
+        calls down.
+        """
+        groups = {}
+        for entry in os.getenv("LLM_RATE_LIMIT_GROUPS", "").split(","):
+            model, _, group = entry.partition(":")
+            if model.strip() and group.strip():
+                groups[model.strip()] = group.strip()
+        return LLMScheduler(
+            requests_per_minute=float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0")),
+            tokens_per_minute=float(os.getenv("LLM_TOKENS_PER_MINUTE", "0")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "4")),
+            base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5")),
+            max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY", "20")),
+            groups=groups
         )
-        self.embeddings = OpenAIEmbeddings(api_key=os.getenv("OPENAI_API_KEY"))
-        self.faq_data = self._load_faq()
-        self.reviews_vectorstore = self._setup_reviews_vectorstore()
-        self.graph = self._build_graph()
+    
+    def _create_embeddings(self):
+        from langchain_openai import OpenAIEmbeddings
+        return OpenAIEmbeddings(api_key=os.getenv("OPENAI_API_KEY"))
+    
+    def _setup_embedding_cache(self, embeddings):
+        """
+        Put the persistent embedding cache and request batching in front of
+        the embeddings model, if enabled.
+        """
+        if os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() != "true":
+            return embeddings
         
+        try:
+            store = EmbeddingStore(
+                os.getenv("EMBEDDING_CACHE_PATH", "embeddings_cache.db"),
+                max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+            )
+        except Exception as e:
+            console.print(f"[yellow]Warning: Embedding cache unavailable: {str(e)}[/yellow]")
+            return embeddings
+        
+        return CachedEmbeddings(
+            embeddings,
+            store,
+            batch_window=float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5")) / 1000,
+            max_batch=int(os.getenv("EMBEDDING_MAX_BATCH", "256")),
+            timeout=float(os.getenv("EMBEDDING_TIMEOUT", "120"))
+        )
+    
+    def describe_startup(self) -> str:
+        """
+        One-line startup time breakdown, for display.
+        """
+        timings = dict(self.startup_timings)
+        ready = timings.pop("ready", 0.0)
+        reviews = timings.pop("reviews_index", None)
+        steps = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items())
+        if reviews is None:
+            reviews_text = "reviews index warming up in background"
+        else:
+            reviews_text = f"reviews index {reviews:.2f}s in background"
+        return f"Ready in {ready:.2f}s ({steps}); {reviews_text}"
+    
     def _load_faq(self) -> str:
         """
         Load FAQ data from faq.md.
@@ -41,39 +252,260 @@ class CustomerServiceBot:
         except FileNotFoundError:
             return "FAQ data not found. Please make sure faq.md exists."
     
-    def _setup_reviews_vectorstore(self):
+    def _setup_faq_index(self, faq_data: str):
         """
-        Set up vector store for customer reviews.
+        Split the FAQ into headed sections and index them for retrieval.
+        """
+        try:
+            return FaqIndex(faq_data, self.embeddings)
+        except Exception as e:
+            # Embedding failures leave a keyword-only index
+            console.print(f"[yellow]Warning: FAQ embeddings unavailable, using keyword search only: {str(e)}[/yellow]")
+            return FaqIndex(faq_data)
+    
+    def _faq_context(self, question: str, vector=None) -> str:
+        """
+        The FAQ sections relevant to a question, within the configured
+        token budget, for use in prompts.
+        """
+        context = self.faq_index.context(
+            question,
+            k=int(os.getenv("FAQ_TOP_K", "4")),
+            token_budget=int(os.getenv("FAQ_CONTEXT_TOKENS", "1500")),
+            vector=vector
+        )
+        return context or "No FAQ sections match this question."
+    
+    def _setup_response_cache(self):
         """
+        Set up the semantic answer cache in front of the graph, if enabled.
+        """
+        if os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() != "true":
+            return None
+        
+        return SemanticResponseCache(
+            self.embeddings,
+            # Entries expire when reloaded knowledge is swapped in
+            SnapshotFingerprint(lambda: self._snapshot),
+            threshold=float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.95")),
+            max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000")),
+            ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+        )
+    
+    def _setup_question_router(self, knowledge: KnowledgeSnapshot):
+        """
+        Set up the embedding-based question router, if enabled, with example
+        questions taken from a snapshot's FAQ and its most-reviewed products.
+        Its example embeddings are computed here, once, so routing a question
+        costs a single query embedding.
+        """
+        if os.getenv("ROUTER_ENABLED", "true").lower() != "true":
+            return None
+        
+        products = []
+        if knowledge.review_analytics:
+            products = [
+                name for name in knowledge.review_analytics.top_products(int(os.getenv("ROUTER_MAX_PRODUCTS", "50")))
+                if name != "Unknown"
+            ]
         try:
-            with open("reviews.md", "r", encoding="utf-8") as f:
-                reviews_content = f.read()
+            return EmbeddingQuestionRouter(self.embeddings, route_examples(knowledge.faq_data, products))
+        except Exception as e:
+            console.print(f"[yellow]Warning: Question router unavailable, using LLM classification: {str(e)}[/yellow]")
+            return None
+    
+    def _refresh_question_router(self, knowledge: KnowledgeSnapshot):
+        """
+        Rebuild a snapshot's router from its current FAQ and reviews. Startup
+        and the background reviews warm-up both call this; whichever runs
+        last sees both the FAQ and the products.
+        """
+        with self._router_lock:
+            if knowledge.faq_data is not None:
+                knowledge.question_router = self._setup_question_router(knowledge)
+    
+    def _setup_metrics_dump(self):
+        """
+        Start the periodic metrics file dump, if METRICS_DUMP_PATH is set.
+        """
+        path = os.getenv("METRICS_DUMP_PATH")
+        if not path:
+            return None
+        
+        dumper = MetricsDumper(path, interval=float(os.getenv("METRICS_DUMP_INTERVAL", "60")))
+        dumper.start()
+        return dumper
+    
+    def _setup_knowledge_watcher(self):
+        """
+        Start polling faq.md and reviews.md for changes, unless
+        KNOWLEDGE_WATCH_INTERVAL is 0.
+        """
+        interval = float(os.getenv("KNOWLEDGE_WATCH_INTERVAL", "5"))
+        if interval <= 0:
+            return None
+        
+        watcher = KnowledgeWatcher(self, interval)
+        watcher.start()
+        return watcher
+    
+    def _knowledge(self) -> KnowledgeSnapshot:
+        """
+        The knowledge snapshot the current turn started with, or the live one
+        outside a turn.
+        """
+        return self._turn_knowledge.get() or self._snapshot
+    
+    @contextmanager
+    def _knowledge_scope(self):
+        """
+        Pin the live knowledge snapshot for the duration of one turn, so a
+        reload part-way through does not mix old and new data in an answer.
+        """
+        while True:
+            snapshot = self._snapshot
+            if snapshot.acquire():
+                break
+            # Retired between reading and acquiring it; the new one is live
+        token = self._turn_knowledge.set(snapshot)
+        try:
+            yield snapshot
+        finally:
+            self._turn_knowledge.reset(token)
+            snapshot.release()
+    
+    def knowledge_changed(self) -> bool:
+        """
+        Whether faq.md or reviews.md differ from the loaded knowledge.
+        """
+        return (
+            self._faq_fingerprint.current() != self._snapshot.faq_digest
+            or self._reviews_fingerprint.current() != self._snapshot.reviews_digest
+        )
+    
+    def reload_knowledge(self, force: bool = False) -> Dict[str, Any]:
+        """
+        Rebuild whatever faq.md and reviews.md knowledge has changed on disk
+        (all of it with force=True) into a new snapshot and swap it in.
+
+        Turns already running finish on the old snapshot; new turns use the
+        new one. Unchanged FAQ sections and reviews are not re-embedded (the
+        reviews index is synced by content hash and FAQ section embeddings
+        come from the embedding cache). Reviews removed from reviews.md stay
+        in the vector store until the last turn using the old snapshot has
+        finished, unless a later reload finds them in reviews.md again. If
+        the reviews cannot be reloaded, the previous reviews stay in use and
+        the next check retries.
 
-            # Parse reviews
-            reviews = self._parse_reviews(reviews_content)
+        Old and new snapshots share one Chroma collection, so with the
+        default search backend the swap is not atomic for review search:
+        turns on the old snapshot see added reviews at once, and turns on the
+        new one can still retrieve removed reviews until the old snapshot
+        drains. The numpy backend builds a separate index per snapshot and
+        has neither gap.
+        """
+        # The warm-up builds the initial reviews index; reload on top of it
+        self._reviews_ready.wait()
+        with self._reload_lock:
+            start = time.perf_counter()
+            old = self._snapshot
+            new = old.copy()
+            new.faq_digest = self._faq_fingerprint.current()
+            new.reviews_digest = self._reviews_fingerprint.current()
+            faq_changed = force or new.faq_digest != old.faq_digest
+            reviews_changed = force or new.reviews_digest != old.reviews_digest
+            if not faq_changed and not reviews_changed:
+                return {"faq_reloaded": False, "reviews_reloaded": False, "seconds": 0.0}
             
-            # Create document for each review
-            documents = []
-            for review in reviews:
-                doc = Document(
-                    page_content=review["content"],
-                    metadata={
-                        "product": review["product"],
-                        "rating": review["rating"],
-                        "date": review["date"],
-                        "review_id": review["review_id"]
-                    }
-                )
-                documents.append(doc)
+            if faq_changed:
+                new.faq_data = self._load_faq()
+                new.faq_index = self._setup_faq_index(new.faq_data)
             
-            # Add documents to vector store
-            vectorstore = Chroma.from_documents(
-                documents=documents,
-                embedding=self.embeddings,
-                persist_directory="./chroma_db"
-            )
+            removed_ids = []
+            if reviews_changed:
+                try:
+                    removed_ids = self._load_reviews(new, defer_deletes=True)
+                except Exception as e:
+                    console.print(f"[red]Error reloading reviews, keeping the previous reviews: {str(e)}[/red]")
+                    new.reviews_digest = old.reviews_digest
+                    reviews_changed = False
             
-            return vectorstore
+            if faq_changed or reviews_changed:
+                # Its examples come from both the FAQ and the reviewed products
+                new.question_router = self._setup_question_router(new)
+            
+            if reviews_changed:
+                # Every stored review is either in the new reviews.md or in
+                # removed_ids; pending deletes missing from removed_ids are
+                # back in the file and must be kept
+                self._pending_deletes = set(removed_ids)
+            
+            self._snapshot = new
+            vectorstore = old.reviews_vectorstore
+            if removed_ids and vectorstore is not None:
+                # Off the thread of the turn that drains the snapshot, which
+                # may have to wait for a reload to finish
+                old.retire(lambda: self._submit(self._delete_retired_reviews, vectorstore, removed_ids))
+            else:
+                old.retire()
+            
+            elapsed = time.perf_counter() - start
+            METRICS.observe("knowledge_reload", elapsed)
+            console.print(
+                f"[dim]Knowledge reloaded in {elapsed:.2f}s "
+                f"(faq: {'reloaded' if faq_changed else 'unchanged'}, "
+                f"reviews: {'reloaded' if reviews_changed else 'unchanged'}).[/dim]"
+            )
+            return {"faq_reloaded": faq_changed, "reviews_reloaded": reviews_changed, "seconds": elapsed}
+    
+    @property
+    def reviews_vectorstore(self):
+        """
+        The reviews vector store (None if reviews are unavailable), waiting
+        for the background warm-up if it is still running.
+        """
+        self._reviews_ready.wait()
+        return self._knowledge().reviews_vectorstore
+    
+    @reviews_vectorstore.setter
+    def reviews_vectorstore(self, vectorstore):
+        self._knowledge().reviews_vectorstore = vectorstore
+        self._reviews_ready.set()
+    
+    def _reviews_enabled(self) -> bool:
+        """
+        Whether questions may be routed to the reviews path, without waiting
+        for the warm-up: an index still being built is assumed to succeed.
+        """
+        if not self._reviews_ready.is_set():
+            return True
+        return self._knowledge().reviews_vectorstore is not None
+    
+    def _warm_up_reviews(self):
+        start = time.perf_counter()
+        try:
+            self.reviews_vectorstore = self._setup_reviews_vectorstore()
+        finally:
+            self._reviews_ready.set()
+            elapsed = time.perf_counter() - start
+            self.startup_timings["reviews_index"] = elapsed
+            METRICS.observe("startup_step", elapsed, step="reviews_index")
+    
+    def _setup_reviews_vectorstore(self):
+        """
+        Set up vector store for customer reviews.
+
+        Reviews are stored under a content hash of their parsed fields, so a
+        restart only embeds new or edited reviews and drops removed ones. When
+        reviews.md is unchanged the persisted collection is opened as-is.
+        Also builds self.review_analytics from the same parse.
+        """
+        try:
+            knowledge = self._knowledge()
+            self._load_reviews(knowledge)
+            # Add the reviewed products to the router's examples
+            self._refresh_question_router(knowledge)
+            return knowledge.reviews_vectorstore
             
         except FileNotFoundError:
             console.print("[yellow]Warning: reviews.md not found. Reviews functionality disabled.[/yellow]")
@@ -81,53 +513,305 @@ class CustomerServiceBot:
         except Exception as e:
             console.print(f"[red]Error setting up reviews vectorstore: {str(e)}[/red]")
             return None
+
+    def _load_reviews(self, knowledge: KnowledgeSnapshot, defer_deletes: bool = False) -> List[str]:
+        """
+        Sync the vector store with reviews.md and build the review analytics
+        and search index into a knowledge snapshot. The snapshot is only
+        updated once everything has been built. With defer_deletes, removed
+        reviews are left in the store (turns on an older snapshot may still
+        retrieve them) and their ids are returned for the caller to delete.
+        """
+        with open("reviews.md", "r", encoding="utf-8") as reviews_file:
+            vectorstore = knowledge.reviews_vectorstore
+            if vectorstore is None:
+                from langchain_community.vectorstores import Chroma
+                vectorstore = Chroma(
+                    embedding_function=self.embeddings,
+                    persist_directory=os.getenv("REVIEWS_INDEX_DIR", "./chroma_db")
+                )
+            analytics, removed_ids = self._sync_reviews_index(
+                vectorstore, self._iter_reviews(reviews_file), delete_removed=not defer_deletes
+            )
+        
+        vector_index = None
+        if os.getenv("REVIEW_SEARCH_BACKEND", "chroma").lower() == "numpy":
+            vector_index = self._setup_review_vector_index(vectorstore, exclude_ids=removed_ids if defer_deletes else None)
+        
+        knowledge.reviews_vectorstore = vectorstore
+        knowledge.review_analytics = analytics
+        knowledge.review_vector_index = vector_index
+        return removed_ids if defer_deletes else []
+
+    def _setup_review_vector_index(self, vectorstore, exclude_ids: List[str] = None):
+        """
+        Open the memory-mapped review search index, rebuilding it from the
+        Chroma collection (less exclude_ids) when the reviews have changed.
+        Returns None (and searches go to Chroma) if it cannot be built.
+        """
+        directory = os.getenv("REVIEW_VECTOR_INDEX_DIR", "./review_vectors")
+        try:
+            ids = vectorstore.get(include=[])["ids"]
+            if exclude_ids:
+                excluded = set(exclude_ids)
+                ids = [review_id for review_id in ids if review_id not in excluded]
+            index = ReviewVectorIndex.load(directory, ids_fingerprint(ids))
+            if index is None:
+                index = ReviewVectorIndex.build_from_chroma(
+                    vectorstore,
+                    directory,
+                    page_size=int(os.getenv("REVIEW_VECTOR_INDEX_PAGE_SIZE", "1000")),
+                    ids=ids if exclude_ids else None
+                )
+                console.print(f"[dim]Review vector index rebuilt: {len(index)} reviews.[/dim]")
+            return index
+        except Exception as e:
+            console.print(f"[yellow]Warning: Review vector index unavailable, searching with Chroma: {str(e)}[/yellow]")
+            return None
+    
+    def _sync_reviews_index(
+        self, vectorstore, reviews: Iterable[Dict[str, Any]], delete_removed: bool = True
+    ) -> Tuple[ReviewAnalytics, List[str]]:
+        """
+        Bring the persisted vector store in line with a stream of parsed
+        reviews. Returns analytics built from the same pass and the ids of
+        stored reviews that are no longer in the stream.
+
+        Parsing runs on its own thread and feeds a bounded queue, while this
+        thread embeds and upserts new or changed reviews in fixed-size
+        batches. Memory use therefore depends on the batch size, not on the
+        size of the corpus, and embedding starts while parsing continues.
+        Stored reviews that were not seen in the stream are deleted at the
+        end, unless delete_removed is False.
+        """
+        batch_size = int(os.getenv("REVIEW_EMBED_BATCH_SIZE", "128"))
+        existing_ids = set(vectorstore.get(include=[])["ids"])
+        analytics = ReviewAnalytics()
+        pending = queue.Queue(maxsize=batch_size * 2)
+        stop = threading.Event()
+        done = object()
+        unchanged = 0
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    pending.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def parse():
+            nonlocal unchanged
+            try:
+                for review in reviews:
+                    if stop.is_set():
+                        return  # The consumer gave up; stop parsing
+                    analytics.add(review)
+                    content_hash = self._review_content_hash(review)
+                    if content_hash in existing_ids:
+                        # Whatever is left in existing_ids at the end was removed
+                        existing_ids.discard(content_hash)
+                        unchanged += 1
+                    else:
+                        put((content_hash, review))
+                put(done)
+            except BaseException as e:
+                put(e)
+
+        parser = threading.Thread(target=parse, name="reviews-parser", daemon=True)
+        parser.start()
+
+        embedded = 0
+        batch: Dict[str, Dict[str, Any]] = {}
+        try:
+            while True:
+                item = pending.get()
+                if item is done:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                content_hash, review = item
+                batch[content_hash] = review  # Identical reviews collapse
+                if len(batch) >= batch_size:
+                    self._upsert_reviews(vectorstore, batch)
+                    embedded += len(batch)
+                    batch = {}
+            if batch:
+                self._upsert_reviews(vectorstore, batch)
+                embedded += len(batch)
+        finally:
+            stop.set()
+            parser.join()
+
+        removed_ids = list(existing_ids)
+        if delete_removed:
+            self._delete_reviews(vectorstore, removed_ids)
+
+        if embedded or removed_ids:
+            console.print(
+                f"[dim]Reviews index updated: {embedded} embedded, {len(removed_ids)} removed, "
+                f"{unchanged} unchanged.[/dim]"
+            )
+
+        analytics.freeze()
+        return analytics, removed_ids
+
+    def _delete_retired_reviews(self, vectorstore, review_ids: List[str]):
+        """
+        Delete reviews removed by a reload once the snapshot that could still
+        retrieve them has drained, skipping any that a later reload found in
+        reviews.md again. Holding the reload lock keeps a concurrent reload
+        from counting a review as stored just before it is deleted.
+        """
+        with self._reload_lock:
+            removed = [review_id for review_id in review_ids if review_id in self._pending_deletes]
+            self._pending_deletes.difference_update(removed)
+            self._delete_reviews(vectorstore, removed)
+    
+    def _delete_reviews(self, vectorstore, review_ids: List[str]):
+        batch_size = int(os.getenv("REVIEW_EMBED_BATCH_SIZE", "128"))
+        for start in range(0, len(review_ids), batch_size):
+            vectorstore.delete(ids=review_ids[start:start + batch_size])
+
+    def _upsert_reviews(self, vectorstore, reviews_by_hash: Dict[str, Dict[str, Any]]):
+        """
+        Embed and store one batch of reviews under their content hashes.
+        """
+        documents = []
+        for review in reviews_by_hash.values():
+            doc = Document(
+                page_content=review["content"],
+                metadata={
+                    "product": review["product"],
+                    "rating": review["rating"],
+                    "date": review["date"],
+                    "review_id": review["review_id"]
+                }
+            )
+            if review["rating_value"] is not None:
+                doc.metadata["rating_value"] = review["rating_value"]
+            documents.append(doc)
+
+        vectorstore.add_documents(documents=documents, ids=list(reviews_by_hash.keys()))
+
+    def _review_content_hash(self, review: Dict[str, Any]) -> str:
+        """
+        Stable hash of a parsed review's content, used as its vector store id.
+        The positional review_id is left out so inserting a review does not
+        invalidate every review after it.
+        """
+        key = "\x1f".join([review["product"], review["rating"], review["date"], review["content"]])
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
     
     def _parse_reviews(self, reviews_content: str) -> List[Dict[str, Any]]:
         """
         Parse reviews from markdown content into individual reviews.
+        Besides the raw strings, each review carries typed fields:
+        rating_value (float on a 5-point scale) and review_date (date), or
+        None when they cannot be parsed.
         """
-        reviews = []
-        sections = reviews_content.split("## Review")
-        
-        for i, section in enumerate(sections[1:], 1):  # Skip first empty section
-            lines = section.strip().split('\n')
-            review_data = {
-                "review_id": i,
-                "product": "",
-                "rating": "",
-                "date": "",
-                "content": ""
-            }
-            
-            current_content = []
-            for line in lines:
-                line = line.strip()
-                if line.startswith("**Product:**"):
-                    review_data["product"] = line.replace("**Product:**", "").strip()
-                elif line.startswith("**Rating:**"):
-                    review_data["rating"] = line.replace("**Rating:**", "").strip()
-                elif line.startswith("**Date:**"):
-                    review_data["date"] = line.replace("**Date:**", "").strip()
-                elif line.startswith("**Review:**"):
-                    current_content.append(line.replace("**Review:**", "").strip())
-                elif line and not line.startswith("**"):
-                    current_content.append(line)
-            
-            review_data["content"] = " ".join(current_content)
-            reviews.append(review_data)
+        return list(self._iter_reviews(reviews_content.splitlines()))
+    
+    def _iter_reviews(self, lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+        """
+        Parse reviews one at a time from an iterable of lines, such as an open
+        file, so large review exports never have to fit in memory.
+        """
+        review_data = None
+        current_content: List[str] = []
+        review_id = 0
+        
+        for line in lines:
+            line = line.strip()
+            if line.startswith("## Review"):
+                if review_data is not None:
+                    yield self._finish_review(review_data, current_content)
+                review_id += 1
+                review_data = {
+                    "review_id": review_id,
+                    "product": "",
+                    "rating": "",
+                    "date": "",
+                    "content": ""
+                }
+                current_content = []
+            elif review_data is None:
+                continue  # Preamble before the first review
+            elif line.startswith("**Product:**"):
+                review_data["product"] = line[len("**Product:**"):].strip()
+            elif line.startswith("**Rating:**"):
+                review_data["rating"] = line[len("**Rating:**"):].strip()
+            elif line.startswith("**Date:**"):
+                review_data["date"] = line[len("**Date:**"):].strip()
+            elif line.startswith("**Review:**"):
+                current_content.append(line[len("**Review:**"):].strip())
+            elif line and not line.startswith("**"):
+                current_content.append(line)
         
-        return reviews
+        if review_data is not None:
+            yield self._finish_review(review_data, current_content)
     
-    def _search_reviews(self, query: str, k: int = 5) -> List[Document]:
+    def _finish_review(self, review_data: Dict[str, Any], current_content: List[str]) -> Dict[str, Any]:
+        review_data["content"] = " ".join(current_content)
+        review_data["rating_value"] = parse_rating(review_data["rating"])
+        review_data["review_date"] = parse_date(review_data["date"])
+        return review_data
+    
+    def _submit(self, fn, *args) -> Future:
         """
-        Search reviews using semantic similarity.
+        Run fn on the shared worker pool, carrying over the caller's context
+        (LangChain callbacks, tracing) so the call behaves as if made inline.
         """
-        if not self.reviews_vectorstore:
+        return self.executor.submit(contextvars.copy_context().run, fn, *args)
+    
+    def _review_filters(self, question: str) -> Dict[str, Any]:
+        """
+        Product, rating range and date window mentioned in a question, as
+        filters for the in-process review search.
+        """
+        if self.review_analytics:
+            start, end = self.review_analytics.date_window(question)
+            products = self.review_analytics.match_products(question)
+        else:
+            (start, end), products = extract_date_window(question), []
+        min_rating, max_rating = extract_rating_range(question)
+        return {"products": products, "min_rating": min_rating, "max_rating": max_rating, "start": start, "end": end}
+    
+    def _search_reviews(self, query: str, k: int = 5, filters: Dict[str, Any] = None) -> List[Document]:
+        """
+        Search reviews using semantic similarity. Filters (see _review_filters)
+        narrow the candidates when the in-process search backend is enabled.
+        Results carry their review ids, like those of _search_reviews_batch,
+        so rankings from both can be fused.
+        """
+        results = self._search_reviews_batch([query], k, filters)
+        return results[0] if results else []
+    
+    def _search_reviews_batch(self, queries: List[str], k: int = 5, filters: Dict[str, Any] = None) -> List[List[Document]]:
+        """
+        Search reviews for several queries, embedding them in a single call
+        and searching for all of them in a single query.
+        """
+        if not self.reviews_vectorstore or not queries:
             return []
         
         try:
-            results = self.reviews_vectorstore.similarity_search(query, k=k)
-            return results
+            query_vectors = self.embeddings.embed_documents(queries)
+            if self.review_vector_index is not None:
+                with METRICS.timed("vector_search", backend="numpy"):
+                    return self.review_vector_index.search(query_vectors, k, **(filters or {}))
+            # The LangChain wrapper only queries one vector at a time
+            with METRICS.timed("vector_search", backend="chroma"):
+                results = self.reviews_vectorstore._collection.query(
+                    query_embeddings=query_vectors, n_results=k, include=["documents", "metadatas"]
+                )
+            return [
+                [
+                    Document(id=review_id, page_content=text, metadata=metadata or {})
+                    for review_id, text, metadata in zip(ids, texts, metadatas)
+                ]
+                for ids, texts, metadatas in zip(results["ids"], results["documents"], results["metadatas"])
+            ]
         except Exception as e:
             console.print(f"[red]Error searching reviews: {str(e)}[/red]")
             return []
@@ -139,25 +823,33 @@ class CustomerServiceBot:
         if not self.reviews_vectorstore:
             return "No reviews data available."
         
-        # Use semantic search to find relevant reviews
-        relevant_reviews = self._search_reviews(question, k=10)
+        # Pure-statistics questions are answered exactly, without the LLM
+        if self.review_analytics:
+            statistics_answer = self.review_analytics.answer_statistics_question(question)
+            if statistics_answer:
+                return statistics_answer
+        
+        # The primary search and query enhancement are independent; run them together
+        filters = self._review_filters(question) if self.review_vector_index is not None else None
+        primary_search = self._submit(self._search_reviews, question, 10, filters)
+        enhancement_cancelled = threading.Event()
+        enhancement = self._submit(self._enhance_search_query, question, enhancement_cancelled)
+        relevant_reviews = primary_search.result()
         
         if not relevant_reviews:
+            # Drops the rewrite if it has not started, or stops it at its next token
+            enhancement.cancel()
+            enhancement_cancelled.set()
             return "No relevant reviews found for your question."
         
-        # Enhance the search by also looking for similar questions/contexts
-        enhanced_query = self._enhance_search_query(question)
-        if enhanced_query != question:
-            additional_reviews = self._search_reviews(enhanced_query, k=5)
-            # Combine and deduplicate
-            all_reviews = relevant_reviews + additional_reviews
-            seen_content = set()
-            unique_reviews = []
-            for doc in all_reviews:
-                if doc.page_content not in seen_content:
-                    seen_content.add(doc.page_content)
-                    unique_reviews.append(doc)
-            relevant_reviews = unique_reviews[:10]  # Limit to top 10
+        # Search all alternative queries at once and fuse the rankings
+        alternative_queries = enhancement.result()
+        if alternative_queries:
+            additional_results = self._search_reviews_batch(alternative_queries, k=5, filters=filters)
+            relevant_reviews = reciprocal_rank_fusion(
+                [relevant_reviews] + additional_results,
+                key=lambda doc: doc.id or doc.page_content
+            )[:10]  # Limit to top 10
         
         # Format reviews for analysis with similarity scores if available
         reviews_text = ""
@@ -170,19 +862,28 @@ class CustomerServiceBot:
             reviews_text += f"Content: {doc.page_content}\n"
             reviews_text += "-" * 50 + "\n"
         
+        # Exact aggregates over every review, not just the retrieved sample
+        statistics_text = "Not available."
+        if self.review_analytics:
+            start, end = self.review_analytics.date_window(question)
+            statistics_text = self.review_analytics.describe(self.review_analytics.match_products(question), start, end)
+        
         # Enhanced analysis prompt with more context
         analysis_prompt = f"""
 You are a customer service representative analyzing customer reviews to answer questions.
 
 Customer Question: {question}
 
+Exact Rating Statistics (computed over ALL reviews):
+{statistics_text}
+
 Relevant Customer Reviews (found using semantic search):
 {reviews_text}
 
 Instructions:
 - Analyze the provided reviews to answer the customer's question comprehensively
 - If asked about sentiment, identify patterns, trends, and overall customer satisfaction
-- If asked about ratings, calculate averages, distributions, and highlight notable patterns
+- If asked about ratings, quote the exact statistics above rather than calculating from the sample reviews
 - If asked about specific products, focus on reviews for those products and compare with others
 - If asked about experiences, summarize common themes and outliers
 - Be honest about what the data shows, including limitations
@@ -194,12 +895,18 @@ Instructions:
 Answer the customer's question based on the review analysis:
 """
         
-        response = self.llm.invoke([SystemMessage(content=analysis_prompt)])
+        response = self.answer_llm.invoke(
+            [SystemMessage(content=analysis_prompt)],
+            config={"tags": [FINAL_ANSWER_TAG]}
+        )
         return response.content
     
-    def _enhance_search_query(self, question: str) -> str:
+    def _enhance_search_query(self, question: str, cancelled: threading.Event = None) -> List[str]:
         """
-        Enhance the search query to find more relevant reviews using LLM.
+        Generate alternative search queries to find more relevant reviews using LLM.
+        Returns an empty list if enhancement fails or produces nothing new, or
+        once `cancelled` is set. The reply is streamed so that a cancelled
+        rewrite stops generating instead of running to completion.
         """
         enhancement_prompt = f"""
 Given this customer question, generate alternative search queries that would help find relevant customer reviews.
@@ -211,61 +918,84 @@ Generate 1-2 alternative search queries that:
 - Focus on key concepts that might appear in reviews
 - Use synonyms or related terms
 
-Respond with just the alternative queries, separated by newlines.
+Respond in exactly this JSON format:
+{{"queries": ["alternative query", "another alternative query"]}}
 """
         
+        text = ""
         try:
-            response = self.llm.invoke([SystemMessage(content=enhancement_prompt)])
-            enhanced_queries = response.content.strip().split('\n')
-            # Return the first enhanced query, or original if none generated
-            return enhanced_queries[0].strip() if enhanced_queries[0].strip() else question
+            for chunk in self.rewrite_llm.stream([SystemMessage(content=enhancement_prompt)], config={"tags": ["rewrite"]}):
+                if cancelled is not None and cancelled.is_set():
+                    return []  # Closing the stream abandons the request
+                text += chunk.content
         except Exception:
-            return question  # Return original if enhancement fails
+            return []  # Fall back to the original query alone
+        
+        text = text.strip()
+        try:
+            candidates = json.loads(text).get("queries", [])
+        except (json.JSONDecodeError, AttributeError):
+            candidates = text.split('\n')  # Plain-text reply from a model without JSON mode
+        
+        queries = []
+        for line in candidates:
+            if not isinstance(line, str):
+                continue
+            # Strip list markers and quotes the model sometimes adds
+            query = re.sub(r'^\s*(?:[-*\u2022]|\d+[.)])\s*', '', line).strip().strip('"').strip()
+            if query and query.lower() != question.strip().lower() and query not in queries:
+                queries.append(query)
+        return queries
+    
+    def _smtp_config(self) -> Dict[str, Any]:
+        """
+        SMTP settings for escalation emails. Raises ValueError if the email
+        credentials are incomplete: sends would fail in the background after
+        customers had been told their inquiry was forwarded.
+        """
+        smtp_config = smtp_config_from_env()
+        if smtp_config["username"] and not smtp_config["password"]:
+            raise ValueError("EMAIL_USERNAME is set but EMAIL_PASSWORD is not; set both to send escalation emails, or neither")
+        return smtp_config
+    
+    def _setup_escalations(self):
+        """
+        Set up the durable escalation queue and, when email is configured,
+        the background worker that delivers it.
+        """
+        smtp_config = self.smtp_config
+        queue = EscalationQueue(
+            os.getenv("ESCALATION_QUEUE_PATH", "escalations.db"),
+            dedupe_window=float(os.getenv("ESCALATION_DEDUPE_WINDOW", "3600"))
+        )
+        if not smtp_config["username"]:
+            return queue, None
+        
+        worker = EscalationWorker(
+            queue,
+            smtp_config,
+            batch_size=int(os.getenv("ESCALATION_BATCH_SIZE", "20")),
+            max_attempts=int(os.getenv("ESCALATION_MAX_ATTEMPTS", "6"))
+        )
+        worker.start()
+        return queue, worker
     
-    def _send_assistance_email(self, customer_inquiry: str) -> bool:
+    def _send_assistance_email(self, customer_inquiry: str, session_id: str = None) -> bool:
         """
-        Send email to human assistant with the customer's inquiry.
+        Queue an email to the human assistant with the customer's inquiry.
+        Delivery happens on the escalation worker; this only records it.
         """
+        if self.escalation_worker is None:
+            console.print("[red]Email configuration missing. Please check your .env file.[/red]")
+            return False
+        
         try:
-            # Email configuration
-            smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-            smtp_port = int(os.getenv("SMTP_PORT", "587"))
-            email_username = os.getenv("EMAIL_USERNAME")
-            email_password = os.getenv("EMAIL_PASSWORD")
-            assistance_email = os.getenv("ASSISTANCE_EMAIL", "lzhouzyj@gmail.com")
-            
-            if not all([email_username, email_password]):
-                console.print("[red]Email configuration missing. Please check your .env file.[/red]")
-                return False
-            
-            # Create message
-            msg = MIMEMultipart()
-            msg['From'] = email_username
-            msg['To'] = assistance_email
-            msg['Subject'] = f"Customer Service Assistance Request - {datetime.now().strftime('%Y-%m-%d %H:%M')}"
-            
-            body = f"""
-Customer Inquiry Summary:
-{customer_inquiry}
-
-This inquiry could not be answered by the automated chatbot and requires human assistance.
-
-Timestamp: {datetime.now().isoformat()}
-"""
-            msg.attach(MIMEText(body, 'plain'))
-            
-            # Send email
-            server = smtplib.SMTP(smtp_server, smtp_port)
-            server.starttls()
-            server.login(email_username, email_password)
-            text = msg.as_string()
-            server.sendmail(email_username, assistance_email, text)
-            server.quit()
-            
+            # A repeat of an escalation already queued for this session counts as sent
+            self.escalation_queue.enqueue(session_id or self.cli_session_id, customer_inquiry)
+            self.escalation_worker.notify()
             return True
-            
         except Exception as e:
-            console.print(f"[red]Error sending email: {str(e)}[/red]")
+            console.print(f"[red]Error queueing assistance email: {str(e)}[/red]")
             return False
     
     def _can_answer_question(self, state: Dict[str, Any]) -> Dict[str, Any]:
@@ -274,6 +1004,79 @@ Timestamp: {datetime.now().isoformat()}
         Uses semantic analysis to determine question type and answerability.
         """
         user_question = state["messages"][-1].content
+        vector = self._question_vector(state)
+        
+        # Fast path: local embedding router. Only confident "faq"/"reviews"
+        # decisions are taken here; escalations always get the LLM's opinion.
+        if self.question_router:
+            try:
+                route, router_confidence = self.question_router.classify(user_question, vector)
+            except Exception as e:
+                console.print(f"[yellow]Warning: Question router failed, using LLM classification: {str(e)}[/yellow]")
+                route, router_confidence = "neither", 0.0
+            
+            threshold = float(os.getenv("ROUTER_CONFIDENCE_THRESHOLD", "0.7"))
+            if router_confidence >= threshold and (
+                (route == "faq" and self._faq_covers(user_question, vector))
+                or (route == "reviews" and self._reviews_enabled())
+            ):
+                state["can_answer"] = True
+                state["question_type"] = route
+                state["classification_confidence"] = {"source": "router", "score": router_confidence}
+                return state
+        
+        # The LLM classification is a full round trip; optionally generate the
+        # FAQ answer meanwhile, on the bet that the route will be "faq"
+        speculation = self._start_speculative_answer(user_question, vector) if self.speculative_faq else None
+        try:
+            self._classify_with_llm(state, user_question)
+        except BaseException:
+            if speculation is not None:
+                self._discard_speculative_answer(speculation)
+            raise
+        
+        if speculation is not None:
+            if state["can_answer"] and state["question_type"] == "faq":
+                METRICS.incr("speculative_answers", result="hit")
+                state["speculative_answer"] = speculation
+            else:
+                self._discard_speculative_answer(speculation)
+        return state
+    
+    def _question_vector(self, state: Dict[str, Any]):
+        """
+        The embedding of the turn's question, computed at most once per turn
+        and shared by the router and the FAQ index. The response cache lookup
+        puts the one it computed in state. None if embedding fails; callers
+        then embed (or skip embeddings) themselves.
+        """
+        if state.get("question_vector") is None:
+            try:
+                state["question_vector"] = self.embeddings.embed_query(state["messages"][-1].content)
+            except Exception as e:
+                console.print(f"[yellow]Warning: Could not embed the question: {str(e)}[/yellow]")
+                return None
+        return state["question_vector"]
+    
+    def _faq_covers(self, question: str, vector=None) -> bool:
+        """
+        Whether a question is close enough to an FAQ entry to be answered from
+        the FAQ without the LLM's faq_can_answer check. FAQ-shaped questions
+        about things the FAQ does not list (an unlisted policy, say) fall
+        through to LLM classification, which can escalate them.
+        """
+        try:
+            relevance = self.faq_index.relevance(question, vector)
+        except Exception:
+            return False
+        return relevance >= float(os.getenv("ROUTER_FAQ_MIN_SIMILARITY", "0.9"))
+    
+    def _classify_with_llm(self, state: Dict[str, Any], user_question: str):
+        """
+        Set the route in state from the router-tier LLM, with a keyword and
+        FAQ-check fallback if its reply cannot be used.
+        """
+        faq_context = self._faq_context(user_question, state.get("question_vector"))
         
         # Semantic classification of question type
         classification_prompt = f"""
@@ -285,8 +1088,8 @@ You are a customer service question classifier. Analyze the following customer q
 
 Customer Question: "{user_question}"
 
-FAQ Data Available:
-{self.faq_data[:500]}...
+Relevant FAQ Data Available:
+{faq_context}
 
 Respond in exactly this JSON format:
 {{
@@ -305,10 +1108,12 @@ Guidelines:
 """
         
         try:
-            classification_response = self.llm.invoke([SystemMessage(content=classification_prompt)])
+            classification_response = self.router_llm.invoke(
+                [SystemMessage(content=classification_prompt)],
+                config={"tags": ["classify"]}
+            )
             
             # Parse the JSON response
-            import json
             classification = json.loads(classification_response.content.strip())
             
             faq_can_answer = classification.get("faq_can_answer", False)
@@ -320,10 +1125,10 @@ Guidelines:
             if question_type == "faq" and faq_can_answer:
                 state["can_answer"] = True
                 state["question_type"] = "faq"
-            elif question_type == "reviews" and is_reviews_question and self.reviews_vectorstore:
+            elif question_type == "reviews" and is_reviews_question and self._reviews_enabled():
                 state["can_answer"] = True
                 state["question_type"] = "reviews"
-            elif question_type == "both" and (faq_can_answer or self.reviews_vectorstore):
+            elif question_type == "both" and (faq_can_answer or self._reviews_enabled()):
                 # Prioritize FAQ if both can answer
                 state["can_answer"] = True
                 state["question_type"] = "faq" if faq_can_answer else "reviews"
@@ -331,8 +1136,8 @@ Guidelines:
                 state["can_answer"] = False
                 state["question_type"] = "neither"
             
-            # Store confidence for debugging/logging
-            state["classification_confidence"] = confidence
+            # Store confidence and deciding path for debugging/logging
+            state["classification_confidence"] = {"source": "llm", "score": confidence}
             
         except (json.JSONDecodeError, Exception) as e:
             # Fallback to simple keyword matching if semantic classification fails
@@ -350,45 +1155,39 @@ Guidelines:
             # Simple FAQ check as fallback
             faq_prompt = f"""
 FAQ Data:
-{self.faq_data}
+{faq_context}
 
 Customer Question: {user_question}
 
-Can the FAQ data answer this question? Respond with "yes" or "no" only.
+Can the FAQ data answer this question? Respond in exactly this JSON format:
+{{"faq_can_answer": true/false}}
 """
             
-            faq_response = self.llm.invoke([SystemMessage(content=faq_prompt)])
-            faq_can_answer = faq_response.content.strip().lower() == "yes"
+            faq_response = self.router_llm.invoke([SystemMessage(content=faq_prompt)], config={"tags": ["faq_check"]})
+            try:
+                faq_can_answer = json.loads(faq_response.content).get("faq_can_answer") is True
+            except (json.JSONDecodeError, AttributeError):
+                faq_can_answer = faq_response.content.strip().lower() == "yes"
             
             # Determine routing
-            if faq_can_answer or (is_reviews_question and self.reviews_vectorstore):
+            if faq_can_answer or (is_reviews_question and self._reviews_enabled()):
                 state["can_answer"] = True
                 state["question_type"] = "reviews" if is_reviews_question and not faq_can_answer else "faq"
             else:
                 state["can_answer"] = False
                 state["question_type"] = "neither"
             
-            state["classification_confidence"] = 0.5  # Lower confidence for fallback
-        
-        return state
+            state["classification_confidence"] = {"source": "keyword_fallback", "score": 0.5}  # Lower confidence for fallback
     
-    def _answer_question(self, state: Dict[str, Any]) -> Dict[str, Any]:
+    def _faq_answer_messages(self, user_question: str, vector=None) -> List:
         """
-        Answer the question using FAQ data or customer reviews.
+        The prompt for answering a question from the FAQ.
         """
-        user_question = state["messages"][-1].content
-        question_type = state.get("question_type", "faq")
-        
-        if question_type == "reviews":
-            # Use reviews analysis
-            response_text = self._analyze_reviews_for_question(user_question)
-        else:
-            # Use FAQ data
-            system_prompt = f"""
+        system_prompt = f"""
 You are a helpful customer service representative. Answer the customer's question using ONLY the information provided in the FAQ data below.
 
 FAQ Data:
-{self.faq_data}
+{self._faq_context(user_question, vector)}
 
 Customer Question: {user_question}
 
@@ -398,11 +1197,70 @@ Instructions:
 - Keep your response concise and friendly
 - Do not make up information not present in the FAQ
 """
-            
-            response = self.llm.invoke([
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=user_question)
-            ])
+        return [SystemMessage(content=system_prompt), HumanMessage(content=user_question)]
+    
+    def _start_speculative_answer(self, user_question: str, vector=None) -> Optional[SpeculativeAnswer]:
+        """
+        Start generating the FAQ answer on the speculation pool, or return
+        None if the pool is busy. It is not tagged as the final answer, so
+        none of it streams to the customer unless the route turns out to be
+        "faq".
+        """
+        if not self._speculation_slots.acquire(blocking=False):
+            METRICS.incr("speculative_answers", result="skipped")
+            return None
+        
+        messages = self._faq_answer_messages(user_question, vector)
+        speculation = SpeculativeAnswer("\n".join(str(message.content) for message in messages))
+        
+        def run():
+            try:
+                speculation.run(self.speculative_llm.stream(messages, config={"tags": [SPECULATIVE_ANSWER_TAG]}))
+            finally:
+                self._speculation_slots.release()
+        
+        try:
+            self.speculation_executor.submit(contextvars.copy_context().run, run)
+        except BaseException:
+            self._speculation_slots.release()
+            raise
+        METRICS.incr("speculative_answers", result="started")
+        return speculation
+    
+    def _discard_speculative_answer(self, speculation: SpeculativeAnswer):
+        speculation.cancel()
+        METRICS.incr("speculative_answers", result="miss")
+        # Tokens generated after this point are not counted
+        METRICS.incr("speculative_wasted_tokens", speculation.spent_tokens())
+    
+    def _answer_question(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Answer the question using FAQ data or customer reviews.
+        """
+        user_question = state["messages"][-1].content
+        question_type = state.get("question_type", "faq")
+        
+        if question_type == "reviews":
+            # Use reviews analysis
+            response_text = self._analyze_reviews_for_question(user_question)
+        else:
+            # Use the FAQ sections relevant to the question
+            messages = self._faq_answer_messages(user_question, state.get("question_vector"))
+            response = None
+            speculation = state.pop("speculative_answer", None)
+            if speculation is not None:
+                # Relayed under the final-answer tag so it streams as usual
+                relay = SpeculationRelay(speculation=speculation)
+                try:
+                    response = relay.invoke(messages, config={"tags": [FINAL_ANSWER_TAG]})
+                except Exception as e:
+                    if relay.relayed:
+                        # Part of the answer has already streamed to the
+                        # customer; answering again would repeat it
+                        raise
+                    console.print(f"[yellow]Warning: Speculative answer failed, answering again: {str(e)}[/yellow]")
+            if response is None:
+                response = self.answer_llm.invoke(messages, config={"tags": [FINAL_ANSWER_TAG]})
             response_text = response.content
         
         state["messages"].append(AIMessage(content=response_text))
@@ -412,8 +1270,13 @@ Instructions:
         """Request human assistance for unanswered questions"""
         user_question = state["messages"][-1].content
         
-        # Send email to human assistant
-        email_sent = self._send_assistance_email(user_question)
+        if state.get("suppress_escalation"):
+            # Replays (batch mode) must not email the support team
+            email_sent = True
+            state["escalation_suppressed"] = True
+        else:
+            # Queue email to human assistant
+            email_sent = self._send_assistance_email(user_question, state.get("session_id"))
         
         if email_sent:
             response_text = """I'm sorry, but I don't have enough information to answer your question. 
@@ -429,14 +1292,25 @@ Please try contacting us directly at lzhouzyj@gmail.com, or let me know if there
         state["messages"].append(AIMessage(content=response_text))
         return state
     
-    def _build_graph(self) -> StateGraph:
+    def _timed_node(self, name: str, node):
+        """
+        Wrap a graph node so its wall time is recorded per node name.
+        """
+        def timed(state: Dict[str, Any]) -> Dict[str, Any]:
+            with METRICS.timed("graph_node", node=name):
+                return node(state)
+        return timed
+    
+    def _build_graph(self):
         """Build the LangGraph workflow"""
+        from langgraph.graph import StateGraph, END
+        
         workflow = StateGraph(dict)
         
         # Add nodes
-        workflow.add_node("can_answer_question", self._can_answer_question)
-        workflow.add_node("answer_question", self._answer_question)
-        workflow.add_node("request_assistance", self._request_assistance)
+        workflow.add_node("can_answer_question", self._timed_node("can_answer_question", self._can_answer_question))
+        workflow.add_node("answer_question", self._timed_node("answer_question", self._answer_question))
+        workflow.add_node("request_assistance", self._timed_node("request_assistance", self._request_assistance))
         
         # Set entry point
         workflow.set_entry_point("can_answer_question")
@@ -463,15 +1337,175 @@ Please try contacting us directly at lzhouzyj@gmail.com, or let me know if there
         
         return workflow.compile()
     
-    def chat(self):
+    def close(self):
+        """
+        Stop background workers. Undelivered escalations stay queued on disk
+        and are sent on the next start.
+        """
+        if self.knowledge_watcher:
+            self.knowledge_watcher.stop()
+        if self.escalation_worker:
+            self.escalation_worker.stop()
+        if self.escalation_worker is None or not self.escalation_worker.is_alive():
+            self.escalation_queue.close()
+        else:
+            # Still mid-send (SMTP calls can outlast stop()'s wait); closing the
+            # queue under it would lose the record of what it delivered, and
+            # those emails would go out again on the next start
+            console.print("[yellow]Escalation worker still sending; leaving its queue open.[/yellow]")
+        if self.metrics_dumper:
+            self.metrics_dumper.stop()
+        if isinstance(self.embeddings.inner, CachedEmbeddings):
+            self.embeddings.inner.close()
+        self.executor.shutdown(wait=False)
+        self.speculation_executor.shutdown(wait=False)
+    
+    def _initial_state(self, user_input: str, session_id: str = None, history: List = None) -> Dict[str, Any]:
+        """
+        Build the graph input state for one customer message. Without a
+        session_id, the message belongs to this process's CLI session.
+        """
+        return {
+            "messages": list(history or []) + [HumanMessage(content=user_input)],
+            "can_answer": False,
+            "question_type": "faq",
+            "session_id": session_id or self.cli_session_id
+        }
+    
+    def _graph_config(self) -> Dict[str, Any]:
+        """
+        Run config for graph invocations, carrying the metrics callbacks.
+        """
+        return {"callbacks": self.metrics_callbacks}
+    
+    def _record_turn(self, result: Dict[str, Any], start: float, spans) -> Dict[str, Any]:
+        """
+        Record a finished turn's latency by route and attach its trace spans.
+        """
+        route = "cache" if result.get("cached") else result.get("question_type", "unknown")
+        METRICS.observe("turn", time.perf_counter() - start, route=route)
+        if spans is not None:
+            result["trace"] = spans
+        return result
+    
+    def _cached_result(self, state: Dict[str, Any], payload: Dict[str, Any]) -> Dict[str, Any]:
+        state["messages"].append(AIMessage(content=payload["answer"]))
+        state["can_answer"] = True
+        state["question_type"] = payload["question_type"]
+        state["cached"] = True
+        return state
+    
+    def _cache_result(self, user_input: str, result: Dict[str, Any], vector):
+        # Escalations are not cached: each one must reach the support team.
+        # Nor are answers from knowledge that was reloaded during the turn.
+        if self.response_cache and result.get("can_answer") and self._knowledge() is self._snapshot:
+            self.response_cache.store(
+                user_input,
+                {"answer": result["messages"][-1].content, "question_type": result.get("question_type")},
+                vector
+            )
+    
+    def respond(self, user_input: str, session_id: str = None, history: List = None) -> Dict[str, Any]:
         """
-        Main chat loop.
+        Answer one customer message, serving repeated questions from the
+        response cache and running the graph otherwise.
+        """
+        start = time.perf_counter()
+        with trace_turn(self.trace_turns) as spans, self._knowledge_scope():
+            state = self._initial_state(user_input, session_id, history)
+            vector = None
+            if self.response_cache:
+                payload, vector = self.response_cache.lookup(user_input)
+                state["question_vector"] = vector
+                if payload:
+                    return self._record_turn(self._cached_result(state, payload), start, spans)
+            
+            result = self.graph.invoke(state, config=self._graph_config())
+            self._cache_result(user_input, result, vector)
+            return self._record_turn(result, start, spans)
+    
+    async def arespond(self, user_input: str, session_id: str = None, history: List = None) -> Dict[str, Any]:
+        """
+        Async variant of respond() for serving many sessions concurrently.
+        """
+        start = time.perf_counter()
+        with trace_turn(self.trace_turns) as spans, self._knowledge_scope():
+            state = self._initial_state(user_input, session_id, history)
+            vector = None
+            if self.response_cache:
+                payload, vector = await asyncio.to_thread(self.response_cache.lookup, user_input)
+                state["question_vector"] = vector
+                if payload:
+                    return self._record_turn(self._cached_result(state, payload), start, spans)
+            
+            result = await self.graph.ainvoke(state, config=self._graph_config())
+            if self.response_cache:
+                await asyncio.to_thread(self._cache_result, user_input, result, vector)
+            return self._record_turn(result, start, spans)
+    
+    def stream_respond(self, user_input: str, session_id: str = None, history: List = None):
+        """
+        Like respond(), but yields ("token", text) for each answer token as the
+        graph produces it, then ("result", final_state). Cached answers and
+        escalations arrive as a result with no tokens.
+        """
+        start = time.perf_counter()
+        with self._knowledge_scope():
+            state = self._initial_state(user_input, session_id, history)
+            vector = None
+            if self.response_cache:
+                payload, vector = self.response_cache.lookup(user_input)
+                state["question_vector"] = vector
+                if payload:
+                    yield "result", self._record_turn(self._cached_result(state, payload), start, None)
+                    return
+            
+            result = None
+            for mode, chunk in self.graph.stream(state, config=self._graph_config(), stream_mode=["messages", "values"]):
+                if mode == "messages":
+                    message, metadata = chunk
+                    if FINAL_ANSWER_TAG in (metadata.get("tags") or []) and message.content:
+                        yield "token", message.content
+                else:
+                    result = chunk
+            
+            self._cache_result(user_input, result, vector)
+            yield "result", self._record_turn(result, start, None)
+    
+    def _print_streamed_turn(self, user_input: str):
+        """
+        Render one turn's answer as it streams, then report timings.
+        """
+        start = time.perf_counter()
+        first_token_at = None
+        streamed = False
+        
+        console.print("\n[bold blue]Bot:[/bold blue] ", end="")
+        for kind, value in self.stream_respond(user_input):
+            if kind == "token":
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                streamed = True
+                console.print(value, end="", markup=False, highlight=False, soft_wrap=True)
+            elif not streamed:
+                # Nothing streamed (cache hit, escalation): print it whole
+                first_token_at = time.perf_counter()
+                console.print(value["messages"][-1].content, end="", markup=False, highlight=False, soft_wrap=True)
+        
+        total = time.perf_counter() - start
+        console.print(f"\n[dim](first token {first_token_at - start:.2f}s, total {total:.2f}s)[/dim]")
+    
+    def chat(self, stream: bool = True):
+        """
+        Main chat loop. With stream=False the full answer is printed at once,
+        which is better suited to scripted use.
         """
         console.print(Panel.fit(
             "[bold blue]Customer Service AI Chatbot[/bold blue]\n"
-            "Ask me anything! Type 'quit' to exit.",
+            "Ask me anything! Type 'quit' to exit, '/reload' to reload faq.md and reviews.md.",
             title="Welcome"
         ))
+        console.print(f"[dim]{self.describe_startup()}[/dim]")
         
         while True:
             try:
@@ -484,9 +1518,16 @@ Please try contacting us directly at lzhouzyj@gmail.com, or let me know if there
                 if not user_input.strip():
                     continue
                 
-                # Process the message through the graph
-                state = {"messages": [HumanMessage(content=user_input)], "can_answer": False, "question_type": "faq"}
-                result = self.graph.invoke(state)
+                if user_input.strip().lower() == "/reload":
+                    self.reload_knowledge(force=True)
+                    continue
+                
+                if stream:
+                    self._print_streamed_turn(user_input)
+                    continue
+                
+                # Process the message through the cache and graph
+                result = self.respond(user_input)
                 
                 # Get response + display
                 response = result["messages"][-1].content
@@ -500,17 +1541,49 @@ Please try contacting us directly at lzhouzyj@gmail.com, or let me know if there
                 console.print("[yellow]Please try again or contact support at lzhouzyj@gmail.com[/yellow]")
 
 def main():
+    parser = argparse.ArgumentParser(description="Customer Service AI Chatbot")
+    parser.add_argument("--serve", action="store_true", help="run the async HTTP server instead of the CLI chat")
+    parser.add_argument("--host", default=os.getenv("SERVER_HOST", "127.0.0.1"), help="server bind address")
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVER_PORT", "8000")), help="server port")
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=int(os.getenv("SERVER_MAX_CONCURRENCY", "64")),
+        help="maximum number of graph invocations running at once in server or batch mode"
+    )
+    parser.add_argument("--batch", metavar="INPUT_JSONL", help="run the questions in a JSONL file through the graph and exit")
+    parser.add_argument("--output", metavar="OUTPUT_JSONL", help="batch results file (default: <input>.results.jsonl)")
+    parser.add_argument("--resume", action="store_true", help="skip questions already answered in the batch output file")
+    parser.add_argument("--send-escalations", action="store_true", help="send escalation emails for batch questions")
+    parser.add_argument(
+        "--no-stream",
+        action="store_true",
+        help="print each answer once complete instead of streaming tokens (default when output is not a terminal)"
+    )
+    args = parser.parse_args()
+
     # Check for required environment variables
     if not os.getenv("OPENAI_API_KEY"):
         console.print("[red]Error: OPENAI_API_KEY not found in environment variables.[/red]")
         console.print("Please create a .env file with your OpenAI API key.")
         return
     
+    bot = None
     try:
         bot = CustomerServiceBot()
-        bot.chat()
+        if args.batch:
+            from batch import run_batch_cli
+            run_batch_cli(bot, args.batch, args.output, args.max_concurrency, args.resume, args.send_escalations)
+        elif args.serve:
+            from server import run_server
+            run_server(bot, args.host, args.port, args.max_concurrency)
+        else:
+            bot.chat(stream=sys.stdout.isatty() and not args.no_stream)
     except Exception as e:
         console.print(f"[red]Failed to start chatbot: {str(e)}[/red]")
+    finally:
+        if bot:
+            bot.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,273 @@
+import os
+import json
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.embeddings import Embeddings
+from langchain_core.outputs import LLMResult
+
+METRIC_PREFIX = "help_me_agent_"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Spans of the current turn when tracing is on (see trace_turn)
+_current_trace: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("current_trace", default=None)
+_trace_start: ContextVar[float] = ContextVar("trace_start", default=0.0)
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: Dict[str, Any]) -> LabelKey:
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+class MetricsRegistry:
+    """
+    Thread-safe counters and latency histograms, exportable as JSON or in the
+    Prometheus text format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[LabelKey, float] = {}
+        self._timers: Dict[LabelKey, Dict[str, Any]] = {}
+
+    def incr(self, name: str, value: float = 1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            timer = self._timers.get(key)
+            if timer is None:
+                timer = {"count": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * (len(BUCKETS) + 1)}
+                self._timers[key] = timer
+            timer["count"] += 1
+            timer["sum"] += seconds
+            timer["max"] = max(timer["max"], seconds)
+            timer["buckets"][bisect_left(BUCKETS, seconds)] += 1
+
+        trace = _current_trace.get()
+        if trace is not None:
+            end = time.perf_counter()
+            trace.append({
+                "name": name,
+                "labels": labels,
+                "start_ms": round((end - seconds - _trace_start.get()) * 1000, 3),
+                "duration_ms": round(seconds * 1000, 3)
+            })
+
+    @contextmanager
+    def timed(self, name: str, **labels):
+        """
+        Time the block under `name`; exceptions are counted as `<name>_errors`.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.incr(f"{name}_errors", **labels)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            timers = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": timer["count"],
+                    "sum_seconds": timer["sum"],
+                    "mean_seconds": timer["sum"] / timer["count"],
+                    "max_seconds": timer["max"]
+                }
+                for (name, labels), timer in sorted(self._timers.items())
+            ]
+        return {"timestamp": time.time(), "counters": counters, "timers": timers}
+
+    def prometheus_text(self) -> str:
+        def render_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{label}="{value}"' for label, value in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                metric = f"{METRIC_PREFIX}{name}_total"
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} counter")
+                    typed.add(metric)
+                lines.append(f"{metric}{render_labels(labels)} {value}")
+
+            for (name, labels), timer in sorted(self._timers.items()):
+                metric = f"{METRIC_PREFIX}{name}_seconds"
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} histogram")
+                    typed.add(metric)
+                cumulative = 0
+                for bound, count in zip(BUCKETS + (float("inf"),), timer["buckets"]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{metric}_bucket{render_labels(labels, [('le', le)])} {cumulative}")
+                lines.append(f"{metric}_sum{render_labels(labels)} {timer['sum']}")
+                lines.append(f"{metric}_count{render_labels(labels)} {timer['count']}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry shared by the bot, server and workers
+METRICS = MetricsRegistry()
+
+
+@contextmanager
+def trace_turn(enabled: bool = True):
+    """
+    Collect the spans recorded during one turn. Yields the span list (empty
+    and unused when disabled).
+    """
+    if not enabled:
+        yield None
+        return
+    spans: List[Dict[str, Any]] = []
+    trace_token = _current_trace.set(spans)
+    start_token = _trace_start.set(time.perf_counter())
+    try:
+        yield spans
+    finally:
+        _current_trace.reset(trace_token)
+        _trace_start.reset(start_token)
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callback that records wall time, token usage, errors and
+    retries for every chat model call made while it is attached.
+    """
+
+    def __init__(self, registry: MetricsRegistry = METRICS):
+        self.registry = registry
+        self._runs: Dict[UUID, Tuple[float, Dict[str, str]]] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, serialized, run_id, tags, metadata):
+        metadata = metadata or {}
+        serialized = serialized or {}
+        kwargs = serialized.get("kwargs", {})
+        labels = {
+            "model": metadata.get("ls_model_name") or kwargs.get("model_name") or kwargs.get("model") or serialized.get("name") or "unknown",
+            "task": next((tag for tag in (tags or []) if not tag.startswith(("graph:", "seq:", "langsmith:"))), "other")
+        }
+        with self._lock:
+            self._runs[run_id] = (time.perf_counter(), labels)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, tags=None, metadata=None, **kwargs):
+        self._start(serialized, run_id, tags, metadata)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, tags=None, metadata=None, **kwargs):
+        self._start(serialized, run_id, tags, metadata)
+
+    def _finish(self, run_id) -> Optional[Dict[str, str]]:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return None
+        start, labels = run
+        self.registry.observe("llm_call", time.perf_counter() - start, **labels)
+        return labels
+
+    def on_llm_end(self, response: LLMResult, *, run_id, **kwargs):
+        labels = self._finish(run_id)
+        if labels is None:
+            return
+        self.registry.incr("llm_calls", **labels)
+
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        if not usage:
+            for generations in response.generations:
+                for generation in generations:
+                    usage_metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    prompt_tokens += usage_metadata.get("input_tokens", 0)
+                    completion_tokens += usage_metadata.get("output_tokens", 0)
+        self.registry.incr("llm_prompt_tokens", prompt_tokens, **labels)
+        self.registry.incr("llm_completion_tokens", completion_tokens, **labels)
+
+    def on_llm_error(self, error: BaseException, *, run_id, **kwargs):
+        labels = self._finish(run_id)
+        if labels is not None:
+            self.registry.incr("llm_errors", **labels)
+
+    def on_retry(self, retry_state, *, run_id, **kwargs):
+        self.registry.incr("llm_retries")
+
+
+class InstrumentedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that times every call and counts embedded texts.
+    """
+
+    def __init__(self, inner: Embeddings, registry: MetricsRegistry = METRICS):
+        self.inner = inner
+        self.registry = registry
+        self.model = getattr(inner, "model", type(inner).__name__)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self.registry.timed("embedding_call", op="documents"):
+            vectors = self.inner.embed_documents(texts)
+        self.registry.incr("embedding_texts", len(texts))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        with self.registry.timed("embedding_call", op="query"):
+            vector = self.inner.embed_query(text)
+        self.registry.incr("embedding_texts", 1)
+        return vector
+
+
+class MetricsDumper(threading.Thread):
+    """
+    Periodically writes the registry to a file: Prometheus text when the path
+    ends in .prom, JSON otherwise. Writes go through a temp file and rename,
+    so readers never see a partial dump.
+    """
+
+    def __init__(self, path: str, interval: float = 60.0, registry: MetricsRegistry = METRICS):
+        super().__init__(name="metrics-dumper", daemon=True)
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stopping = threading.Event()
+
+    def dump(self):
+        if self.path.endswith(".prom"):
+            content = self.registry.prometheus_text()
+        else:
+            content = json.dumps(self.registry.snapshot(), indent=2)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(temp_path, self.path)
+
+    def run(self):
+        while not self._stopping.wait(self.interval):
+            self.dump()
+
+    def stop(self):
+        self._stopping.set()
+        self.join(5)
+        self.dump()
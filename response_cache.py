@@ -0,0 +1,201 @@
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from metrics import METRICS
+
+
+class ContentFingerprint:
+    """
+    Hash of the knowledge files the bot answers from. Files are only re-read
+    when their size or mtime changes, so checking is cheap enough to do on
+    every request.
+    """
+
+    def __init__(self, paths: List[str]):
+        self.paths = list(paths)
+        self._stats = None
+        self._digest = ""
+        self._lock = threading.Lock()
+
+    def _stat(self) -> Tuple:
+        stats = []
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+                stats.append((st.st_size, st.st_mtime_ns))
+            except FileNotFoundError:
+                stats.append(None)
+        return tuple(stats)
+
+    def current(self) -> str:
+        """
+        Return the digest of the files' current content.
+        """
+        stats = self._stat()
+        with self._lock:
+            if stats != self._stats:
+                digest = hashlib.sha256()
+                for path in self.paths:
+                    try:
+                        with open(path, "rb") as f:
+                            digest.update(hashlib.sha256(f.read()).digest())
+                    except FileNotFoundError:
+                        digest.update(b"missing")
+                self._stats = stats
+                self._digest = digest.hexdigest()
+            return self._digest
+
+
+class SemanticResponseCache:
+    """
+    Answer cache keyed on the embedding of the normalized question.
+
+    A lookup first tries an exact match on the normalized text (no embedding
+    call), then falls back to the most similar cached question above the
+    similarity threshold. Entries expire after a TTL, the least recently used
+    entry is evicted when full, and everything is dropped when the knowledge
+    files change.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        fingerprint: ContentFingerprint,
+        threshold: float = 0.95,
+        max_entries: int = 1000,
+        ttl_seconds: float = 3600.0
+    ):
+        self.embeddings = embeddings
+        self.fingerprint = fingerprint
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._matrix = None
+        self._matrix_keys: List[str] = []
+        self._content_digest = fingerprint.current()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        """
+        Lowercase, collapse whitespace and drop trailing punctuation.
+        """
+        question = re.sub(r"\s+", " ", question.strip().lower())
+        return question.rstrip("?!. ")
+
+    def _embed(self, normalized: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(normalized), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_content(self):
+        # Caller holds the lock
+        digest = self.fingerprint.current()
+        if digest != self._content_digest:
+            self._content_digest = digest
+            if self._entries:
+                self._entries.clear()
+                self._matrix = None
+                self.invalidations += 1
+
+    def _expire(self, now: float):
+        # Caller holds the lock. Entries are in LRU order, not insertion order,
+        # so scan them all; the cache is small enough for this to be cheap.
+        expired = [key for key, entry in self._entries.items() if now - entry["created_at"] > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def _similarity_matrix(self) -> np.ndarray:
+        # Caller holds the lock
+        if self._matrix is None:
+            self._matrix_keys = list(self._entries.keys())
+            if self._matrix_keys:
+                self._matrix = np.stack([self._entries[key]["vector"] for key in self._matrix_keys])
+            else:
+                self._matrix = np.empty((0, 0), dtype=np.float32)
+        return self._matrix
+
+    def lookup(self, question: str) -> Tuple[Optional[Dict[str, Any]], Optional[np.ndarray]]:
+        """
+        Return (cached payload or None, question embedding or None). Pass the
+        embedding back to store() on a miss to avoid embedding twice.
+        """
+        normalized = self.normalize(question)
+        now = time.time()
+
+        with self._lock:
+            self._check_content()
+            self._expire(now)
+            entry = self._entries.get(normalized)
+            if entry is not None:
+                self._entries.move_to_end(normalized)
+                self.hits += 1
+                METRICS.incr("response_cache_lookups", result="hit")
+                return entry["payload"], entry["vector"]
+            has_entries = bool(self._entries)
+
+        vector = self._embed(normalized)
+        if not has_entries:
+            with self._lock:
+                self.misses += 1
+            METRICS.incr("response_cache_lookups", result="miss")
+            return None, vector
+
+        with self._lock:
+            matrix = self._similarity_matrix()
+            if matrix.shape[0]:
+                scores = matrix @ vector
+                best = int(np.argmax(scores))
+                key = self._matrix_keys[best]
+                if scores[best] >= self.threshold and key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    METRICS.incr("response_cache_lookups", result="hit")
+                    return self._entries[key]["payload"], vector
+            self.misses += 1
+        METRICS.incr("response_cache_lookups", result="miss")
+        return None, vector
+
+    def store(self, question: str, payload: Dict[str, Any], vector: Optional[np.ndarray] = None):
+        """
+        Cache the payload for this question.
+        """
+        normalized = self.normalize(question)
+        if vector is None:
+            vector = self._embed(normalized)
+
+        with self._lock:
+            self._entries[normalized] = {"vector": vector, "payload": payload, "created_at": time.time()}
+            self._entries.move_to_end(normalized)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._matrix = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
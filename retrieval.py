@@ -0,0 +1,26 @@
+from typing import Any, Callable, Dict, Hashable, List, Sequence
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: Sequence[Sequence[Any]],
+    key: Callable[[Any], Hashable],
+    k: int = 60
+) -> List[Any]:
+    """
+    Merge several ranked result lists with reciprocal-rank fusion.
+
+    Each item scores sum(1 / (k + rank)) over the lists it appears in, so items
+    found by several queries rise above items ranked highly by only one.
+    Ties keep first-seen order.
+    """
+    scores: Dict[Hashable, float] = {}
+    items: Dict[Hashable, Any] = {}
+
+    for ranked in ranked_lists:
+        for rank, item in enumerate(ranked, 1):
+            item_key = key(item)
+            scores[item_key] = scores.get(item_key, 0.0) + 1.0 / (k + rank)
+            items.setdefault(item_key, item)
+
+    ordered_keys = sorted(scores, key=lambda item_key: scores[item_key], reverse=True)
+    return [items[item_key] for item_key in ordered_keys]
@@ -0,0 +1,373 @@
+import re
+from array import array
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+MONTHS = {
+    name: number
+    for number, names in enumerate(
+        [("january", "jan"), ("february", "feb"), ("march", "mar"), ("april", "apr"), ("may",),
+         ("june", "jun"), ("july", "jul"), ("august", "aug"), ("september", "sep", "sept"),
+         ("october", "oct"), ("november", "nov"), ("december", "dec")],
+        1
+    )
+    for name in names
+}
+
+# Questions asking only for numbers, answerable without the LLM
+STATISTICS_PATTERN = re.compile(
+    r"\b(average|mean|overall)\s+(rating|score|stars?)\b"
+    r"|\bhow many\s+(reviews|ratings|stars)\b"
+    r"|\b(rating|ratings|star|stars)\s+(distribution|breakdown|histogram)\b"
+    r"|\b(rating|ratings)\s+trend\b|\btrend\s+(in|of)\s+(the\s+)?ratings?\b",
+    re.IGNORECASE
+)
+
+# Words that signal the customer wants opinions or what the reviews say,
+# not just numbers ("how many reviews mention shipping")
+QUALITATIVE_PATTERN = re.compile(
+    r"\b(why|what do|what are|complain\w*|like|love|hate|feel|think|opinion\w*|recommend\w*|"
+    r"quality|comfort\w*|issue\w*|problem\w*|pros|cons|experience\w*|say|says|said|worth|"
+    r"mention\w*|about|regarding|talk\w*|contain\w*|refer\w*|discuss\w*|word\w*)\b",
+    re.IGNORECASE
+)
+
+MONTH_NAMES = "|".join(sorted(MONTHS, key=len, reverse=True))
+# Date windows understood by extract_date_window
+RELATIVE_WINDOW = re.compile(r"\b(?:last|past)\s+(\d+\s+)?(day|week|month|year)s?\b")
+SINCE_WINDOW = re.compile(rf"\b(?:since|after|from)\s+(?:(\d{{4}}-\d{{2}}-\d{{2}})|({MONTH_NAMES})\s+(\d{{4}})|(\d{{4}}))\b")
+MONTH_WINDOW = re.compile(rf"\b({MONTH_NAMES})\s+(\d{{4}})\b")
+YEAR_WINDOW = re.compile(r"\b(?:in|during|for)\s+(\d{4})\b")
+
+STAR_PHRASE = re.compile(r"\b[1-5](?:\s*|-)stars?\b")
+
+# Words a pure-statistics question may contain besides the statistic, the
+# products and the date window. Anything else (an unknown product, a topic)
+# means the figures alone would not answer it.
+STATISTICS_FILLER = frozenset("""
+    a all an and any are as at average based been breakdown by can customer customers did distribution do does
+    each far for from get gets give given got has have histogram how i in is it its many me mean month monthly
+    much my number of on our out over overall please product products rated rating ratings received review reviews
+    s score show so star stars store tell the their them there these this those time total trend trends was we
+    were what whats which you your
+""".split())
+
+
+def parse_rating(text: str) -> Optional[float]:
+    """
+    Parse a rating like "4/5", "4.5/5" or "8/10" onto a 5-point scale.
+    A bare number is taken to already be out of 5.
+    """
+    match = re.search(r"(\d+(?:\.\d+)?)\s*(?:/\s*(\d+(?:\.\d+)?))?", text or "")
+    if not match:
+        return None
+    value = float(match.group(1))
+    scale = float(match.group(2)) if match.group(2) else 5.0
+    if scale <= 0:
+        return None
+    return value * 5.0 / scale
+
+
+def parse_date(text: str) -> Optional[date]:
+    """
+    Parse an ISO (YYYY-MM-DD) review date.
+    """
+    try:
+        return date.fromisoformat((text or "").strip()[:10])
+    except ValueError:
+        return None
+
+
+def extract_date_window(question: str, today: Optional[date] = None) -> Tuple[Optional[date], Optional[date]]:
+    """
+    Pull a date window out of a question: "in 2024", "in January 2024",
+    "since March 2023", "since 2023-12-01", "last 3 months", "past year".
+    Returns (start, end), either of which may be None.
+    """
+    today = today or date.today()
+    text = question.lower()
+
+    relative = RELATIVE_WINDOW.search(text)
+    if relative:
+        count = int(relative.group(1) or 1)
+        days = {"day": 1, "week": 7, "month": 30, "year": 365}[relative.group(2)] * count
+        return today - timedelta(days=days), today
+
+    since = SINCE_WINDOW.search(text)
+    if since:
+        if since.group(1):
+            return parse_date(since.group(1)), None
+        if since.group(2):
+            return date(int(since.group(3)), MONTHS[since.group(2)], 1), None
+        return date(int(since.group(4)), 1, 1), None
+
+    month_year = MONTH_WINDOW.search(text)
+    if month_year:
+        year, month = int(month_year.group(2)), MONTHS[month_year.group(1)]
+        start = date(year, month, 1)
+        end = date(year + (month == 12), month % 12 + 1, 1) - timedelta(days=1)
+        return start, end
+
+    year = YEAR_WINDOW.search(text)
+    if year:
+        return date(int(year.group(1)), 1, 1), date(int(year.group(1)), 12, 31)
+
+    return None, None
+
+
+def extract_rating_range(question: str) -> Tuple[Optional[float], Optional[float]]:
+    """
+    Pull a rating range on the 5-point scale out of a question: "1-star
+    reviews", "4 stars and up", "rated 3 or below", "negative reviews".
+    Returns (min, max), either of which may be None.
+    """
+    text = question.lower()
+    star = r"([1-5])(?:\s*|-)stars?"
+
+    at_least = re.search(rf"\b{star}\s+(?:and|or)\s+(?:above|up|higher|more)\b|\b(?:at least|rated)\s+([1-5])\s+(?:stars?\s+)?or\s+(?:above|higher|more)\b", text)
+    if at_least:
+        return float(at_least.group(1) or at_least.group(2)), None
+
+    at_most = re.search(rf"\b{star}\s+(?:and|or)\s+(?:below|under|lower|less)\b|\b(?:at most|rated)\s+([1-5])\s+(?:stars?\s+)?or\s+(?:below|lower|less)\b", text)
+    if at_most:
+        return None, float(at_most.group(1) or at_most.group(2))
+
+    exact = re.search(rf"\b{star}\b", text)
+    if exact:
+        # Ratings round to the nearest star, as in the histogram
+        stars = float(exact.group(1))
+        return stars - 0.5, stars + 0.5
+
+    if re.search(r"\b(negative|bad|poor|low(?:est)?[- ]rated|critical)\s+(reviews?|ratings?|feedback)\b", text):
+        return None, 2.0
+    if re.search(r"\b(positive|good|great|high(?:est)?[- ]rated|glowing)\s+(reviews?|ratings?|feedback)\b", text):
+        return 4.0, None
+
+    return None, None
+
+
+class ReviewAnalytics:
+    """
+    Columnar, array-backed table of typed review fields (product, rating on a
+    5-point scale, date), built once at index time. Aggregates over all
+    reviews are computed with NumPy instead of asking the LLM to estimate
+    them from a handful of retrieved reviews.
+    """
+
+    def __init__(self):
+        self.product_names: List[str] = []
+        self._product_codes_by_name: Dict[str, int] = {}
+        self._product_column = array("i")
+        self._rating_column = array("f")
+        self._day_column = array("q")  # Days since 1970-01-01; -1 when unknown
+        self._aliases = None
+
+        self.products = np.empty(0, dtype=np.int32)
+        self.ratings = np.empty(0, dtype=np.float32)
+        self.days = np.empty(0, dtype=np.int64)
+
+    @classmethod
+    def from_reviews(cls, reviews) -> "ReviewAnalytics":
+        analytics = cls()
+        for review in reviews:
+            analytics.add(review)
+        analytics.freeze()
+        return analytics
+
+    def add(self, review: Dict[str, Any]):
+        """
+        Append one parsed review (see CustomerServiceBot._parse_reviews).
+        """
+        name = review["product"] or "Unknown"
+        code = self._product_codes_by_name.get(name)
+        if code is None:
+            code = len(self.product_names)
+            self._product_codes_by_name[name] = code
+            self.product_names.append(name)
+
+        rating = review.get("rating_value")
+        review_date = review.get("review_date")
+        self._product_column.append(code)
+        self._rating_column.append(np.nan if rating is None else rating)
+        self._day_column.append((review_date - date(1970, 1, 1)).days if review_date else -1)
+
+    def freeze(self):
+        """
+        Expose the appended rows as NumPy columns.
+        """
+        self.products = np.array(self._product_column, dtype=np.int32)
+        self.ratings = np.array(self._rating_column, dtype=np.float32)
+        self.days = np.array(self._day_column, dtype=np.int64)
+        self._aliases = None
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def top_products(self, limit: int) -> List[str]:
+        """
+        The names of the `limit` most-reviewed products, most reviewed first.
+        """
+        counts = np.bincount(self.products, minlength=len(self.product_names))
+        return [self.product_names[code] for code in np.argsort(-counts, kind="stable")[:limit]]
+
+    def latest_date(self) -> Optional[date]:
+        """
+        The date of the newest review, if any review has a date.
+        """
+        known = self.days[self.days >= 0]
+        return date(1970, 1, 1) + timedelta(days=int(known.max())) if len(known) else None
+
+    def date_window(self, question: str) -> Tuple[Optional[date], Optional[date]]:
+        """
+        extract_date_window, with relative windows ("last 3 months") counted
+        back from the newest review rather than from today, so they still
+        cover reviews when the data is not current.
+        """
+        return extract_date_window(question, today=self.latest_date())
+
+    def match_products(self, question: str) -> List[str]:
+        """
+        Products mentioned in the question, by full name or by an unambiguous
+        trailing part of the name ("headphones" for "Wireless Headphones").
+        """
+        matched = []
+        for _, _, name in self._product_spans(question.lower()):
+            if name not in matched:
+                matched.append(name)
+        return matched
+
+    def _product_spans(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        (start, end, product name) of each product mention in lowercased text.
+        """
+        if self._aliases is None:
+            candidates: Dict[str, List[str]] = {}
+            for name in self.product_names:
+                words = name.lower().split()
+                for start in range(len(words)):
+                    candidates.setdefault(" ".join(words[start:]), []).append(name)
+            self._aliases = {alias: names[0] for alias, names in candidates.items() if len(names) == 1}
+
+        spans = []
+        for alias, name in self._aliases.items():
+            # Tolerate singular/plural differences ("headphone" vs "headphones")
+            stem = alias[:-1] if alias.endswith("s") else alias
+            for match in re.finditer(rf"\b{re.escape(stem)}(?:s|es)?\b", text):
+                spans.append((match.start(), match.end(), name))
+
+        # Drop matches contained in a longer one ("mouse" inside "mouse pad")
+        return [
+            (start, end, name) for start, end, name in spans
+            if not any(s <= start and end <= e and (e - s) > (end - start) for s, e, _ in spans)
+        ]
+
+    def _mask(self, product: Optional[str] = None, start: Optional[date] = None, end: Optional[date] = None) -> np.ndarray:
+        mask = np.ones(len(self.products), dtype=bool)
+        if product is not None:
+            code = self._product_codes_by_name.get(product, -1)
+            mask &= self.products == code
+        if start is not None:
+            mask &= self.days >= (start - date(1970, 1, 1)).days
+        if end is not None:
+            mask &= (self.days >= 0) & (self.days <= (end - date(1970, 1, 1)).days)
+        return mask
+
+    def summary(self, product: Optional[str] = None, start: Optional[date] = None, end: Optional[date] = None) -> Dict[str, Any]:
+        """
+        Review count, average rating and 1-5 star histogram for a product
+        (or all products) within an optional date window.
+        """
+        mask = self._mask(product, start, end)
+        ratings = self.ratings[mask]
+        rated = ratings[~np.isnan(ratings)]
+        stars = np.clip(np.rint(rated), 1, 5).astype(np.int64)
+        histogram = np.bincount(stars, minlength=6)[1:]
+        return {
+            "product": product or "All products",
+            "count": int(mask.sum()),
+            "rated": int(len(rated)),
+            "average": float(rated.mean()) if len(rated) else None,
+            "histogram": {star: int(histogram[star - 1]) for star in range(1, 6)}
+        }
+
+    def trend(self, product: Optional[str] = None, start: Optional[date] = None, end: Optional[date] = None) -> List[Dict[str, Any]]:
+        """
+        Monthly review count and average rating, oldest month first.
+        """
+        mask = self._mask(product, start, end) & (self.days >= 0) & ~np.isnan(self.ratings)
+        if not mask.any():
+            return []
+        months = self.days[mask].astype("datetime64[D]").astype("datetime64[M]")
+        unique_months, inverse = np.unique(months, return_inverse=True)
+        counts = np.bincount(inverse)
+        sums = np.bincount(inverse, weights=self.ratings[mask])
+        return [
+            {"month": str(month), "count": int(count), "average": float(total / count)}
+            for month, count, total in zip(unique_months, counts, sums)
+        ]
+
+    def describe(self, products: List[str], start: Optional[date] = None, end: Optional[date] = None) -> str:
+        """
+        Exact aggregates as plain text, for a prompt or a direct answer.
+        """
+        lines = []
+        window = ""
+        if start or end:
+            window = f" ({start.isoformat() if start else 'start'} to {end.isoformat() if end else 'latest'})"
+
+        for product in products or [None]:
+            summary = self.summary(product, start, end)
+            if summary["average"] is None:
+                lines.append(f"{summary['product']}{window}: no rated reviews.")
+                continue
+            histogram = ", ".join(f"{star}★: {summary['histogram'][star]}" for star in range(5, 0, -1))
+            lines.append(
+                f"{summary['product']}{window}: average rating {summary['average']:.2f}/5 "
+                f"across {summary['rated']} rated reviews ({histogram})."
+            )
+            trend = self.trend(product, start, end)
+            if len(trend) > 1:
+                points = "; ".join(f"{point['month']}: {point['average']:.2f}/5 ({point['count']})" for point in trend[-12:])
+                lines.append(f"  Monthly trend: {points}.")
+        return "\n".join(lines)
+
+    def answer_statistics_question(self, question: str) -> Optional[str]:
+        """
+        Answer a pure-statistics question (average rating, rating breakdown,
+        review count, rating trend) directly. Returns None for anything else,
+        including questions that need the reviews' content and questions
+        naming something that is not a reviewed product, so that the LLM
+        answers those instead of being handed all-products figures.
+        """
+        if not STATISTICS_PATTERN.search(question) or QUALITATIVE_PATTERN.search(question):
+            return None
+
+        text = question.lower().replace("'", "")
+        spans = self._product_spans(text)
+        if self._uncovered_words(text, spans):
+            return None
+
+        start, end = self.date_window(question)
+        products = []
+        for _, _, name in spans:
+            if name not in products:
+                products.append(name)
+        scope = ", ".join(products) if products else "all of our products"
+        return f"Here are the exact figures from our customer reviews of {scope}:\n" + self.describe(products, start, end)
+
+    def _uncovered_words(self, text: str, spans: List[Tuple[int, int, str]]) -> List[str]:
+        """
+        Words of a lowercased question not accounted for by the statistic
+        asked for, the products mentioned, the date window, a star rating or
+        filler words.
+        """
+        covered = [(start, end) for start, end, _ in spans]
+        for pattern in (STATISTICS_PATTERN, RELATIVE_WINDOW, SINCE_WINDOW, MONTH_WINDOW, YEAR_WINDOW, STAR_PHRASE):
+            covered.extend(match.span() for match in pattern.finditer(text))
+        return [
+            match.group() for match in re.finditer(r"[a-z0-9]+", text)
+            if match.group() not in STATISTICS_FILLER
+            and not any(start <= match.start() and match.end() <= end for start, end in covered)
+        ]
@@ -0,0 +1,128 @@
+import re
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Example questions that hold whatever faq.md and reviews.md contain. The
+# rest are derived from those files (see route_examples), so they stay in
+# line with the content after a reload.
+GENERIC_ROUTE_EXAMPLES: Dict[str, List[str]] = {
+    "reviews": [
+        "What do customers think about this product?",
+        "How do customers feel about your products?",
+        "What are common complaints in customer reviews?",
+        "What do customers say in their reviews?",
+        "Which product has the best reviews?",
+        "What is the average rating of your products?",
+        "Do people recommend this product?",
+        "What do people like most about this product?",
+        "Are customers satisfied with the battery life?",
+        "Is the sound quality good according to reviews?",
+        "How many stars do your products get?",
+    ],
+    "neither": [
+        "Can you help me with a custom software development project?",
+        "Why was my card charged twice for my last order?",
+        "I want to speak to a manager about a legal complaint.",
+        "Can you write me a poem about the ocean?",
+        "What's the weather going to be like tomorrow?",
+        "I'd like to discuss a wholesale partnership with your company.",
+        "My account was hacked and someone placed orders, what do I do?",
+    ],
+}
+
+# Reviews questions generated for each reviewed product
+PRODUCT_QUESTION_TEMPLATES = [
+    "What do customers think about the {product}?",
+    "How do customers feel about the {product}?",
+    "Are the reviews for the {product} good?",
+    "What is the average rating of the {product}?",
+    "Do people recommend the {product}?",
+    "How many stars does the {product} get?",
+]
+
+
+def extract_faq_questions(faq_text: str) -> List[str]:
+    """
+    Pull the "**Q: ...**" questions out of faq.md.
+    """
+    return [match.strip() for match in re.findall(r"\*\*Q:\s*(.+?)\*\*", faq_text)]
+
+
+def route_examples(faq_text: str, products: List[str]) -> Dict[str, List[str]]:
+    """
+    Labelled example questions for each route: the questions in faq.md,
+    questions about each of the given products, and the generic examples.
+    """
+    examples = {label: list(texts) for label, texts in GENERIC_ROUTE_EXAMPLES.items()}
+    examples["faq"] = extract_faq_questions(faq_text or "")
+    examples["reviews"].extend(
+        template.format(product=product.lower())
+        for product in products
+        for template in PRODUCT_QUESTION_TEMPLATES
+    )
+    return examples
+
+
+class EmbeddingQuestionRouter:
+    """
+    Classify questions as "faq", "reviews" or "neither" by embedding
+    similarity, without an LLM call.
+
+    Each route is scored by a blend of its centroid similarity and its nearest
+    example similarity; confidence is the softmax probability of the best
+    route. Example embeddings and centroids are computed once, in a single
+    batched embedding call, when the router is built.
+    """
+
+    def __init__(self, embeddings, examples: Dict[str, List[str]], temperature: float = 0.05):
+        self.embeddings = embeddings
+        self.temperature = temperature
+
+        # A route without examples (an FAQ with no questions) is never chosen
+        self.examples = {label: texts for label, texts in examples.items() if texts}
+        self.labels = list(self.examples.keys())
+        flat_texts = [text for label in self.labels for text in self.examples[label]]
+        vectors = self._normalize(np.asarray(self.embeddings.embed_documents(flat_texts), dtype=np.float32))
+
+        self.example_vectors: Dict[str, np.ndarray] = {}
+        self.centroids: Dict[str, np.ndarray] = {}
+        offset = 0
+        for label in self.labels:
+            count = len(self.examples[label])
+            label_vectors = vectors[offset:offset + count]
+            offset += count
+            self.example_vectors[label] = label_vectors
+            self.centroids[label] = self._normalize(label_vectors.mean(axis=0))
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def scores(self, question: str, vector=None) -> Dict[str, float]:
+        """
+        Similarity score of the question against each route. Pass the
+        question's embedding as vector if it has already been computed.
+        """
+        if vector is None:
+            vector = self.embeddings.embed_query(question)
+        vector = self._normalize(np.asarray(vector, dtype=np.float32))
+        return {
+            label: float(
+                0.5 * (self.centroids[label] @ vector)
+                + 0.5 * np.max(self.example_vectors[label] @ vector)
+            )
+            for label in self.labels
+        }
+
+    def classify(self, question: str, vector=None) -> Tuple[str, float]:
+        """
+        Return (route, confidence) for the question.
+        """
+        scores = self.scores(question, vector)
+        values = np.array([scores[label] for label in self.labels])
+        weights = np.exp((values - values.max()) / self.temperature)
+        probabilities = weights / weights.sum()
+        best = int(np.argmax(probabilities))
+        return self.labels[best], float(probabilities[best])
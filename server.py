@@ -0,0 +1,244 @@
+import os
+import hmac
+import time
+import uuid
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any
+
+from aiohttp import web
+from langchain_core.messages import BaseMessage
+from rich.console import Console
+
+from metrics import METRICS
+
+console = Console()
+
+
+class ChatSession:
+    """
+    Conversation state for one customer. Turns within a session run one at a
+    time so concurrent requests cannot interleave their messages.
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.messages: List[BaseMessage] = []
+        self.lock = asyncio.Lock()
+        self.last_active = time.monotonic()
+
+
+class ChatServer:
+    """
+    Async HTTP/JSON front end that serves many chat sessions over one shared
+    CustomerServiceBot. The LLM client, embeddings, vector store and FAQ are
+    shared; each turn gets its own graph state built from the session history.
+    """
+
+    def __init__(
+        self,
+        bot,
+        max_concurrency: int = 64,
+        max_history: int = 20,
+        session_idle_timeout: float = 1800.0,
+        request_timeout: float = 120.0,
+        admin_token: str = None
+    ):
+        self.bot = bot
+        self.max_concurrency = max_concurrency
+        self.max_history = max_history
+        self.session_idle_timeout = session_idle_timeout
+        self.request_timeout = request_timeout
+        self.admin_token = admin_token
+        self.sessions: Dict[str, ChatSession] = {}
+        self.in_flight = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._cleanup_task = None
+
+    def _get_session(self, session_id: str) -> ChatSession:
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = ChatSession(session_id)
+            self.sessions[session_id] = session
+        session.last_active = time.monotonic()
+        return session
+
+    def expire_idle_sessions(self) -> int:
+        """
+        Drop sessions idle for longer than the timeout, except those with a
+        turn running. Returns the number dropped.
+        """
+        cutoff = time.monotonic() - self.session_idle_timeout
+        expired = [
+            session_id for session_id, session in self.sessions.items()
+            if session.last_active < cutoff and not session.lock.locked()
+        ]
+        for session_id in expired:
+            del self.sessions[session_id]
+        return len(expired)
+
+    async def _expire_idle_sessions(self):
+        while True:
+            await asyncio.sleep(60)
+            self.expire_idle_sessions()
+
+    async def run_turn(self, session_id: str, message: str) -> Dict[str, Any]:
+        """
+        Run one customer message through the graph for the given session.
+        """
+        session = self._get_session(session_id)
+
+        async with session.lock:
+            # respond() builds a fresh state from a copy of the history, so
+            # graph nodes never mutate another turn's (or session's) messages.
+            async with self._semaphore:
+                self.in_flight += 1
+                try:
+                    result = await asyncio.wait_for(
+                        self.bot.arespond(message, session_id, session.messages),
+                        self.request_timeout
+                    )
+                finally:
+                    self.in_flight -= 1
+
+            session.messages = result["messages"][-self.max_history:]
+            session.last_active = time.monotonic()
+
+        payload = {
+            "session_id": session_id,
+            "response": result["messages"][-1].content,
+            "question_type": result.get("question_type"),
+            "can_answer": result.get("can_answer", False),
+            "cached": result.get("cached", False)
+        }
+        if "trace" in result:
+            payload["trace"] = result["trace"]
+        return payload
+
+    async def handle_chat(self, request: web.Request) -> web.Response:
+        """POST /chat {"message": "...", "session_id": "..."}"""
+        try:
+            body = await request.json()
+        except Exception:
+            return web.json_response({"error": "Request body must be JSON."}, status=400)
+
+        message = body.get("message") if isinstance(body, dict) else None
+        if not isinstance(message, str) or not message.strip():
+            return web.json_response({"error": "'message' must be a non-empty string."}, status=400)
+
+        session_id = body.get("session_id") or uuid.uuid4().hex
+
+        try:
+            payload = await self.run_turn(str(session_id), message)
+        except asyncio.TimeoutError:
+            return web.json_response({"error": "Timed out generating a response.", "session_id": session_id}, status=504)
+        except Exception as e:
+            console.print(f"[red]Error handling chat request: {str(e)}[/red]")
+            return web.json_response({"error": "Internal error.", "session_id": session_id}, status=500)
+
+        return web.json_response(payload)
+
+    async def handle_end_session(self, request: web.Request) -> web.Response:
+        """DELETE /sessions/{session_id}"""
+        self.sessions.pop(request.match_info["session_id"], None)
+        return web.json_response({"status": "ok"})
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        """GET /health"""
+        return web.json_response({
+            "status": "ok",
+            "sessions": len(self.sessions),
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "reviews_index": "ready" if self.bot._reviews_ready.is_set() else "warming_up",
+            "response_cache": self.bot.response_cache.stats() if self.bot.response_cache else None
+        })
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        """GET /metrics (Prometheus text) or /metrics?format=json"""
+        if request.query.get("format") == "json":
+            snapshot = METRICS.snapshot()
+            snapshot["in_flight"] = self.in_flight
+            snapshot["sessions"] = len(self.sessions)
+            snapshot["response_cache"] = self.bot.response_cache.stats() if self.bot.response_cache else None
+            return web.json_response(snapshot)
+
+        gauges = [
+            "# TYPE help_me_agent_in_flight gauge",
+            f"help_me_agent_in_flight {self.in_flight}",
+            "# TYPE help_me_agent_sessions gauge",
+            f"help_me_agent_sessions {len(self.sessions)}"
+        ]
+        if self.bot.response_cache:
+            gauges += [
+                "# TYPE help_me_agent_response_cache_entries gauge",
+                f"help_me_agent_response_cache_entries {self.bot.response_cache.stats()['size']}"
+            ]
+        return web.Response(text=METRICS.prometheus_text() + "\n".join(gauges) + "\n", content_type="text/plain")
+
+    async def handle_reload(self, request: web.Request) -> web.Response:
+        """POST /admin/reload (Authorization: Bearer <SERVER_ADMIN_TOKEN>); only served when a token is set"""
+        authorization = request.headers.get("Authorization", "")
+        if not self.admin_token or not hmac.compare_digest(authorization, f"Bearer {self.admin_token}"):
+            return web.json_response({"error": "Unauthorized."}, status=401)
+
+        force = request.query.get("force", "false").lower() == "true"
+        try:
+            # Turns keep being served from the current knowledge meanwhile
+            summary = await asyncio.to_thread(self.bot.reload_knowledge, force)
+        except Exception as e:
+            console.print(f"[red]Error reloading knowledge: {str(e)}[/red]")
+            return web.json_response({"error": "Reload failed."}, status=500)
+        return web.json_response({"status": "ok", **summary})
+
+    async def _on_startup(self, app: web.Application):
+        # Sync graph nodes run on the loop's default executor, whose stock size
+        # (min(32, cpus + 4)) would silently cap concurrency below the limit.
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=self.max_concurrency))
+        self._cleanup_task = asyncio.create_task(self._expire_idle_sessions())
+
+    async def _on_cleanup(self, app: web.Application):
+        if self._cleanup_task:
+            self._cleanup_task.cancel()
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/chat", self.handle_chat)
+        app.router.add_delete("/sessions/{session_id}", self.handle_end_session)
+        app.router.add_get("/health", self.handle_health)
+        app.router.add_get("/metrics", self.handle_metrics)
+        if self.admin_token:
+            # Without a token anyone could trigger full re-embeds
+            app.router.add_post("/admin/reload", self.handle_reload)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+
+def create_app(bot, max_concurrency: int = None) -> web.Application:
+    """
+    Build the aiohttp application around an existing bot. Pass a bot built
+    with a stub LLM/embeddings to exercise the server locally.
+    """
+    if max_concurrency is None:
+        max_concurrency = int(os.getenv("SERVER_MAX_CONCURRENCY", "64"))
+
+    server = ChatServer(
+        bot,
+        max_concurrency=max_concurrency,
+        max_history=int(os.getenv("SERVER_MAX_HISTORY", "20")),
+        session_idle_timeout=float(os.getenv("SERVER_SESSION_IDLE_TIMEOUT", "1800")),
+        request_timeout=float(os.getenv("SERVER_REQUEST_TIMEOUT", "120")),
+        admin_token=os.getenv("SERVER_ADMIN_TOKEN") or None
+    )
+    return server.build_app()
+
+
+def run_server(bot, host: str, port: int, max_concurrency: int = None):
+    """
+    Serve the bot over HTTP until interrupted.
+    """
+    console.print(f"[bold blue]Serving customer service bot on http://{host}:{port}[/bold blue]")
+    console.print(f"[dim]{bot.describe_startup()}[/dim]")
+    web.run_app(create_app(bot, max_concurrency), host=host, port=port, print=None)
@@ -0,0 +1,110 @@
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from faq_index import estimate_tokens
+
+
+class SpeculativeAnswer:
+    """
+    An answer generated before the turn's route is known. run() streams it
+    into a buffer on a worker thread; cancel() stops it at the next chunk.
+    If the route turns out to need it, SpeculationRelay hands the buffered
+    and remaining chunks on as the real answer.
+    """
+
+    def __init__(self, prompt: str):
+        self.prompt = prompt
+        self.text: List[str] = []
+        self.usage: Optional[Dict[str, Any]] = None
+        self.error: Optional[BaseException] = None
+        # Set once the API has answered: until then, cancelling costs nothing
+        self.sent = False
+        self.done = False
+        self._cancelled = threading.Event()
+        self._condition = threading.Condition()
+
+    def run(self, stream: Iterable[AIMessageChunk]):
+        try:
+            if self._cancelled.is_set():
+                return
+            for chunk in stream:
+                with self._condition:
+                    self.sent = True
+                    if chunk.content:
+                        self.text.append(chunk.content)
+                    if chunk.usage_metadata:
+                        self.usage = chunk.usage_metadata
+                    self._condition.notify_all()
+                if self._cancelled.is_set():
+                    break  # Closing the stream abandons the request
+        except Exception as e:
+            self.error = e
+        finally:
+            with self._condition:
+                self.done = True
+                self._condition.notify_all()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def spent_tokens(self) -> int:
+        """
+        Tokens spent so far: none if no response arrived (the request was
+        still queued or failed), as reported if the answer completed,
+        otherwise estimated from the prompt and the text generated before
+        cancelling.
+        """
+        with self._condition:
+            if not self.sent:
+                return 0
+            if self.usage:
+                return self.usage.get("total_tokens", 0)
+            return estimate_tokens(self.prompt) + (estimate_tokens("".join(self.text)) if self.text else 0)
+
+    def chunks(self) -> Iterator[str]:
+        """
+        The answer's text chunks: those already generated at once, then the
+        rest as they arrive. Raises the generation error, if any.
+        """
+        position = 0
+        while True:
+            with self._condition:
+                while position == len(self.text) and not self.done:
+                    self._condition.wait()
+                pending = self.text[position:]
+                finished = self.done
+            for text in pending:
+                yield text
+            position += len(pending)
+            if finished and position == len(self.text):
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class SpeculationRelay(BaseChatModel):
+    """
+    Chat model that "generates" a SpeculativeAnswer. Invoking it under the
+    final-answer tag makes a kept speculative answer stream to the customer
+    like any other answer. It reports no token usage: the speculative call
+    already recorded it. relayed is set once a chunk has been streamed on.
+    """
+
+    speculation: Any
+    relayed: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "speculation-relay"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(self.speculation.chunks())))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        for text in self.speculation.chunks():
+            self.relayed = True
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text))
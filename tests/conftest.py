@@ -0,0 +1,53 @@
+import os
+import sys
+import shutil
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fakes import FakeChatModel, FakeEmbeddings  # noqa: E402
+
+
+@pytest.fixture
+def bot_environment(tmp_path, monkeypatch):
+    """
+    A working directory holding the repo's faq.md and reviews.md, with the
+    bot's on-disk state kept inside it and background reloading and email
+    turned off.
+    """
+    for name in ("faq.md", "reviews.md"):
+        shutil.copy(os.path.join(REPO_ROOT, name), tmp_path)
+    monkeypatch.chdir(tmp_path)
+    for name, value in {
+        "REVIEWS_INDEX_DIR": str(tmp_path / "chroma_db"),
+        "REVIEW_VECTOR_INDEX_DIR": str(tmp_path / "review_vectors"),
+        "EMBEDDING_CACHE_PATH": str(tmp_path / "embeddings_cache.db"),
+        "ESCALATION_QUEUE_PATH": str(tmp_path / "escalations.db"),
+        "RESPONSE_CACHE_ENABLED": "false",
+        "KNOWLEDGE_WATCH_INTERVAL": "0"
+    }.items():
+        monkeypatch.setenv(name, value)
+    for name in ("EMAIL_USERNAME", "EMAIL_PASSWORD", "SERVER_ADMIN_TOKEN", "SPECULATIVE_FAQ"):
+        monkeypatch.delenv(name, raising=False)
+    return tmp_path
+
+
+@pytest.fixture
+def make_bot(bot_environment):
+    """
+    Build CustomerServiceBots on fake models; they are closed afterwards.
+    """
+    from main import CustomerServiceBot
+
+    bots = []
+
+    def make(llm=None, embeddings=None):
+        bot = CustomerServiceBot(llm=llm or FakeChatModel(), embeddings=embeddings or FakeEmbeddings())
+        bots.append(bot)
+        return bot
+
+    yield make
+    for bot in bots:
+        bot.close()
@@ -0,0 +1,59 @@
+import json
+import asyncio
+
+from batch import run_batch
+
+ESCALATION = "Can you build custom software for my company?"
+
+
+def write_requests(path, questions):
+    path.write_text("".join(json.dumps({"id": request_id, "question": question}) + "\n" for request_id, question in questions))
+
+
+def read_results(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_resume_skips_answered_ids_and_drops_a_partial_line(make_bot, tmp_path):
+    bot = make_bot()
+    requests, output = tmp_path / "requests.jsonl", tmp_path / "results.jsonl"
+    write_requests(requests, [("a", "What are your business hours?"), ("b", "How do I track my order?"), ("c", "What is your return policy?")])
+    # An interrupted run: "a" answered, "c" cut off part-way through its line
+    output.write_text(json.dumps({"id": "a", "question": "What are your business hours?", "answer": "9 to 5"}) + "\n"
+                      + '{"id": "c", "question": "What')
+
+    counts = asyncio.run(run_batch(bot, str(requests), str(output), concurrency=2, resume=True))
+
+    assert counts == {"answered": 2, "failed": 0, "skipped": 1}
+    results = read_results(output)  # Every line parses
+    assert sorted(record["id"] for record in results) == ["a", "b", "c"]
+    assert results[0]["answer"] == "9 to 5"
+
+
+def test_failed_ids_are_retried_on_resume(make_bot, tmp_path):
+    bot = make_bot()
+    requests, output = tmp_path / "requests.jsonl", tmp_path / "results.jsonl"
+    write_requests(requests, [("a", "What are your business hours?")])
+    output.write_text(json.dumps({"id": "a", "question": "What are your business hours?", "error": "timeout"}) + "\n")
+
+    counts = asyncio.run(run_batch(bot, str(requests), str(output), resume=True))
+
+    assert counts == {"answered": 1, "failed": 0, "skipped": 0}
+    assert "answer" in read_results(output)[-1]
+
+
+def test_escalations_are_suppressed_unless_requested(make_bot, tmp_path):
+    bot = make_bot()
+    sent = []
+    bot._send_assistance_email = lambda inquiry, session_id=None: sent.append(inquiry) or True
+    requests, output = tmp_path / "requests.jsonl", tmp_path / "results.jsonl"
+    write_requests(requests, [("a", ESCALATION)])
+
+    asyncio.run(run_batch(bot, str(requests), str(output)))
+    [record] = read_results(output)
+    assert record["question_type"] == "neither"
+    assert "human support team" in record["answer"]
+    assert sent == []
+
+    asyncio.run(run_batch(bot, str(requests), str(output), send_escalations=True))
+    assert sent == [ESCALATION]
@@ -0,0 +1,40 @@
+from concurrent.futures import TimeoutError
+
+import pytest
+
+from benchmarks.fakes import FakeEmbeddings
+from embedding_cache import CachedEmbeddings, EmbeddingStore
+
+
+def make_cache(tmp_path, inner=None, **kwargs):
+    store = EmbeddingStore(str(tmp_path / "embeddings.db"))
+    return CachedEmbeddings(inner or FakeEmbeddings(), store, **kwargs)
+
+
+def test_repeated_texts_are_served_from_the_store(tmp_path):
+    inner = FakeEmbeddings()
+    cache = make_cache(tmp_path, inner)
+    try:
+        first = cache.embed_documents(["wireless headphones", "office chair"])
+        assert cache.embed_documents(["office chair", "wireless headphones"]) == first[::-1]
+        assert inner.text_count == 2
+    finally:
+        cache.close()
+
+
+def test_use_after_close_raises(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.embed_query("warm up the batcher")
+    cache.close()
+    cache.close()  # Closing twice is harmless
+    with pytest.raises(RuntimeError):
+        cache.embed_query("something new")
+
+
+def test_slow_batch_times_out(tmp_path):
+    cache = make_cache(tmp_path, FakeEmbeddings(latency=1.0), timeout=0.1)
+    try:
+        with pytest.raises(TimeoutError):
+            cache.embed_query("slow text")
+    finally:
+        cache.close()
@@ -0,0 +1,138 @@
+import time
+import socket
+import sqlite3
+import functools
+
+import pytest
+
+from benchmarks.fakes import FakeEmbeddings, SmtpSink
+from email_queue import EscalationQueue, EscalationWorker
+
+
+def test_username_without_password_fails_at_startup(make_bot, monkeypatch):
+    monkeypatch.setenv("EMAIL_USERNAME", "bot@example.com")
+    embeddings = FakeEmbeddings()
+    with pytest.raises(ValueError, match="EMAIL_PASSWORD"):
+        make_bot(embeddings=embeddings)
+    # Failed before the FAQ or the reviews were embedded
+    assert embeddings.call_count == 0
+
+
+def test_escalation_is_delivered(make_bot, monkeypatch):
+    with SmtpSink() as sink:
+        monkeypatch.setenv("SMTP_SERVER", sink.host)
+        monkeypatch.setenv("SMTP_PORT", str(sink.port))
+        monkeypatch.setenv("SMTP_STARTTLS", "false")
+        monkeypatch.setenv("EMAIL_USERNAME", "bot@example.com")
+        monkeypatch.setenv("EMAIL_PASSWORD", "secret")
+        bot = make_bot()
+
+        assert bot._send_assistance_email("Can you build me a custom app?")
+        deadline = time.monotonic() + 10
+        while sink.message_count < 1 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert sink.message_count == 1
+
+
+def test_close_closes_escalation_queue(make_bot):
+    bot = make_bot()
+    bot.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        bot.escalation_queue.counts()
+
+
+def test_close_leaves_the_queue_open_while_a_send_is_in_progress(make_bot, monkeypatch):
+    with socket.socket() as listener:
+        # Accepts the connection but never greets, so the worker hangs mid-send
+        listener.bind(("127.0.0.1", 0))
+        listener.listen()
+        listener.settimeout(10)
+        monkeypatch.setenv("SMTP_SERVER", "127.0.0.1")
+        monkeypatch.setenv("SMTP_PORT", str(listener.getsockname()[1]))
+        monkeypatch.setenv("SMTP_STARTTLS", "false")
+        monkeypatch.setenv("EMAIL_USERNAME", "bot@example.com")
+        monkeypatch.setenv("EMAIL_PASSWORD", "secret")
+        bot = make_bot()
+        worker = bot.escalation_worker
+        monkeypatch.setattr(worker, "stop", functools.partial(worker.stop, timeout=0.2))
+
+        assert bot._send_assistance_email("Can you build me a custom app?")
+        connection, _ = listener.accept()
+        with connection:
+            bot.close()
+            assert worker.is_alive()
+            assert bot.escalation_queue.counts() == {"pending": 1}
+        worker.join(10)
+        assert not worker.is_alive()
+        bot.escalation_queue.close()
+
+
+def test_cli_sessions_differ_between_processes(make_bot):
+    first, second = make_bot(), make_bot()
+    assert first._initial_state("Hello")["session_id"] != second._initial_state("Hello")["session_id"]
+    assert first._initial_state("Hello", "web-1")["session_id"] == "web-1"
+
+
+def test_queue_dedupes_repeats_from_the_same_session(tmp_path):
+    queue = EscalationQueue(str(tmp_path / "escalations.db"), dedupe_window=0.2)
+    try:
+        assert queue.enqueue("session-1", "Why was I charged twice?") is True
+        assert queue.enqueue("session-1", "  why was I charged   TWICE? ") is False
+        assert queue.enqueue("session-2", "Why was I charged twice?") is True
+        time.sleep(0.3)
+        assert queue.enqueue("session-1", "Why was I charged twice?") is True
+        assert queue.counts() == {"pending": 3}
+    finally:
+        queue.close()
+
+
+def unused_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def smtp_config(port: int):
+    return {
+        "server": "127.0.0.1",
+        "port": port,
+        "username": "bot@example.com",
+        "password": "secret",
+        "starttls": False,
+        "assistance_email": "support@example.com"
+    }
+
+
+def test_worker_retries_after_smtp_failure(tmp_path):
+    queue = EscalationQueue(str(tmp_path / "escalations.db"))
+    try:
+        queue.enqueue("session-1", "Please call me back.")
+        worker = EscalationWorker(queue, smtp_config(unused_port()), backoff_base=0.01, backoff_max=0.01)
+
+        # Nothing is listening: the escalation stays queued for a retry
+        assert worker.drain_once() == 0
+        time.sleep(0.02)
+        [row] = queue.due(10)
+        assert row["status"] == "pending"
+        assert row["attempts"] == 1
+        assert row["last_error"]
+
+        with SmtpSink() as sink:
+            worker.smtp_config = smtp_config(sink.port)
+            assert worker.drain_once() == 1
+            worker._disconnect()
+        assert sink.message_count == 1
+        assert queue.counts() == {"sent": 1}
+    finally:
+        queue.close()
+
+
+def test_worker_gives_up_after_max_attempts(tmp_path):
+    queue = EscalationQueue(str(tmp_path / "escalations.db"))
+    try:
+        queue.enqueue("session-1", "Please call me back.")
+        worker = EscalationWorker(queue, smtp_config(unused_port()), max_attempts=1)
+        assert worker.drain_once() == 0
+        assert queue.counts() == {"failed": 1}
+    finally:
+        queue.close()
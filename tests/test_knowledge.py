@@ -0,0 +1,62 @@
+import re
+
+
+def remove_review(text: str, number: int) -> str:
+    return re.sub(rf"## Review {number}\n.*?(?=## Review|\Z)", "", text, flags=re.S)
+
+
+def stored_ids(bot):
+    return set(bot.reviews_vectorstore.get(include=[])["ids"])
+
+
+def finish_deferred_deletes(bot):
+    # Deferred deletes run on the worker pool once the old snapshot drains
+    bot.executor.shutdown(wait=True)
+
+
+def test_turns_keep_the_snapshot_they_started_with(make_bot, bot_environment):
+    bot = make_bot()
+    faq = bot_environment / "faq.md"
+    old_faq = bot.faq_data
+
+    with bot._knowledge_scope() as pinned:
+        faq.write_text(faq.read_text() + "\n## Gift Wrapping\n**Q: Do you gift wrap?**\nA: Yes, for $5.\n")
+        assert bot.reload_knowledge()["faq_reloaded"] is True
+        assert bot.faq_data is old_faq
+        assert pinned.in_flight == 1
+
+    assert "Gift Wrapping" in bot.faq_data
+    assert pinned.in_flight == 0
+    assert not pinned.acquire()  # Retired: new turns use the live snapshot
+
+
+def test_removed_reviews_are_deleted_once_the_old_snapshot_drains(make_bot, bot_environment):
+    bot = make_bot()
+    reviews = bot_environment / "reviews.md"
+    before = stored_ids(bot)
+
+    with bot._knowledge_scope():
+        reviews.write_text(remove_review(reviews.read_text(), 2))
+        assert bot.reload_knowledge()["reviews_reloaded"] is True
+        # A running turn may still retrieve the removed review
+        assert stored_ids(bot) == before
+
+    finish_deferred_deletes(bot)
+    assert len(stored_ids(bot)) == len(before) - 1
+
+
+def test_reviews_restored_before_the_old_snapshot_drains_are_kept(make_bot, bot_environment):
+    bot = make_bot()
+    reviews = bot_environment / "reviews.md"
+    original = reviews.read_text()
+    before = stored_ids(bot)
+
+    with bot._knowledge_scope():
+        reviews.write_text(remove_review(original, 2))
+        bot.reload_knowledge()
+        reviews.write_text(original)
+        bot.reload_knowledge()
+
+    finish_deferred_deletes(bot)
+    assert stored_ids(bot) == before
+    assert len(bot.review_analytics) == len(before)
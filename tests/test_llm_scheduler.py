@@ -0,0 +1,104 @@
+import time
+import threading
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from benchmarks.fakes import FakeChatModel
+from llm_scheduler import LLMScheduler, ScheduledChatModel, StreamAbandoned
+
+QUESTION = [HumanMessage(content="What are your business hours?")]
+
+
+def scheduled(inner, scheduler=None, priority="answer"):
+    return ScheduledChatModel(inner=inner, scheduler=scheduler or LLMScheduler(base_delay=0.01), priority=priority)
+
+
+def test_rate_limited_calls_back_off_and_retry():
+    # One request at a time, refilled every 0.1s
+    inner = FakeChatModel(requests_per_minute=600, burst=1)
+    model = scheduled(inner)
+    answers = [model.invoke([HumanMessage(content=f"Question {i}")]).content for i in range(3)]
+    assert all(answers)
+    assert inner.rate_limited_count >= 1
+    assert inner.call_count == 3 + inner.rate_limited_count
+
+
+def test_answers_go_ahead_of_auxiliary_calls_when_saturated():
+    scheduler = LLMScheduler(requests_per_minute=600)
+    for _ in range(600):
+        scheduler.acquire("gpt", "auxiliary", 0)  # Empty the bucket
+    order = []
+
+    def call(priority):
+        scheduler.call("gpt", priority, 0, lambda: order.append(priority))
+
+    auxiliary = threading.Thread(target=call, args=("auxiliary",))
+    auxiliary.start()
+    time.sleep(0.02)  # Queued first
+    answer = threading.Thread(target=call, args=("answer",))
+    answer.start()
+    auxiliary.join()
+    answer.join()
+    assert order == ["answer", "auxiliary"]
+
+
+def test_rate_limit_groups_share_one_queue():
+    scheduler = LLMScheduler(requests_per_minute=600, groups={"gpt-mini": "gpt", "gpt": "gpt"})
+    for _ in range(600):
+        scheduler.acquire("gpt", "answer", 0)
+    start = time.monotonic()
+    scheduler.acquire("gpt-mini", "auxiliary", 0)
+    assert time.monotonic() - start >= 0.05
+    start = time.monotonic()
+    scheduler.acquire("other", "auxiliary", 0)
+    assert time.monotonic() - start < 0.05
+
+
+def test_identical_in_flight_calls_share_one_request():
+    inner = FakeChatModel(latency=0.2)
+    model = scheduled(inner)
+    results = [None, None]
+
+    def ask(i):
+        results[i] = model.invoke(QUESTION)
+
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert inner.call_count == 1
+    assert results[0].content == results[1].content
+    # Only the caller that sent the request is charged for it
+    assert sum(result.usage_metadata is None for result in results) == 1
+
+
+def test_followers_receive_a_shared_stream_as_it_arrives():
+    inner = FakeChatModel(token_latency=0.01, answer_tokens=30)
+    model = scheduled(inner)
+    leader = model.stream(QUESTION)
+    first = next(leader)
+
+    follower = model.stream(QUESTION)
+    # Chunks already received reach the follower while the leader is still streaming
+    assert next(follower).content == first.content
+    leader_text = first.content + "".join(chunk.content for chunk in leader)
+    follower_text = first.content + "".join(chunk.content for chunk in follower)
+    assert leader_text == follower_text
+    assert inner.call_count == 1
+
+
+def test_follower_errors_when_the_leader_abandons_the_stream():
+    inner = FakeChatModel(token_latency=0.01, answer_tokens=30)
+    model = scheduled(inner)
+    leader = model.stream(QUESTION)
+    next(leader)
+
+    follower = model.stream(QUESTION)
+    next(follower)
+    leader.close()  # The leader's caller stops reading part-way
+    with pytest.raises(StreamAbandoned):
+        for _ in follower:
+            pass
+    assert inner.call_count == 1
@@ -0,0 +1,48 @@
+import pytest
+
+from benchmarks.fakes import FakeChatModel
+
+
+@pytest.fixture
+def create_llm(make_bot, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    for name in ("OPENAI_MODEL", "ROUTER_MODEL", "REWRITE_MODEL", "ANSWER_MODEL", "ROUTER_TIMEOUT", "ANSWER_TIMEOUT"):
+        monkeypatch.delenv(name, raising=False)
+    return make_bot()._create_llm
+
+
+def test_structured_tiers_default_to_a_small_model_in_json_mode(create_llm):
+    for task in ("router", "rewrite"):
+        llm = create_llm(task)
+        assert llm.model_name == "gpt-4.1-mini"
+        assert llm.model_kwargs == {"response_format": {"type": "json_object"}}
+        assert llm.request_timeout == 10
+        assert llm.max_retries == 0
+
+
+def test_answer_tier_follows_openai_model_without_json_mode(create_llm, monkeypatch):
+    assert create_llm("answer").model_name == "gpt-4.1"
+    monkeypatch.setenv("OPENAI_MODEL", "gpt-4o")
+    llm = create_llm("answer")
+    assert llm.model_name == "gpt-4o"
+    assert llm.model_kwargs == {}
+    assert llm.request_timeout == 60
+
+
+def test_tier_settings_can_be_overridden(create_llm, monkeypatch):
+    monkeypatch.setenv("OPENAI_MODEL", "gpt-4o")
+    monkeypatch.setenv("ROUTER_MODEL", "gpt-4.1-nano")
+    monkeypatch.setenv("ROUTER_TIMEOUT", "3")
+    monkeypatch.setenv("ANSWER_MODEL", "gpt-4.1")
+    router = create_llm("router")
+    assert router.model_name == "gpt-4.1-nano"
+    assert router.request_timeout == 3
+    assert create_llm("answer").model_name == "gpt-4.1"
+
+
+def test_injected_llm_serves_every_tier(make_bot):
+    llm = FakeChatModel()
+    bot = make_bot(llm=llm)
+    assert bot.router_llm.inner is llm
+    assert bot.rewrite_llm.inner is llm
+    assert bot.answer_llm.inner is llm
@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from metrics import MetricsDumper, MetricsRegistry, trace_turn
+
+
+@pytest.fixture
+def registry():
+    registry = MetricsRegistry()
+    registry.incr("llm_calls", model="gpt-4o-mini", task="answer")
+    registry.incr("llm_calls", 2, model="gpt-4o-mini", task="answer")
+    registry.incr("embedding_texts", 5)
+    registry.observe("llm_call", 0.2, model="gpt-4o-mini", task="answer")
+    registry.observe("llm_call", 3.0, model="gpt-4o-mini", task="answer")
+    return registry
+
+
+def test_prometheus_text_renders_counters_and_cumulative_buckets(registry):
+    lines = registry.prometheus_text().splitlines()
+    labels = 'model="gpt-4o-mini",task="answer"'
+
+    assert "# TYPE help_me_agent_llm_calls_total counter" in lines
+    assert f"help_me_agent_llm_calls_total{{{labels}}} 3" in lines
+    assert "help_me_agent_embedding_texts_total 5" in lines
+
+    assert lines.count("# TYPE help_me_agent_llm_call_seconds histogram") == 1
+    assert f'help_me_agent_llm_call_seconds_bucket{{{labels},le="0.1"}} 0' in lines
+    assert f'help_me_agent_llm_call_seconds_bucket{{{labels},le="0.25"}} 1' in lines
+    assert f'help_me_agent_llm_call_seconds_bucket{{{labels},le="2.5"}} 1' in lines
+    assert f'help_me_agent_llm_call_seconds_bucket{{{labels},le="5.0"}} 2' in lines
+    assert f'help_me_agent_llm_call_seconds_bucket{{{labels},le="+Inf"}} 2' in lines
+    assert f"help_me_agent_llm_call_seconds_sum{{{labels}}} 3.2" in lines
+    assert f"help_me_agent_llm_call_seconds_count{{{labels}}} 2" in lines
+
+
+def test_type_line_is_written_once_per_metric(registry):
+    registry.incr("llm_calls", model="gpt-4o", task="classify")
+    text = registry.prometheus_text()
+    assert text.count("# TYPE help_me_agent_llm_calls_total counter") == 1
+    assert text.endswith("\n")
+
+
+def test_snapshot_reports_counters_and_timer_summaries(registry):
+    snapshot = registry.snapshot()
+    assert {"name": "llm_calls", "labels": {"model": "gpt-4o-mini", "task": "answer"}, "value": 3} in snapshot["counters"]
+    assert {"name": "embedding_texts", "labels": {}, "value": 5} in snapshot["counters"]
+
+    [timer] = snapshot["timers"]
+    assert timer["name"] == "llm_call"
+    assert timer["count"] == 2
+    assert timer["sum_seconds"] == pytest.approx(3.2)
+    assert timer["mean_seconds"] == pytest.approx(1.6)
+    assert timer["max_seconds"] == 3.0
+    json.dumps(snapshot)  # Dumped as JSON by MetricsDumper
+
+
+def test_timed_counts_errors_and_still_observes():
+    registry = MetricsRegistry()
+    with pytest.raises(ValueError):
+        with registry.timed("reload"):
+            raise ValueError("bad faq.md")
+
+    snapshot = registry.snapshot()
+    assert snapshot["counters"] == [{"name": "reload_errors", "labels": {}, "value": 1}]
+    assert snapshot["timers"][0]["count"] == 1
+
+
+def test_spans_are_recorded_only_inside_a_traced_turn():
+    registry = MetricsRegistry()
+    registry.observe("embedding_call", 0.01, op="query")
+    with trace_turn() as spans:
+        registry.observe("embedding_call", 0.01, op="query")
+    assert [(span["name"], span["labels"]) for span in spans] == [("embedding_call", {"op": "query"})]
+
+
+def test_dumper_picks_the_format_from_the_path(registry, tmp_path):
+    prom_path, json_path = str(tmp_path / "metrics.prom"), str(tmp_path / "metrics.json")
+    MetricsDumper(prom_path, registry=registry).dump()
+    MetricsDumper(json_path, registry=registry).dump()
+
+    with open(prom_path, encoding="utf-8") as f:
+        assert f.read() == registry.prometheus_text()
+    with open(json_path, encoding="utf-8") as f:
+        assert json.load(f)["counters"] == registry.snapshot()["counters"]
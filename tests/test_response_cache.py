@@ -0,0 +1,74 @@
+import pytest
+
+import response_cache
+from benchmarks.fakes import FakeEmbeddings
+from response_cache import ContentFingerprint, SemanticResponseCache
+
+
+@pytest.fixture
+def faq_path(tmp_path):
+    path = tmp_path / "faq.md"
+    path.write_text("**Q: What are your business hours?**\nA: 9am to 5pm.\n", encoding="utf-8")
+    return path
+
+
+def make_cache(faq_path, **kwargs):
+    return SemanticResponseCache(FakeEmbeddings(), ContentFingerprint([str(faq_path)]), **kwargs)
+
+
+def answer(text: str):
+    return {"answer": text}
+
+
+def test_similar_question_above_the_threshold_is_a_hit(faq_path):
+    cache = make_cache(faq_path, threshold=0.9)
+    payload, vector = cache.lookup("What are your business hours?")
+    assert payload is None
+    cache.store("What are your business hours?", answer("9am to 5pm."), vector)
+
+    # Same words: cosine 5/sqrt(30), about 0.91
+    assert cache.lookup("What are your business hours, please?")[0] == answer("9am to 5pm.")
+    assert cache.lookup("How do I track my order?")[0] is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_exact_match_skips_the_embedding_call(faq_path):
+    cache = make_cache(faq_path)
+    cache.store("What are your business hours?", answer("9am to 5pm."))
+    calls = cache.embeddings.call_count
+    assert cache.lookup("  what are your BUSINESS hours ")[0] == answer("9am to 5pm.")
+    assert cache.embeddings.call_count == calls
+
+
+def test_entries_expire_after_the_ttl(faq_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    cache = make_cache(faq_path, ttl_seconds=60)
+    cache.store("What are your business hours?", answer("9am to 5pm."))
+
+    now[0] += 59
+    assert cache.lookup("What are your business hours?")[0] is not None
+    now[0] += 2
+    assert cache.lookup("What are your business hours?")[0] is None
+    assert cache.stats()["size"] == 0
+
+
+def test_least_recently_used_entry_is_evicted(faq_path):
+    cache = make_cache(faq_path, max_entries=2)
+    cache.store("What are your business hours?", answer("9am to 5pm."))
+    cache.store("How do I track my order?", answer("Use the tracking link."))
+    cache.lookup("What are your business hours?")  # Now the most recently used
+    cache.store("Do you ship internationally?", answer("Yes."))
+
+    assert cache.lookup("How do I track my order?")[0] is None
+    assert cache.lookup("What are your business hours?")[0] is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_changed_knowledge_files_invalidate_every_entry(faq_path):
+    cache = make_cache(faq_path)
+    cache.store("What are your business hours?", answer("9am to 5pm."))
+
+    faq_path.write_text("**Q: What are your business hours?**\nA: 8am to 6pm, Monday to Saturday.\n", encoding="utf-8")
+    assert cache.lookup("What are your business hours?")[0] is None
+    assert cache.stats()["invalidations"] == 1
@@ -0,0 +1,50 @@
+from datetime import date
+
+import pytest
+
+from review_analytics import ReviewAnalytics
+
+
+def review(product: str, rating: float, day: date):
+    return {"product": product, "rating_value": rating, "review_date": day}
+
+
+@pytest.fixture
+def analytics():
+    # Historical data: the newest review is well before today
+    return ReviewAnalytics.from_reviews([
+        review("Wireless Headphones", 5, date(2023, 11, 20)),
+        review("Wireless Headphones", 3, date(2024, 1, 10)),
+        review("Wireless Headphones", 4, date(2022, 6, 1)),
+        review("Standing Desk Converter", 5, date(2024, 1, 2)),
+        review("Office Chair", 2, date(2023, 12, 15)),
+    ])
+
+
+@pytest.mark.parametrize("question", [
+    # A product that has no reviews
+    "What is the average rating of the Gaming Monitor?",
+    # Only part of a product's name, not an unambiguous trailing part
+    "What is the average rating of the standing desk?",
+    # Needs the reviews' content, not just counts
+    "How many reviews mention shipping?",
+    "How many reviews talk about comfort?",
+])
+def test_questions_the_figures_do_not_answer_go_to_the_llm(analytics, question):
+    assert analytics.answer_statistics_question(question) is None
+
+
+def test_relative_window_counts_back_from_the_newest_review(analytics):
+    answer = analytics.answer_statistics_question("What is the average rating of the wireless headphones in the last 3 months?")
+    assert "Wireless Headphones (2023-10-12 to 2024-01-10): average rating 4.00/5 across 2 rated reviews" in answer
+
+
+def test_product_question_is_answered_for_that_product(analytics):
+    answer = analytics.answer_statistics_question("What's the average rating of the standing desk converter?")
+    assert answer.startswith("Here are the exact figures from our customer reviews of Standing Desk Converter:")
+    assert "All products" not in answer
+
+
+def test_overall_question_is_answered_for_all_products(analytics):
+    answer = analytics.answer_statistics_question("What is the overall rating?")
+    assert "All products: average rating 3.80/5 across 5 rated reviews" in answer
@@ -0,0 +1,104 @@
+from datetime import date
+
+REVIEWS = """# Customer Reviews
+
+Exported from the store on 2024-02-01.
+**Note:** ratings are out of 5.
+
+## Review 1
+**Product:** Wireless Headphones
+**Rating:** 5/5
+**Date:** 2024-01-15
+**Review:** "Amazing sound quality!
+The battery lasts all day.
+
+Highly recommend!"
+
+## Review 2
+**Product:** Laptop Stand
+**Rating:** 4/5
+**Date:** 2024-01-12
+**Review:** "Good build quality."
+"""
+
+
+class MemoryVectorStore:
+    """
+    The part of the vector store interface the reviews sync uses.
+    """
+
+    def __init__(self):
+        self.documents = {}
+        self.added = []
+
+    def get(self, include=None):
+        return {"ids": list(self.documents)}
+
+    def add_documents(self, documents, ids):
+        self.documents.update(zip(ids, documents))
+        self.added.extend(ids)
+
+    def delete(self, ids):
+        for review_id in ids:
+            del self.documents[review_id]
+
+
+def review(product: str, content: str):
+    return {
+        "review_id": 0, "product": product, "rating": "4/5", "date": "2024-01-01",
+        "content": content, "rating_value": 4.0, "review_date": date(2024, 1, 1)
+    }
+
+
+def test_multi_line_review_is_joined_and_preamble_skipped(make_bot):
+    bot = make_bot()
+    reviews = bot._parse_reviews(REVIEWS)
+    assert [r["review_id"] for r in reviews] == [1, 2]
+    first = reviews[0]
+    assert first["product"] == "Wireless Headphones"
+    assert first["content"] == '"Amazing sound quality! The battery lasts all day. Highly recommend!"'
+    assert first["rating_value"] == 5.0
+    assert first["review_date"] == date(2024, 1, 15)
+
+
+def test_parse_reviews_matches_iter_reviews(make_bot):
+    bot = make_bot()
+    with open("reviews.md", "r", encoding="utf-8") as f:
+        streamed = list(bot._iter_reviews(f))
+        f.seek(0)
+        parsed = bot._parse_reviews(f.read())
+    assert parsed == streamed
+    assert len(parsed) > 2
+
+
+def test_sync_adds_keeps_and_removes_reviews(make_bot, monkeypatch):
+    monkeypatch.setenv("REVIEW_EMBED_BATCH_SIZE", "2")
+    bot = make_bot()
+    store = MemoryVectorStore()
+    kept, removed = review("Office Chair", "Comfortable."), review("Desk Lamp", "Too dim.")
+
+    analytics, removed_ids = bot._sync_reviews_index(store, [kept, removed, review("Monitor", "Sharp.")])
+    assert len(store.documents) == 3
+    assert removed_ids == []
+    assert len(analytics) == 3
+
+    # Unchanged reviews keep their ids and are not embedded again
+    store.added.clear()
+    added = review("Keyboard", "Clicky.")
+    # A re-parsed review is a new dict with the same content
+    analytics, removed_ids = bot._sync_reviews_index(store, [kept, added, review("Monitor", "Sharp.")])
+    assert store.added == [bot._review_content_hash(added)]
+    assert removed_ids == [bot._review_content_hash(removed)]
+    assert len(store.documents) == 3
+    assert len(analytics) == 3
+
+
+def test_sync_can_leave_removed_reviews_for_later(make_bot):
+    bot = make_bot()
+    store = MemoryVectorStore()
+    removed = review("Desk Lamp", "Too dim.")
+    bot._sync_reviews_index(store, [removed])
+
+    _, removed_ids = bot._sync_reviews_index(store, [], delete_removed=False)
+    assert removed_ids == [bot._review_content_hash(removed)]
+    assert bot._review_content_hash(removed) in store.documents
@@ -0,0 +1,46 @@
+import threading
+
+
+def test_batched_chroma_search_matches_single_queries(make_bot):
+    bot = make_bot()
+    queries = ["headphones battery life", "comfortable office chair"]
+
+    batched = bot._search_reviews_batch(queries, k=3)
+
+    assert len(batched) == 2
+    for query, docs in zip(queries, batched):
+        vector = bot.embeddings.embed_query(query)
+        single = bot.reviews_vectorstore.similarity_search_by_vector(vector, k=3)
+        assert [doc.page_content for doc in docs] == [doc.page_content for doc in single]
+        assert all(doc.id for doc in docs)
+
+
+def test_cancelled_query_rewrite_returns_nothing(make_bot):
+    bot = make_bot()
+    cancelled = threading.Event()
+    question = "How do customers feel about the wireless headphones?"
+
+    assert bot._enhance_search_query(question, cancelled)
+    cancelled.set()
+    assert bot._enhance_search_query(question, cancelled) == []
+
+
+def test_reviews_found_by_several_queries_are_fused_once(make_bot, monkeypatch):
+    import main
+
+    bot = make_bot()
+    fused = []
+
+    def recording_fusion(*args, **kwargs):
+        result = fuse(*args, **kwargs)
+        fused.append(result)
+        return result
+
+    fuse = main.reciprocal_rank_fusion
+    monkeypatch.setattr(main, "reciprocal_rank_fusion", recording_fusion)
+    bot._analyze_reviews_for_question("How do customers feel about the wireless headphones?")
+
+    assert fused
+    top = fused[0][:10]
+    assert len({doc.page_content for doc in top}) == len(top)
+    assert all(doc.id for doc in top)
@@ -0,0 +1,50 @@
+def route(bot, question):
+    state = bot._can_answer_question(bot._initial_state(question))
+    return state["question_type"], state["classification_confidence"]["source"]
+
+
+def test_listed_faq_question_skips_llm_classification(make_bot):
+    bot = make_bot()
+    assert route(bot, "What are your business hours?") == ("faq", "router")
+
+
+def test_unlisted_faq_shaped_question_is_classified_by_llm(make_bot):
+    bot = make_bot()
+    # The router is confident this is an FAQ question, but the FAQ has no
+    # entry for it; only the LLM's faq_can_answer check may decide it
+    assert bot.question_router.classify("Do you offer price matching?")[0] == "faq"
+    assert route(bot, "Do you offer price matching?")[1] == "llm"
+
+
+def test_route_examples_follow_reloaded_content(make_bot):
+    bot = make_bot()
+    bot.reviews_vectorstore  # Wait for the warm-up, which adds the products
+    examples = bot.question_router.examples
+    assert "What are your business hours?" in examples["faq"]
+    assert "What do customers think about the wireless headphones?" in examples["reviews"]
+
+    with open("faq.md", "a", encoding="utf-8") as f:
+        f.write("\n**Q: Do you offer gift wrapping?**\nA: Yes, for $4.99 per item.\n")
+    with open("reviews.md", "a", encoding="utf-8") as f:
+        f.write('\n## Review 99\n**Product:** Gaming Monitor\n**Rating:** 4/5\n**Date:** 2024-03-01\n**Review:** "Sharp and fast."\n')
+    bot.reload_knowledge()
+
+    examples = bot.question_router.examples
+    assert "Do you offer gift wrapping?" in examples["faq"]
+    assert "What do customers think about the gaming monitor?" in examples["reviews"]
+
+
+def test_question_is_embedded_once_per_turn(make_bot, monkeypatch):
+    bot = make_bot()
+    bot.reviews_vectorstore  # Keep the warm-up's embeddings out of the count
+    embedded = []
+    embed_query = bot.embeddings.embed_query
+
+    def counting_embed_query(text):
+        embedded.append(text)
+        return embed_query(text)
+
+    monkeypatch.setattr(bot.embeddings, "embed_query", counting_embed_query)
+    # Routed by the router, checked against the FAQ and answered from it
+    bot.respond("What are your business hours?")
+    assert embedded == ["What are your business hours?"]
@@ -0,0 +1,113 @@
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from server import ChatServer
+
+
+def run_with_client(server: ChatServer, scenario):
+    """
+    Run scenario(client) against the server's app on a fresh event loop.
+    """
+    async def run():
+        async with TestClient(TestServer(server.build_app())) as client:
+            return await scenario(client)
+    return asyncio.run(run())
+
+
+def test_chat_keeps_history_per_session(make_bot):
+    bot = make_bot()
+    server = ChatServer(bot)
+
+    async def scenario(client):
+        first = await client.post("/chat", json={"message": "What are your business hours?"})
+        assert first.status == 200
+        payload = await first.json()
+        assert payload["response"]
+        assert payload["can_answer"] is True
+
+        second = await client.post("/chat", json={"message": "How do I track my order?", "session_id": payload["session_id"]})
+        assert second.status == 200
+        return payload["session_id"]
+
+    session_id = run_with_client(server, scenario)
+    # Two turns of a question and an answer each
+    assert len(server.sessions[session_id].messages) == 4
+
+
+def test_chat_rejects_missing_message(make_bot):
+    server = ChatServer(make_bot())
+
+    async def scenario(client):
+        not_json = await client.post("/chat", data="hello")
+        empty = await client.post("/chat", json={"message": "  "})
+        return not_json.status, empty.status
+
+    assert run_with_client(server, scenario) == (400, 400)
+
+
+def test_idle_sessions_expire(make_bot):
+    server = ChatServer(make_bot(), session_idle_timeout=0)
+
+    async def scenario(client):
+        response = await client.post("/chat", json={"message": "What are your business hours?", "session_id": "idle"})
+        assert response.status == 200
+        assert "idle" in server.sessions
+        return server.expire_idle_sessions()
+
+    assert run_with_client(server, scenario) == 1
+    assert "idle" not in server.sessions
+
+
+def test_concurrency_limit(make_bot):
+    bot = make_bot()
+    server = ChatServer(bot, max_concurrency=2)
+    respond = bot.arespond
+    running = peak = 0
+
+    async def tracked_respond(*args, **kwargs):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        try:
+            await asyncio.sleep(0.05)
+            return await respond(*args, **kwargs)
+        finally:
+            running -= 1
+
+    bot.arespond = tracked_respond
+
+    async def scenario(client):
+        responses = await asyncio.gather(*[
+            client.post("/chat", json={"message": "What are your business hours?", "session_id": f"s{i}"})
+            for i in range(6)
+        ])
+        return [response.status for response in responses]
+
+    assert run_with_client(server, scenario) == [200] * 6
+    assert peak == 2
+
+
+def test_reload_is_not_served_without_an_admin_token(make_bot):
+    server = ChatServer(make_bot())
+
+    async def scenario(client):
+        response = await client.post("/admin/reload")
+        return response.status
+
+    assert run_with_client(server, scenario) == 404
+
+
+def test_reload_requires_the_token_and_skips_unchanged_files(make_bot):
+    server = ChatServer(make_bot(), admin_token="secret")
+
+    async def scenario(client):
+        anonymous = await client.post("/admin/reload")
+        wrong = await client.post("/admin/reload", headers={"Authorization": "Bearer nope"})
+        authorized = await client.post("/admin/reload", headers={"Authorization": "Bearer secret"})
+        return anonymous.status, wrong.status, authorized.status, await authorized.json()
+
+    anonymous, wrong, authorized, payload = run_with_client(server, scenario)
+    assert (anonymous, wrong, authorized) == (401, 401, 200)
+    assert payload["faq_reloaded"] is False
+    assert payload["reviews_reloaded"] is False
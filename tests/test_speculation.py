@@ -0,0 +1,94 @@
+import time
+import threading
+
+import pytest
+from langchain_core.messages import AIMessageChunk
+
+from benchmarks.fakes import FakeChatModel, FakeRateLimitError
+from speculation import SpeculativeAnswer
+
+
+def test_no_tokens_are_wasted_before_the_api_responds():
+    cancelled_first = SpeculativeAnswer("What are your business hours?")
+    cancelled_first.cancel()
+    cancelled_first.run(iter([AIMessageChunk(content="We are open")]))
+    assert cancelled_first.spent_tokens() == 0
+
+    def rate_limited():
+        raise FakeRateLimitError(retry_after=1)
+        yield
+
+    failed = SpeculativeAnswer("What are your business hours?")
+    failed.run(rate_limited())
+    assert failed.spent_tokens() == 0
+
+
+def test_tokens_are_counted_once_a_response_arrives():
+    released = threading.Event()
+
+    def stream():
+        yield AIMessageChunk(content="We are open ")
+        released.wait()
+        yield AIMessageChunk(content="9 to 5.")
+
+    speculation = SpeculativeAnswer("What are your business hours?")
+    worker = threading.Thread(target=speculation.run, args=(stream(),))
+    worker.start()
+    next(speculation.chunks())  # The first chunk has arrived
+    speculation.cancel()
+    released.set()
+    worker.join()
+    assert speculation.spent_tokens() > 0
+
+
+def test_speculation_is_skipped_when_its_pool_is_busy(make_bot, monkeypatch):
+    monkeypatch.setenv("SPECULATIVE_FAQ", "true")
+    monkeypatch.setenv("SPECULATIVE_FAQ_WORKERS", "1")
+    bot = make_bot(llm=FakeChatModel(latency=0.3))
+
+    first = bot._start_speculative_answer("What are your business hours?")
+    assert first is not None
+    assert bot._start_speculative_answer("How do I track my order?") is None
+    "".join(first.chunks())  # Frees the worker
+    for _ in range(50):
+        second = bot._start_speculative_answer("How do I track my order?")
+        if second is not None:
+            break
+        time.sleep(0.01)
+    assert second is not None
+    second.cancel()
+
+
+def failed_speculation(chunks):
+    def stream():
+        for text in chunks:
+            yield AIMessageChunk(content=text)
+        raise FakeRateLimitError(retry_after=1)
+
+    speculation = SpeculativeAnswer("What are your business hours?")
+    speculation.run(stream())
+    return speculation
+
+
+def streamed_tokens(bot, question):
+    tokens = []
+    for kind, value in bot.stream_respond(question):
+        if kind == "token":
+            tokens.append(value)
+    return tokens
+
+
+def test_speculation_failing_before_any_chunk_is_answered_again(make_bot, monkeypatch):
+    monkeypatch.setenv("SPECULATIVE_FAQ", "true")
+    bot = make_bot()
+    # Classified by the LLM, so the speculative answer is kept
+    monkeypatch.setattr(bot, "_start_speculative_answer", lambda *args: failed_speculation([]))
+    assert streamed_tokens(bot, "Do you offer price matching?")
+
+
+def test_speculation_failing_after_streaming_is_not_answered_twice(make_bot, monkeypatch):
+    monkeypatch.setenv("SPECULATIVE_FAQ", "true")
+    bot = make_bot()
+    monkeypatch.setattr(bot, "_start_speculative_answer", lambda *args: failed_speculation(["We are open "]))
+    with pytest.raises(FakeRateLimitError):
+        streamed_tokens(bot, "Do you offer price matching?")
@@ -0,0 +1,34 @@
+from datetime import date
+
+import numpy as np
+
+from vector_index import ReviewVectorIndex, ReviewVectorIndexWriter, ids_fingerprint
+
+
+def build_index(tmp_path):
+    reviews = [
+        ("a", [1.0, 0.0], {"product": "Wireless Headphones", "rating_value": 5, "date": "2024-01-10"}, "Great sound"),
+        ("b", [0.8, 0.6], {"product": "Wireless Headphones", "rating_value": 2, "date": "2023-06-01"}, "Broke fast"),
+        ("c", [0.0, 1.0], {"product": "Office Chair", "rating_value": 4, "date": "2023-12-15"}, "Comfortable"),
+    ]
+    directory = str(tmp_path / "review_vectors")
+    writer = ReviewVectorIndexWriter(directory, len(reviews), 2)
+    writer.append(*[list(column) for column in zip(*reviews)])
+    writer.finish(ids_fingerprint(review[0] for review in reviews))
+    return ReviewVectorIndex(directory)
+
+
+def test_filters_narrow_the_candidates(tmp_path):
+    index = build_index(tmp_path)
+    [results] = index.search(np.array([0.0, 1.0]), k=3, products=["Wireless Headphones"])
+    assert [document.id for document in results] == ["b", "a"]
+    [results] = index.search(np.array([1.0, 0.0]), k=3, min_rating=4, start=date(2023, 12, 1))
+    assert [document.id for document in results] == ["a", "c"]
+
+
+def test_no_matching_rows_returns_no_results(tmp_path):
+    index = build_index(tmp_path)
+    results = index.search(np.array([[1.0, 0.0], [0.0, 1.0]]), k=3, products=["Office Chair"], max_rating=1)
+    assert results == [[], []]
+    results = index.search(np.array([1.0, 0.0]), k=3, start=date(2025, 1, 1))
+    assert results == [[]]
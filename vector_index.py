@@ -0,0 +1,254 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from review_analytics import parse_date
+
+EPOCH = date(1970, 1, 1)
+MANIFEST = "manifest.json"
+
+
+def ids_fingerprint(ids: Iterable[str]) -> str:
+    """
+    Order-independent hash of a collection's ids. Review ids are content
+    hashes, so equal fingerprints mean equal contents.
+    """
+    digest = hashlib.sha256()
+    for review_id in sorted(ids):
+        digest.update(review_id.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ReviewVectorIndexWriter:
+    """
+    Writes a ReviewVectorIndex directory page by page, so building it never
+    needs more than one page of embeddings in memory. Files are written
+    under a temporary directory that replaces the old index in finish().
+    """
+
+    def __init__(self, directory: str, count: int, dimensions: int):
+        self.directory = directory
+        self.temp_directory = f"{directory}.tmp"
+        shutil.rmtree(self.temp_directory, ignore_errors=True)
+        os.makedirs(self.temp_directory)
+
+        self.count = count
+        self.dimensions = dimensions
+        self.position = 0
+        self.vectors = np.lib.format.open_memmap(
+            os.path.join(self.temp_directory, "vectors.npy"), mode="w+", dtype=np.float32, shape=(count, dimensions)
+        )
+        self.products = np.empty(count, dtype=np.int32)
+        self.ratings = np.empty(count, dtype=np.float32)
+        self.days = np.empty(count, dtype=np.int64)
+        self.offsets = np.empty(count + 1, dtype=np.int64)
+        self.product_names: List[str] = []
+        self._product_codes: Dict[str, int] = {}
+        self._documents = open(os.path.join(self.temp_directory, "documents.jsonl"), "wb")
+        self.offsets[0] = 0
+
+    def append(self, ids: List[str], vectors, metadatas: List[Dict[str, Any]], documents: List[str]):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        end = self.position + len(ids)
+        self.vectors[self.position:end] = vectors / norms
+
+        for row, (review_id, metadata, content) in enumerate(zip(ids, metadatas, documents), self.position):
+            metadata = metadata or {}
+            product = metadata.get("product") or "Unknown"
+            code = self._product_codes.get(product)
+            if code is None:
+                code = len(self.product_names)
+                self._product_codes[product] = code
+                self.product_names.append(product)
+            self.products[row] = code
+
+            rating = metadata.get("rating_value")
+            self.ratings[row] = np.nan if rating is None else rating
+            review_date = parse_date(metadata.get("date", ""))
+            self.days[row] = (review_date - EPOCH).days if review_date else -1
+
+            line = json.dumps({"id": review_id, "page_content": content, "metadata": metadata}) + "\n"
+            self._documents.write(line.encode("utf-8"))
+            self.offsets[row + 1] = self._documents.tell()
+
+        self.position = end
+
+    def finish(self, fingerprint: str):
+        self._documents.close()
+        self.vectors.flush()
+        del self.vectors
+        if self.position != self.count:
+            raise ValueError(f"Expected {self.count} reviews, got {self.position}")
+
+        np.save(os.path.join(self.temp_directory, "products.npy"), self.products)
+        np.save(os.path.join(self.temp_directory, "ratings.npy"), self.ratings)
+        np.save(os.path.join(self.temp_directory, "days.npy"), self.days)
+        np.save(os.path.join(self.temp_directory, "offsets.npy"), self.offsets)
+        with open(os.path.join(self.temp_directory, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump({
+                "count": self.count,
+                "dimensions": self.dimensions,
+                "fingerprint": fingerprint,
+                "product_names": self.product_names
+            }, f)
+
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.replace(self.temp_directory, self.directory)
+
+
+class ReviewVectorIndex:
+    """
+    In-process review search. Normalized review embeddings live in one
+    contiguous float32 matrix memory-mapped from disk, alongside product,
+    rating and date columns. A search applies the metadata filters as a
+    boolean mask, scores the surviving rows with a single matrix product and
+    selects the top k with argpartition. Only the k winning documents are
+    read back from disk.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.fingerprint = manifest["fingerprint"]
+        self.product_names: List[str] = manifest["product_names"]
+        self._product_codes = {name: code for code, name in enumerate(self.product_names)}
+
+        self.vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        self.products = np.load(os.path.join(directory, "products.npy"))
+        self.ratings = np.load(os.path.join(directory, "ratings.npy"))
+        self.days = np.load(os.path.join(directory, "days.npy"))
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"))
+        # Held open so an index replaced on disk by a rebuild keeps working
+        # for searches that are still using it
+        self._documents_file = open(os.path.join(directory, "documents.jsonl"), "rb")
+        self._documents_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    @staticmethod
+    def load(directory: str, fingerprint: Optional[str] = None) -> Optional["ReviewVectorIndex"]:
+        """
+        Open the index in directory, or return None if there is none or it
+        was built from different reviews.
+        """
+        try:
+            index = ReviewVectorIndex(directory)
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+        if fingerprint is not None and index.fingerprint != fingerprint:
+            return None
+        return index
+
+    @staticmethod
+    def build_from_chroma(vectorstore, directory: str, page_size: int = 1000, ids: Optional[List[str]] = None) -> "ReviewVectorIndex":
+        """
+        Copy the embeddings, metadata and text of a Chroma collection (or of
+        just the given ids) into a new index, reading it one page at a time.
+        """
+        include = ["embeddings", "metadatas", "documents"]
+        if ids is None:
+            ids = vectorstore.get(include=[])["ids"]
+            pages = (
+                vectorstore.get(include=include, limit=page_size, offset=offset)
+                for offset in range(0, len(ids), page_size)
+            )
+        else:
+            pages = (
+                vectorstore.get(ids=ids[offset:offset + page_size], include=include)
+                for offset in range(0, len(ids), page_size)
+            )
+
+        writer = None
+        for page in pages:
+            if not len(page["ids"]):
+                break
+            if writer is None:
+                writer = ReviewVectorIndexWriter(directory, len(ids), len(page["embeddings"][0]))
+            writer.append(page["ids"], page["embeddings"], page["metadatas"], page["documents"])
+
+        if writer is None:
+            raise ValueError("The reviews collection is empty.")
+        writer.finish(ids_fingerprint(ids))
+        return ReviewVectorIndex(directory)
+
+    def mask(
+        self,
+        products: Optional[List[str]] = None,
+        min_rating: Optional[float] = None,
+        max_rating: Optional[float] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None
+    ) -> Optional[np.ndarray]:
+        """
+        Rows matching every given filter, or None when no filter is given.
+        """
+        mask = None
+
+        def narrow(condition):
+            nonlocal mask
+            mask = condition if mask is None else mask & condition
+
+        if products:
+            codes = [self._product_codes[name] for name in products if name in self._product_codes]
+            narrow(np.isin(self.products, codes))
+        if min_rating is not None:
+            narrow(self.ratings >= min_rating)
+        if max_rating is not None:
+            narrow(self.ratings <= max_rating)
+        if start is not None:
+            narrow(self.days >= (start - EPOCH).days)
+        if end is not None:
+            narrow((self.days >= 0) & (self.days <= (end - EPOCH).days))
+        return mask
+
+    def search(self, query_vectors, k: int = 5, **filters) -> List[List[Document]]:
+        """
+        Top-k reviews by cosine similarity for each query vector, among the
+        rows matching the filters (see mask()). If nothing matches the
+        filters, each query gets no results.
+        """
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        queries = queries / norms
+
+        mask = self.mask(**filters)
+        if mask is not None:
+            rows = np.flatnonzero(mask)
+            if not len(rows):
+                return [[] for _ in queries]
+            scores = queries @ self.vectors[rows].T
+        else:
+            rows = None
+            scores = queries @ self.vectors.T
+
+        k = min(k, scores.shape[1])
+        if k == 0:
+            return [[] for _ in queries]
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        top = np.take_along_axis(top, np.argsort(-top_scores, axis=1), axis=1)
+        if rows is not None:
+            top = rows[top]
+        return [self._documents(row_indices) for row_indices in top]
+
+    def _documents(self, rows) -> List[Document]:
+        documents = []
+        for row in rows:
+            with self._documents_lock:
+                self._documents_file.seek(int(self.offsets[row]))
+                line = self._documents_file.read(int(self.offsets[row + 1] - self.offsets[row]))
+            record = json.loads(line)
+            documents.append(Document(id=record["id"], page_content=record["page_content"], metadata=record["metadata"]))
+        return documents